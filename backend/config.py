@@ -15,4 +15,107 @@ class Config:
     
     # Embedding model settings
     EMBEDDING_MODEL = "text-embedding-ada-002"
-    EMBEDDING_DIMENSIONS = 1536
\ No newline at end of file
+    EMBEDDING_DIMENSIONS = 1536
+    
+    # Embedding provider: "fingerprint" (offline, deterministic) or "openai"
+    EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "fingerprint")
+    OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 2048))
+    EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", 4))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 3))
+    EMBEDDING_RETRY_BACKOFF = float(os.getenv("EMBEDDING_RETRY_BACKOFF", 0.5))
+    
+    # Embedding cache: bounded in-memory LRU, plus an on-disk tier when a directory is set
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+
+    
+    # Local vector store: "float32", "float16" or "int8" (scalar-quantized)
+    VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+    
+    # Optional projection of stored vectors down to VECTOR_REDUCED_DIMENSIONS (0 = off).
+    # "random" projection or "pca" fitted on the stored corpus once it holds
+    # VECTOR_PCA_MIN_FIT_ROWS vectors; keeping the originals lets the top results be
+    # rescored exactly and PCA be refitted each time the corpus grows
+    # VECTOR_PCA_REFIT_GROWTH-fold (0 = never).
+    VECTOR_REDUCED_DIMENSIONS = int(os.getenv("VECTOR_REDUCED_DIMENSIONS", 0))
+    VECTOR_PROJECTION = os.getenv("VECTOR_PROJECTION", "random")
+    VECTOR_KEEP_ORIGINALS = os.getenv("VECTOR_KEEP_ORIGINALS", "false").lower() == "true"
+    VECTOR_PCA_MIN_FIT_ROWS = int(os.getenv("VECTOR_PCA_MIN_FIT_ROWS", 1000))
+    VECTOR_PCA_REFIT_GROWTH = float(os.getenv("VECTOR_PCA_REFIT_GROWTH", 2.0))
+    
+    # Bulk ingest: uploads with at least INGEST_MIN_BATCH candidates are embedded
+    # on a process pool (INGEST_WORKERS processes, 0 = one per core) in chunks of
+    # INGEST_CHUNK_SIZE and upserted INGEST_UPSERT_BATCH_SIZE at a time
+    INGEST_MIN_BATCH = int(os.getenv("INGEST_MIN_BATCH", 64))
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 0))
+    INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 64))
+    INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", 500))
+    
+    # Vector index for the local store: "flat" (exact scan), "hnsw" (approximate
+    # graph search) or "ivf" (k-means inverted lists). HNSW_M bounds links per
+    # node, HNSW_EF_CONSTRUCTION and HNSW_EF_SEARCH trade build/query time for recall
+    VECTOR_INDEX = os.getenv("VECTOR_INDEX", "flat")
+    HNSW_M = int(os.getenv("HNSW_M", 16))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 100))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 50))
+    
+    # IVF index (VECTOR_INDEX=ivf): IVF_NLIST k-means lists (0 = about sqrt(rows)),
+    # IVF_NPROBE lists scanned per query
+    IVF_NLIST = int(os.getenv("IVF_NLIST", 0))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+    
+    # Product quantization (VECTOR_STORAGE=pq): PQ_SUBSPACES one-byte codes per
+    # vector (0 = dimensions / 16, e.g. 96 bytes for 1536-d); codebooks are
+    # trained once PQ_TRAIN_ROWS rows are stored. Set VECTOR_KEEP_ORIGINALS to
+    # rerank the top candidates exactly
+    PQ_SUBSPACES = int(os.getenv("PQ_SUBSPACES", 0))
+    PQ_TRAIN_ROWS = int(os.getenv("PQ_TRAIN_ROWS", 4096))
+    
+    # Persistence for the local store: when VECTOR_STORE_PATH is set, the store is
+    # restored from a memory-mapped snapshot plus a write-ahead log there. The WAL
+    # is fsynced per upsert when VECTOR_WAL_FSYNC is on, and folded into a new
+    # snapshot once it reaches VECTOR_SNAPSHOT_WAL_BYTES. Only one process may open
+    # the path unless VECTOR_STORE_SHARED is on
+    VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH")
+    VECTOR_WAL_FSYNC = os.getenv("VECTOR_WAL_FSYNC", "true").lower() == "true"
+    VECTOR_SNAPSHOT_WAL_BYTES = int(os.getenv("VECTOR_SNAPSHOT_WAL_BYTES", 256 * 1024 * 1024))
+    
+    # Share the persistent store at VECTOR_STORE_PATH between worker processes:
+    # every worker maps the same snapshot, appends go through one locked WAL and
+    # workers pick up each other's writes via a generation counter
+    VECTOR_STORE_SHARED = os.getenv("VECTOR_STORE_SHARED", "false").lower() == "true"
+    
+    # Split the local store into this many shard processes (ids assigned by hash,
+    # queries fanned out to all shards and merged). With VECTOR_STORE_PATH each
+    # shard persists to its own subdirectory; VECTOR_STORE_SHARED does not apply,
+    # and the directory can only be open in one process (run a single worker)
+    VECTOR_SHARDS = int(os.getenv("VECTOR_SHARDS", 1))
+    
+    # Logging (backend/utils/log.py): default level, per-subsystem overrides such as
+    # "store=DEBUG,embeddings=WARNING", "text" or "json" lines, and the fraction of
+    # debug lines kept when debug is on
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+    LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", 1.0))
+    
+    # Vector backend (backend/utils/vector_backends.py), chosen once at startup:
+    # "local" store, "pinecone" SDK, "http" for a Pinecone-compatible index host at
+    # PINECONE_HOST (e.g. backend/utils/vector_server.py), or "auto" for Pinecone
+    # when a key and index are available, else local. Remote upserts send
+    # VECTOR_UPSERT_BATCH_SIZE vectors per request
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+    PINECONE_HOST = os.getenv("PINECONE_HOST")
+    PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "")
+    VECTOR_UPSERT_BATCH_SIZE = int(os.getenv("VECTOR_UPSERT_BATCH_SIZE", 100))
+    
+    # Write-behind upserts (backend/utils/write_behind.py): store calls return once
+    # queued and a background thread writes batches of VECTOR_WRITE_BEHIND_ITEMS
+    # vectors, or whatever is queued VECTOR_WRITE_BEHIND_DELAY_MS after the first
+    # one. Queued writes are visible to queries in the same process. Store calls
+    # block once VECTOR_WRITE_BEHIND_MAX_PENDING vectors are waiting to be written
+    VECTOR_WRITE_BEHIND = os.getenv("VECTOR_WRITE_BEHIND", "false").lower() == "true"
+    VECTOR_WRITE_BEHIND_ITEMS = int(os.getenv("VECTOR_WRITE_BEHIND_ITEMS", 200))
+    VECTOR_WRITE_BEHIND_DELAY_MS = float(os.getenv("VECTOR_WRITE_BEHIND_DELAY_MS", 50))
+    VECTOR_WRITE_BEHIND_MAX_PENDING = int(os.getenv("VECTOR_WRITE_BEHIND_MAX_PENDING", 10000))
@@ -1,170 +1,196 @@
 # ===== FILE: ./backend/pinecone_client.py =====
 
-import os
+import atexit
+import threading
 from dotenv import load_dotenv
-from backend.utils.embeddings import get_embedding
+from backend.config import Config
+from backend.utils.embeddings import get_embedding, batch_get_embeddings
+from backend.utils.log import get_logger
+from backend.utils.vector_backends import MAX_TOP_K, get_vector_backend
+from backend.utils.vector_filters import validate_filter
+from backend.utils.vector_results import FetchResponse, QueryResponse, Vector
+from backend.utils.write_behind import WriteBehindQueue, merge_pending
 
 load_dotenv()
+log = get_logger("pinecone")
 
-# Initialize without Pinecone first
-index = None
-USE_PINECONE = False
-
-print("🔧 Initializing storage system...")
-
-try:
-    from pinecone import Pinecone, ServerlessSpec
-    
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-    
-    if PINECONE_API_KEY:
-        print("🔧 Pinecone credentials found, attempting to connect...")
-        # Initialize Pinecone with new SDK
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        
-        # Connect to index
-        index_name = "talentmatch"
-        if index_name in pc.list_indexes().names():
-            index = pc.Index(index_name)
-            USE_PINECONE = True
-            print("✅ Using Pinecone for vector storage")
-        else:
-            print(f"⚠️  Pinecone index '{index_name}' not found. Using simple store.")
-            print("💡 To create the index, run:")
-            print(f"   pc.create_index(name='{index_name}', dimension=1536, metric='cosine')")
-            raise ImportError("Pinecone index not configured")
-    else:
-        print("⚠️  Pinecone credentials not found in environment variables")
-        raise ImportError("Pinecone credentials missing")
-        
-except ImportError as e:
-    print(f"⚠️  Pinecone import failed: {e}")
-except Exception as e:
-    print(f"⚠️  Pinecone setup failed: {e}")
-
-# Fallback to simple store if Pinecone not available
-if not USE_PINECONE:
-    print("🔄 Using simple in-memory vector store")
-    from backend.utils.simple_store import get_simple_store
-    index = get_simple_store()
-    print(f"✅ Simple store initialized. Type: {type(index)}")
-    print(f"✅ Simple store memory address: {id(index)}")
-
-def store_job_embedding(job_id: str, job_text: str, metadata: dict = None):
-    """Store job description embedding"""
-    print(f"📥 STORE_JOB: Attempting to store job: {job_id}")
+# Pick the vector backend once at startup (Config.VECTOR_BACKEND); every
+# store, fetch and query below goes through it
+USE_PINECONE = get_vector_backend().name != "local"
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue():
+    """The write-behind queue when Config.VECTOR_WRITE_BEHIND is on, else None"""
+    global _write_queue
+    if _write_queue is None and Config.VECTOR_WRITE_BEHIND:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteBehindQueue(
+                    get_vector_backend,
+                    max_items=Config.VECTOR_WRITE_BEHIND_ITEMS,
+                    max_delay=Config.VECTOR_WRITE_BEHIND_DELAY_MS / 1000,
+                    max_pending=Config.VECTOR_WRITE_BEHIND_MAX_PENDING,
+                )
+                atexit.register(_write_queue.close)
+    return _write_queue
+
+def flush_writes(timeout: float = None) -> bool:
+    """Wait until every queued write has reached the backend; False if any failed or it timed out"""
+    queue = get_write_queue()
+    return queue.flush(timeout) if queue is not None else True
+
+def _upsert(items: list, wait: bool):
+    """Upsert now, or queue when write-behind is on (and with wait, block until written)"""
+    queue = get_write_queue()
+    if queue is None:
+        get_vector_backend().upsert(items)
+        return True
+    ticket = queue.put(items)
+    return queue.wait(ticket) if wait else True
+
+def _query_many(vectors, top_k: int, filter: dict) -> list:
+    """Backend query that also sees this process's queued writes"""
+    queue = get_write_queue()
+    pending = queue.pending() if queue is not None else None
+    backend = get_vector_backend()
+    if not pending:
+        return backend.query_many(vectors, top_k=top_k, filter=filter)
+    # Pending ids the backend returns are replaced by merge_pending, so ask again
+    # for that many more; only ids already written before can come back
+    extra = 0
+    while True:
+        requested = min(top_k + extra, MAX_TOP_K)
+        results = backend.query_many(vectors, top_k=requested, filter=filter)
+        replaced = max(sum(match.id in pending for match in result.matches) for result in results)
+        exhausted = all(len(result.matches) < requested for result in results)
+        if replaced <= extra or exhausted or requested == MAX_TOP_K:
+            return merge_pending(results, vectors, top_k, filter, pending)
+        extra = replaced
+
+def _query(vector, top_k: int, filter: dict, reduced: bool = False):
+    queue = get_write_queue()
+    # Queued writes are full-size, so a reduced query vector is only searched in the backend
+    if queue is None or reduced or not queue.pending():
+        return get_vector_backend().query(vector, top_k=top_k, filter=filter, reduced=reduced)
+    return _query_many([vector], top_k, filter)[0]
+
+def store_job_embedding(job_id: str, job_text: str, metadata: dict = None, wait: bool = False):
+    """Store job description embedding (wait: with write-behind on, return only once written)"""
     try:
         embedding = get_embedding(job_text)
-        print(f"🔧 STORE_JOB: Generated embedding of length: {len(embedding)}")
-        
+
         if metadata is None:
             metadata = {}
-        
+
         metadata.update({"text": job_text[:1000], "type": "job"})
-        print(f"🔧 STORE_JOB: Final metadata keys: {list(metadata.keys())}")
-        
-        # Ensure we're using the same store instance
-        from backend.utils.simple_store import get_simple_store
-        current_store = get_simple_store()
-        print(f"🔧 STORE_JOB: Using store at memory address: {id(current_store)}")
-        
-        current_store.upsert([(job_id, embedding, metadata)])
-        print(f"✅ STORE_JOB: Successfully stored job: {job_id}")
-        return True
-    except Exception as e:
-        print(f"❌ STORE_JOB: Failed to store job embedding: {e}")
-        import traceback
-        traceback.print_exc()
+        stored = _upsert([(job_id, embedding, metadata)], wait)
+        log.debug("Stored job", id=job_id)
+        return stored
+    except Exception:
+        log.exception("Failed to store job embedding", id=job_id)
         return False
 
-def store_candidate_embedding(candidate_id: str, resume_text: str, metadata: dict = None):
-    """Store candidate resume embedding"""
-    print(f"📥 STORE_CANDIDATE: Attempting to store candidate: {candidate_id}")
-    print(f"🔧 STORE_CANDIDATE: Candidate name: {metadata.get('name', 'Unknown') if metadata else 'No metadata'}")
+def store_candidate_embedding(candidate_id: str, resume_text: str, metadata: dict = None, wait: bool = False):
+    """Store candidate resume embedding (wait as in store_job_embedding)"""
     try:
         embedding = get_embedding(resume_text)
-        print(f"🔧 STORE_CANDIDATE: Generated embedding of length: {len(embedding)}")
-        
+
         if metadata is None:
             metadata = {}
-        
+
         metadata.update({"text": resume_text[:1000], "type": "candidate"})
-        print(f"🔧 STORE_CANDIDATE: Final metadata keys: {list(metadata.keys())}")
-        
-        # Ensure we're using the same store instance
-        from backend.utils.simple_store import get_simple_store
-        current_store = get_simple_store()
-        print(f"🔧 STORE_CANDIDATE: Using store at memory address: {id(current_store)}")
-        
-        current_store.upsert([(candidate_id, embedding, metadata)])
-        print(f"✅ STORE_CANDIDATE: Successfully stored candidate: {candidate_id}")
-        return True
-    except Exception as e:
-        print(f"❌ STORE_CANDIDATE: Failed to store candidate embedding: {e}")
-        import traceback
-        traceback.print_exc()
+        stored = _upsert([(candidate_id, embedding, metadata)], wait)
+        log.debug("Stored candidate", id=candidate_id)
+        return stored
+    except Exception:
+        log.exception("Failed to store candidate embedding", id=candidate_id)
         return False
 
-def find_similar_candidates(job_text: str, top_k: int = 10):
-    """Find similar candidates for a job"""
-    print(f"🔍 FIND_CANDIDATES: Finding candidates for job text: {job_text[:50]}...")
+def store_candidate_embeddings(items: list, wait: bool = False):
+    """Store many already-embedded candidates; remote backends send them in batches.
+
+    items: (candidate_id, embedding, resume_text, metadata) tuples
+    """
+    try:
+        vectors = []
+        for candidate_id, embedding, resume_text, metadata in items:
+            metadata = dict(metadata or {})
+            metadata.update({"text": resume_text[:1000], "type": "candidate"})
+            vectors.append((candidate_id, embedding, metadata))
+
+        stored = _upsert(vectors, wait)
+        log.debug("Stored candidates", count=len(vectors))
+        return stored
+    except Exception:
+        log.exception("Failed to store candidate embeddings", count=len(items))
+        return False
+
+def fetch_vectors(ids: list):
+    """Stored vectors and metadata by id (ids that are not stored are left out)"""
+    try:
+        queue = get_write_queue()
+        pending = queue.pending() if queue is not None else {}
+        response = get_vector_backend().fetch([vector_id for vector_id in ids if vector_id not in pending])
+        for vector_id in ids:
+            if vector_id in pending:
+                vector, metadata = pending[vector_id]
+                response.vectors[vector_id] = Vector(vector_id, vector, metadata)
+        return response
+    except Exception:
+        log.exception("Failed to fetch vectors", count=len(ids))
+        return FetchResponse()
+
+def find_similar_candidates(job_text: str, top_k: int = 10, filter: dict = None):
+    """Find similar candidates for a job, optionally restricted by a metadata filter (FilterError if invalid)"""
+    if filter:
+        validate_filter(filter)
     try:
         job_embedding = get_embedding(job_text)
-        print(f"🔧 FIND_CANDIDATES: Generated job embedding of length: {len(job_embedding)}")
-        
-        # Ensure we're using the same store instance
-        from backend.utils.simple_store import get_simple_store
-        current_store = get_simple_store()
-        print(f"🔧 FIND_CANDIDATES: Using store at memory address: {id(current_store)}")
-        
-        if USE_PINECONE:
-            results = index.query(
-                vector=job_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter={"type": "candidate"}
-            )
-        else:
-            # Use simple store
-            results = current_store.query(job_embedding, top_k=top_k, filter={"type": "candidate"})
-        
-        print(f"✅ FIND_CANDIDATES: Search completed")
+        results = _query(job_embedding, top_k, {**(filter or {}), "type": "candidate"})
+        log.debug("Found similar candidates", top_k=top_k, filter=filter)
         return results
-    except Exception as e:
-        print(f"❌ FIND_CANDIDATES: Failed to find similar candidates: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Failed to find similar candidates")
         # Return empty results
-        return type('MockResults', (), {'matches': []})
+        return QueryResponse()
+
+def find_similar_candidates_batch(job_texts: list, top_k: int = 10, filter: dict = None):
+    """Find similar candidates for several jobs at once; one results object per job, in order"""
+    if filter:
+        validate_filter(filter)
+    try:
+        job_embeddings = batch_get_embeddings(job_texts)
+        candidate_filter = {**(filter or {}), "type": "candidate"}
+        # The local store scores the whole batch in one pass; remote backends query per job
+        results = _query_many(job_embeddings, top_k, candidate_filter)
+        log.debug("Found similar candidates for jobs", jobs=len(job_texts), top_k=top_k, filter=filter)
+        return results
+    except Exception:
+        log.exception("Failed to find similar candidates", jobs=len(job_texts))
+        return [QueryResponse() for _ in job_texts]
 
-def find_similar_jobs(candidate_text: str, top_k: int = 5):
-    """Find similar jobs for a candidate"""
-    print(f"🔍 FIND_JOBS: Finding jobs for candidate text: {candidate_text[:50]}...")
+def find_similar_jobs(candidate_text: str, top_k: int = 5, filter: dict = None):
+    """Find similar jobs for a candidate, optionally restricted by a metadata filter (FilterError if invalid)"""
+    if filter:
+        validate_filter(filter)
     try:
         candidate_embedding = get_embedding(candidate_text)
-        print(f"🔧 FIND_JOBS: Generated candidate embedding of length: {len(candidate_embedding)}")
-        
-        # Ensure we're using the same store instance
-        from backend.utils.simple_store import get_simple_store
-        current_store = get_simple_store()
-        print(f"🔧 FIND_JOBS: Using store at memory address: {id(current_store)}")
-        
-        if USE_PINECONE:
-            results = index.query(
-                vector=candidate_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter={"type": "job"}
-            )
-        else:
-            # Use simple store
-            results = current_store.query(candidate_embedding, top_k=top_k, filter={"type": "job"})
-        
-        print(f"✅ FIND_JOBS: Search completed")
+    except Exception:
+        log.exception("Failed to find similar jobs")
+        return QueryResponse()
+    return find_similar_jobs_for_vector(candidate_embedding, top_k=top_k, filter=filter)
+
+def find_similar_jobs_for_vector(vector, top_k: int = 5, filter: dict = None, reduced: bool = False):
+    """find_similar_jobs for an already-embedded candidate (reduced: a fetched Vector.reduced)"""
+    if filter:
+        validate_filter(filter)
+    try:
+        results = _query(vector, top_k, {**(filter or {}), "type": "job"}, reduced)
+        log.debug("Found similar jobs", top_k=top_k, filter=filter)
         return results
-    except Exception as e:
-        print(f"❌ FIND_JOBS: Failed to find similar jobs: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Failed to find similar jobs")
         # Return empty results
-        return type('MockResults', (), {'matches': []})
\ No newline at end of file
+        return QueryResponse()
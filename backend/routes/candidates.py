@@ -2,10 +2,17 @@
 
 from flask import Blueprint, request, jsonify
 from backend.utils.scoring import score_candidate
-from backend.pinecone_client import store_candidate_embedding, find_similar_jobs
+from backend.config import Config
+from backend.pinecone_client import (
+    store_candidate_embedding, store_candidate_embeddings, fetch_vectors, find_similar_jobs_for_vector, flush_writes
+)
+from backend.utils.embeddings import batch_get_embeddings
+from backend.utils.ingest import ingest_candidates
+from backend.utils.log import get_logger
 import uuid
 
 candidates_bp = Blueprint("candidates", __name__)
+log = get_logger("routes")
 
 # GET index route for testing
 @candidates_bp.route("/", methods=["GET"])
@@ -23,21 +30,32 @@ def upload_candidates():
     if not candidates:
         return jsonify({"error": "Candidates are required"}), 400
 
+    pipeline = request.args.get("pipeline", "").lower() in ("1", "true")
+    # With write-behind on, ?wait=true returns only once the vectors are written
+    wait = request.args.get("wait", "").lower() in ("1", "true")
+    if pipeline or len(candidates) >= Config.INGEST_MIN_BATCH:
+        return jsonify(_ingest_bulk(candidates, wait))
+
+    # Embed all resumes in one chunked, concurrent batch and store them in one
+    # upsert (remote backends split it into VECTOR_UPSERT_BATCH_SIZE requests)
+    resumes = [candidate.get("resume", "") for candidate in candidates]
+    embeddings = batch_get_embeddings(resumes)
+
     processed_candidates = []
-    for candidate in candidates:
+    items = []
+    for candidate, resume, embedding in zip(candidates, resumes, embeddings):
         candidate_id = f"candidate_{uuid.uuid4().hex}"
-        
-        # Store candidate in Pinecone
-        store_candidate_embedding(
-            candidate_id=candidate_id,
-            resume_text=candidate.get("resume", ""),
-            metadata={
+        items.append((
+            candidate_id,
+            embedding,
+            resume,
+            {
                 "name": candidate.get("name", ""),
                 "email": candidate.get("email", ""),
                 "experience": candidate.get("experience", ""),
                 "skills": candidate.get("skills", [])
             }
-        )
+        ))
         
         # Score candidate (now using actual similarity)
         scored_candidate = {
@@ -51,8 +69,43 @@ def upload_candidates():
         
         processed_candidates.append(scored_candidate)
 
+    if not store_candidate_embeddings(items, wait=wait):
+        for entry in processed_candidates:
+            entry.update(status="error", error="Vector store upsert failed")
     return jsonify(processed_candidates)
 
+def _ingest_bulk(candidates, wait=False):
+    """Process-pool pipeline for large uploads; per-candidate status in input order"""
+    records = []
+    for candidate in candidates:
+        records.append((
+            f"candidate_{uuid.uuid4().hex}",
+            candidate.get("resume", ""),
+            {
+                "name": candidate.get("name", ""),
+                "email": candidate.get("email", ""),
+                "experience": candidate.get("experience", ""),
+                "skills": candidate.get("skills", [])
+            }
+        ))
+    
+    results = ingest_candidates(records, store_candidate_embeddings)
+    if wait and not flush_writes():
+        for result in results:
+            if result["status"] == "stored":
+                result.update(status="error", error="Vector store upsert failed")
+    processed_candidates = []
+    for (candidate_id, _, metadata), result in zip(records, results):
+        entry = {
+            "id": candidate_id,
+            **metadata,
+            "status": "processed" if result["status"] == "stored" else "error"
+        }
+        if result["error"]:
+            entry["error"] = result["error"]
+        processed_candidates.append(entry)
+    return processed_candidates
+
 # POST route to add a single candidate
 @candidates_bp.route("/add", methods=["POST"])
 def add_candidate():
@@ -90,19 +143,17 @@ def add_candidate():
 def get_candidate_jobs(candidate_id):
     """Get matching jobs for a specific candidate"""
     try:
-        # Fetch candidate data from Pinecone
-        candidate_data = index.fetch(ids=[candidate_id])
+        # Fetch candidate data from the vector backend
+        candidate_data = fetch_vectors([candidate_id])
         if candidate_id not in candidate_data.vectors:
             return jsonify({"error": "Candidate not found"}), 404
         
         candidate_vector = candidate_data.vectors[candidate_id]
         
         # Find similar jobs
-        similar_jobs = index.query(
-            vector=candidate_vector.values,
-            top_k=5,
-            include_metadata=True,
-            filter={"type": "job"}
+        # A store that keeps only reduced vectors hands back the reduced one
+        similar_jobs = find_similar_jobs_for_vector(
+            candidate_vector.values, top_k=5, reduced=candidate_vector.reduced
         )
         
         matches = []
@@ -131,17 +182,14 @@ def debug_candidates():
         from backend.utils.simple_store import get_simple_store
         
         current_store = get_simple_store()
-        print(f"🔧 DEBUG: Using store at memory address: {id(current_store)}")
-        print(f"🔧 DEBUG: Store type: {type(current_store)}")
         
         # Get all candidate IDs from simple store
         if hasattr(current_store, 'metadata'):
             candidates = []
-            print(f"🔧 DEBUG: Total items in metadata: {len(current_store.metadata)}")
-            print(f"🔧 DEBUG: Metadata keys: {list(current_store.metadata.keys())}")
+            # Only the first 100 characters of each text preview are decoded
+            items = current_store.metadata_items(text_limit=100)
             
-            for vector_id, metadata in current_store.metadata.items():
-                print(f"🔧 DEBUG: Checking item: {vector_id} -> type: {metadata.get('type')}")
+            for vector_id, metadata in items:
                 if metadata.get('type') == 'candidate':
                     candidates.append({
                         'id': vector_id,
@@ -151,7 +199,7 @@ def debug_candidates():
                         'text_preview': metadata.get('text', '')[:100] + '...' if metadata.get('text') else ''
                     })
             
-            print(f"🔧 DEBUG: Found {len(candidates)} candidates")
+            log.debug("Debug listing", items=len(items), candidates=len(candidates))
             return jsonify({
                 "total_candidates": len(candidates),
                 "candidates": candidates,
@@ -160,7 +208,7 @@ def debug_candidates():
                 "total_vectors": len(current_store.vectors) if hasattr(current_store, 'vectors') else 0
             })
         else:
-            print("🔧 DEBUG: Store doesn't have metadata attribute")
+            log.warning("Debug listing: store has no metadata", store_type=type(current_store).__name__)
             return jsonify({
                 "error": "Simple store not accessible", 
                 "store_type": type(current_store).__name__,
@@ -168,7 +216,5 @@ def debug_candidates():
             })
             
     except Exception as e:
-        print(f"❌ DEBUG: Debug endpoint error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Debug endpoint error")
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
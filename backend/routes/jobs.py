@@ -3,6 +3,7 @@
 from flask import Blueprint, request, jsonify
 from backend.utils.parser import parse_job_description
 from backend.pinecone_client import store_job_embedding, find_similar_candidates
+from backend.utils.vector_filters import FilterError, validate_filter
 import uuid
 
 jobs_bp = Blueprint("jobs", __name__)
@@ -18,6 +19,13 @@ def analyze_job():
         if not job_text:
             return jsonify({"error": "Job description is required"}), 400
 
+        # Optional metadata filter for the candidate search, e.g.
+        # {"skills": {"$in": ["Python"]}, "experience": {"$gte": 3}}; checked
+        # before anything is stored
+        candidate_filter = data.get("filter")
+        if candidate_filter is not None:
+            validate_filter(candidate_filter)
+
         # Parse job description
         parsed = parse_job_description(job_text)
         
@@ -36,27 +44,18 @@ def analyze_job():
         )
         
         # Find matching candidates
-        similar_candidates = find_similar_candidates(job_text, top_k=10)
+        similar_candidates = find_similar_candidates(job_text, top_k=10, filter=candidate_filter)
         
         # Format response
         matches = []
         if hasattr(similar_candidates, 'matches'):
             for match in similar_candidates.matches:
-                # Handle both Pinecone and simple store formats
-                if hasattr(match, 'id'):
-                    # Pinecone format
-                    matches.append({
-                        "candidate_id": match.id,
-                        "score": round(match.score * 100, 2),
-                        "metadata": getattr(match, 'metadata', {})
-                    })
-                else:
-                    # Simple store format (dict)
-                    matches.append({
-                        "candidate_id": match.get('id', 'unknown'),
-                        "score": round(match.get('score', 0) * 100, 2),
-                        "metadata": match.get('metadata', {})
-                    })
+                # Pinecone and the local stores both return matches with .id/.score/.metadata
+                matches.append({
+                    "candidate_id": match.id,
+                    "score": round(match.score * 100, 2),
+                    "metadata": getattr(match, 'metadata', None) or {}
+                })
         
         response = {
             **parsed,
@@ -68,6 +67,8 @@ def analyze_job():
         
         return jsonify(response)
         
+    except FilterError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
@@ -1,11 +1,13 @@
 # ===== FILE: ./backend/routes/questions.py =====
 
 from flask import Blueprint, request, jsonify
+from backend.utils.log import get_logger
 from backend.utils.question_generator import generate_mock_questions
 import openai
 import os
 
 questions_bp = Blueprint("questions", __name__)
+log = get_logger("routes")
 
 # POST route to generate questions
 @questions_bp.route("/generate", methods=["POST"])
@@ -71,7 +73,7 @@ def generate_questions():
             raise Exception("No OpenAI API key")
             
     except Exception as e:
-        print(f"⚠️  OpenAI question generation failed: {e}, using mock questions")
+        log.warning("OpenAI question generation failed, using mock questions", error=e)
         # Fallback to mock questions
         questions = generate_mock_questions(job_description, job_skills, candidate_skills)
         
@@ -0,0 +1,18 @@
+"""Helpers shared by the vector store tests"""
+
+import numpy as np
+
+
+def random_vectors(count, dimensions=64, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dimensions)).astype(np.float32)
+
+
+def items(vectors, start=0):
+    return [
+        (f"id_{i}", vector, {"type": "candidate" if i % 2 else "job", "name": f"n{i}", "skills": ["python"]})
+        for i, vector in enumerate(vectors, start)
+    ]
+
+
+def results(store, queries, filter=None):
+    return [[(m["id"], round(m["score"], 5)) for m in store.query(q, top_k=5, filter=filter).matches] for q in queries]
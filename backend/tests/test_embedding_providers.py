@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from backend.utils.embedding_providers import (
+    EmbeddingProviderError,
+    FingerprintProvider,
+    OpenAIEmbeddingProvider,
+    embed_texts,
+)
+from backend.utils.embedding_server import LocalEmbeddingServer
+from backend.utils.embeddings import get_text_fingerprints
+
+TEXTS = [f"Candidate {i}: python developer with {i} years of flask" for i in range(50)]
+
+
+@pytest.fixture
+def server():
+    with LocalEmbeddingServer(max_batch_size=8) as server:
+        yield server
+
+
+def test_fingerprint_provider_chunks_in_order():
+    provider = FingerprintProvider(max_batch_size=7)
+    matrix = embed_texts(provider, TEXTS, max_workers=3)
+    np.testing.assert_array_equal(matrix, get_text_fingerprints(TEXTS))
+
+
+def test_openai_provider_against_local_server(server):
+    provider = OpenAIEmbeddingProvider(api_key="test", base_url=server.url, max_batch_size=8)
+    matrix = embed_texts(provider, TEXTS, max_workers=4)
+    np.testing.assert_allclose(matrix, get_text_fingerprints(TEXTS), atol=1e-7)
+    assert server.request_count == 7
+    assert max(server.batch_sizes) == 8
+
+
+def test_chunk_retries_with_backoff(server):
+    provider = OpenAIEmbeddingProvider(api_key="test", base_url=server.url, max_batch_size=8)
+    server.fail_next(2, status=503)
+    matrix = embed_texts(provider, TEXTS[:8], max_retries=3, backoff=0.001)
+    assert matrix.shape == (8, 1536)
+    assert server.request_count == 3
+
+
+def test_non_retryable_error_is_raised(server):
+    provider = OpenAIEmbeddingProvider(api_key="test", base_url=server.url, max_batch_size=8)
+    server.fail_next(1, status=400)
+    with pytest.raises(EmbeddingProviderError):
+        embed_texts(provider, TEXTS[:4], backoff=0.001)
+    assert server.request_count == 1
@@ -0,0 +1,138 @@
+import hashlib
+import random
+
+import numpy as np
+import pytest
+from backend.utils.embeddings import (
+    KEYWORD_BOOSTS,
+    get_text_fingerprint,
+    get_text_fingerprints,
+)
+
+
+def legacy_fingerprint(text, dimensions=1536):
+    """The original pure-Python fingerprint, kept as the reference implementation"""
+    text_lower = text.lower()
+    seed = int(hashlib.md5(text_lower.encode()).hexdigest(), 16) % 10000
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 0.2) for _ in range(dimensions)]
+    for keyword, indices in KEYWORD_BOOSTS.items():
+        if keyword in text_lower:
+            boost_strength = 0.5 + (text_lower.count(keyword) * 0.2)
+            for idx in indices:
+                if idx < dimensions:
+                    vector[idx] += boost_strength
+    norm = (sum(x * x for x in vector) ** 0.5) or 1.0
+    return [x / norm for x in vector]
+
+
+TEXTS = [
+    "Senior Python developer with Flask, Django and PostgreSQL",
+    "JavaScript React frontend engineer; some Java and Node",
+    "",
+    "Docker AWS cloud microservices " * 50,
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_fingerprint_matches_legacy_vectors(text):
+    vector = get_text_fingerprint(text)
+    assert vector.dtype == np.float32
+    assert vector.shape == (1536,)
+    np.testing.assert_allclose(vector, legacy_fingerprint(text), atol=1e-6)
+
+
+def test_fingerprint_respects_dimensions():
+    vector = get_text_fingerprint("python api", dimensions=33)
+    np.testing.assert_allclose(vector, legacy_fingerprint("python api", 33), atol=1e-6)
+
+
+def test_batch_fingerprints_match_single():
+    matrix = get_text_fingerprints(TEXTS)
+    assert matrix.shape == (len(TEXTS), 1536)
+    for row, text in zip(matrix, TEXTS):
+        np.testing.assert_array_equal(row, get_text_fingerprint(text))
+    assert get_text_fingerprints([]).shape == (0, 1536)
+
+
+def test_embedding_cache_lru_and_stats():
+    from backend.utils.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=2)
+    keys = [cache.make_key(text, "model") for text in ("a", "b", "c")]
+    assert cache.get(keys[0]) is None
+    for key in keys:
+        cache.put(key, np.ones(4))
+    assert cache.get(keys[0]) is None  # evicted
+    assert cache.get(keys[2]) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["size"] == 2
+    assert cache.make_key("a", "model") != cache.make_key("a", "other-model")
+
+
+def test_embedding_cache_disk_tier_survives_restart(tmp_path):
+    from backend.utils.embedding_cache import EmbeddingCache
+
+    key = EmbeddingCache.make_key("python developer", "model")
+    EmbeddingCache(cache_dir=str(tmp_path)).put(key, np.arange(4))
+    restarted = EmbeddingCache(cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(restarted.get(key), np.arange(4, dtype=np.float32))
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_get_embedding_uses_cache(monkeypatch):
+    from backend.utils import embeddings
+    from backend.utils.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=16)
+    monkeypatch.setattr(embeddings, "get_embedding_cache", lambda: cache)
+
+    first = embeddings.get_embedding("Python developer")
+    assert embeddings.get_embedding("python DEVELOPER") is first
+    batch = embeddings.batch_get_embeddings(["python developer", "Java dev", "java dev"])
+    np.testing.assert_array_equal(batch[0], first)
+    np.testing.assert_array_equal(batch[1], batch[2])
+    stats = cache.stats()
+    assert stats["misses"] == 3 and stats["size"] == 2
+
+
+def test_cache_keys_depend_on_provider_dimensions(monkeypatch):
+    from backend.utils import embeddings
+    from backend.utils.embedding_cache import EmbeddingCache
+    from backend.utils.embedding_providers import FingerprintProvider, OpenAIEmbeddingProvider
+
+    cache = EmbeddingCache(max_entries=16)
+    monkeypatch.setattr(embeddings, "get_embedding_cache", lambda: cache)
+    for dimensions in (1536, 256):
+        monkeypatch.setattr(embeddings, "get_embedding_provider", lambda: FingerprintProvider(dimensions=dimensions))
+        assert embeddings.get_embedding("python developer").shape == (dimensions,)
+    assert cache.stats()["misses"] == 2
+
+    local = OpenAIEmbeddingProvider("key", base_url="http://localhost:8080")
+    remote = OpenAIEmbeddingProvider("key")
+    assert local.model_key() == local.model_key("text-embedding-ada-002") != remote.model_key()
+
+
+def test_fingerprint_leaves_global_random_untouched():
+    random.seed(1234)
+    expected = random.random()
+    random.seed(1234)
+    get_text_fingerprint("python developer with a fresh seed 4242")
+    assert random.random() == expected
+
+
+def test_fingerprints_are_identical_across_thread_and_process_pools():
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    texts = [f"resume {i}: python flask docker aws" for i in range(64)]
+    serial = get_text_fingerprints(texts)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        threaded = np.stack(list(pool.map(get_text_fingerprint, texts)))
+    np.testing.assert_array_equal(threaded, serial)
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        chunks = list(pool.map(get_text_fingerprints, [texts[:32], texts[32:]]))
+    np.testing.assert_array_equal(np.concatenate(chunks), serial)
@@ -0,0 +1,93 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from backend.utils.embedding_providers import EmbeddingProviderError, FingerprintProvider
+from backend.utils.embeddings import get_text_fingerprints
+from backend.utils.ingest import _embed_work_unit, ingest_candidates
+
+
+class FlakyProvider(FingerprintProvider):
+    """Fails any batch containing 'BOOM' (module level so it pickles into workers)"""
+
+    def embed_batch(self, texts, model=None):
+        if any("BOOM" in text for text in texts):
+            raise ValueError("cannot embed")
+        return super().embed_batch(texts, model)
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_ingest_returns_results_in_order_with_per_item_errors(executor):
+    texts = [f"candidate {i} python flask" for i in range(25)]
+    texts[7] = "BOOM resume"
+    records = [(f"c{i}", text, {"name": f"n{i}"}) for i, text in enumerate(texts)]
+    batches = []
+
+    def store_batch(items):
+        batches.append(items)
+        return True
+
+    results = ingest_candidates(records, store_batch, batch_size=10, chunk_size=4,
+                                executor=executor, provider=FlakyProvider())
+
+    assert [r["id"] for r in results] == [f"c{i}" for i in range(25)]
+    assert results[7]["status"] == "error" and "cannot embed" in results[7]["error"]
+    assert all(r["status"] == "stored" for i, r in enumerate(results) if i != 7)
+    assert [len(batch) for batch in batches] == [10, 10, 4]
+
+    stored = {item[0]: item[1] for batch in batches for item in batch}
+    np.testing.assert_array_equal(stored["c3"], get_text_fingerprints([texts[3]])[0])
+
+
+class RateLimitedProvider(FingerprintProvider):
+    """Answers the first `failures` calls with a retryable error"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.calls = 0
+
+    def embed_batch(self, texts, model=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise EmbeddingProviderError("rate limited", retryable=True)
+        return super().embed_batch(texts, model)
+
+
+def test_work_unit_retries_retryable_failures_as_one_batch():
+    texts = [f"candidate {i} python" for i in range(6)]
+    provider = RateLimitedProvider(failures=2)
+    vectors, errors = _embed_work_unit(provider, texts, None, max_retries=3, backoff=0)
+    assert errors == [None] * 6 and provider.calls == 3
+    np.testing.assert_array_equal(vectors[4], get_text_fingerprints([texts[4]])[0])
+
+    # Out of retries: the whole unit fails, without a call per item
+    provider = RateLimitedProvider(failures=10)
+    vectors, errors = _embed_work_unit(provider, texts, None, max_retries=2, backoff=0)
+    assert vectors == [None] * 6 and all("rate limited" in error for error in errors)
+    assert provider.calls == 3
+
+
+def test_ingest_reports_failed_upserts(executor):
+    records = [("a", "python", {}), ("b", "java", {})]
+    results = ingest_candidates(records, lambda items: False, executor=executor, provider=FlakyProvider())
+    assert [r["status"] for r in results] == ["error", "error"]
+
+
+def test_upload_pipeline_mode(monkeypatch, executor):
+    from backend.app import app
+    from backend.utils import ingest
+
+    monkeypatch.setattr(ingest, "get_ingest_pool", lambda: executor)
+    response = app.test_client().post(
+        "/api/upload?pipeline=1",
+        json={"candidates": [{"name": "Jane", "resume": "Python developer"}, {"name": "Joe", "resume": "Java"}]},
+    )
+    assert response.status_code == 200
+    assert [c["name"] for c in response.json] == ["Jane", "Joe"]
+    assert all(c["status"] == "processed" for c in response.json)
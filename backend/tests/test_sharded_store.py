@@ -0,0 +1,112 @@
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from backend.utils.sharded_store import ShardedVectorStore, shard_for
+from backend.utils.simple_store import SimpleVectorStore
+from backend.utils.store_persistence import open_store
+from conftest import items, random_vectors, results
+
+
+@pytest.fixture
+def sharded():
+    stores = []
+
+    def make(shards, **options):
+        stores.append(ShardedVectorStore(shards, **options))
+        return stores[-1]
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_shard_for_is_balanced_and_moves_little_on_growth():
+    ids = [f"id_{i}" for i in range(4000)]
+    counts = Counter(shard_for(vector_id, 4) for vector_id in ids)
+    assert sorted(counts) == [0, 1, 2, 3] and min(counts.values()) > 800
+    moved = [vector_id for vector_id in ids if shard_for(vector_id, 4) != shard_for(vector_id, 5)]
+    assert all(shard_for(vector_id, 5) == 4 for vector_id in moved)
+    assert 600 < len(moved) < 1000
+
+
+def test_sharded_results_match_a_single_store(sharded):
+    vectors = random_vectors(400)
+    single = SimpleVectorStore()
+    single.upsert(items(vectors))
+    store = sharded(3)
+    store.upsert(items(vectors))
+    queries = vectors[:6] + 0.1
+
+    assert len(store.vectors) == 400
+    assert results(store, queries) == results(single, queries)
+    assert results(store, queries, {"type": "job"}) == results(single, queries, {"type": "job"})
+    batch = [[m["id"] for m in r.matches] for r in store.query_many(queries, top_k=5)]
+    assert batch == [[i for i, _ in r] for r in results(single, queries)]
+    assert store.fetch(["id_7"]).vectors["id_7"].metadata["name"] == "n7"
+
+    stats = store.stats()
+    assert [s["shard"] for s in stats["shards"]] == [0, 1, 2]
+    assert all(s["queries"] == 13 and s["p95_ms"] > 0 for s in stats["shards"])
+    assert sum(s["vectors"] for s in stats["shards"]) == 400
+
+
+def test_resize_rebalances_and_persists(tmp_path, sharded):
+    vectors = random_vectors(300)
+    store = sharded(2, path=str(tmp_path))
+    store.upsert(items(vectors))
+    expected = results(store, vectors[:5])
+
+    store.resize(3)
+    assert sorted(s["vectors"] for s in store.stats()["shards"])[0] > 50
+    assert results(store, vectors[:5]) == expected
+    store.upsert([("id_0", vectors[9], {"type": "job", "name": "moved"})])
+    store.close()
+
+    # Reopened with fewer shards: the extra shard's ids move back
+    reopened = sharded(2, path=str(tmp_path))
+    assert reopened.shard_count == 2 and len(reopened.vectors) == 300
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == ["shard-0", "shard-1"]
+    assert reopened.metadata["id_0"]["name"] == "moved"
+    assert results(reopened, vectors[1:5]) == expected[1:]
+
+
+def test_store_directory_is_locked_to_one_process(tmp_path, sharded):
+    import subprocess
+    import sys
+
+    store = sharded(2, path=str(tmp_path))
+    store.upsert(items(random_vectors(20)))
+    script = (
+        "from backend.utils.sharded_store import ShardedVectorStore\n"
+        f"ShardedVectorStore(2, path={str(tmp_path)!r})\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    other = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True)
+    assert other.returncode != 0 and "open in another process" in other.stderr
+    assert len(store.vectors) == 20
+
+    store.close()
+    reopened = sharded(2, path=str(tmp_path))
+    assert len(reopened.vectors) == 20
+
+
+def test_interrupted_rebalance_is_finished_on_open(tmp_path, sharded):
+    vectors = random_vectors(200)
+    store = sharded(2, path=str(tmp_path))
+    store.upsert(items(vectors))
+    store.close()
+    # A crash after the moved items were copied but before the old shard dropped them
+    shard = open_store(str(tmp_path / "shard-0"))
+    shard.upsert(items(vectors))
+    shard.persistence.close()
+    (tmp_path / "RESIZING").write_text("2")
+
+    reopened = sharded(2, path=str(tmp_path))
+    assert len(reopened.vectors) == 200
+    assert sum(s["vectors"] for s in reopened.stats()["shards"]) == 200
+    assert not (tmp_path / "RESIZING").exists()
+    assert len({m.id for m in reopened.query(vectors[0], top_k=400).matches}) == 200
+    assert len(reopened.query(vectors[0], top_k=400).matches) == 200
@@ -0,0 +1,674 @@
+import numpy as np
+import pytest
+from backend.utils.simple_store import SimpleVectorStore
+from backend.utils.vector_codecs import compare_storage_modes, normalize
+from backend.utils.vector_filters import FilterError
+from conftest import items, random_vectors
+
+
+def fill(store, vectors):
+    store.upsert(items(vectors))
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_compact_storage_matches_float32_ranking(storage):
+    vectors = random_vectors(200)
+    exact, compact = SimpleVectorStore(), SimpleVectorStore(storage=storage)
+    fill(exact, vectors)
+    fill(compact, vectors)
+
+    query = vectors[3] + 0.1
+    expected = exact.query(query, top_k=5, filter={"type": "candidate"}).matches
+    found = compact.query(query, top_k=5, filter={"type": "candidate"}).matches
+    assert [m["id"] for m in found] == [m["id"] for m in expected]
+    for got, want in zip(found, expected):
+        assert got["score"] == pytest.approx(want["score"], abs=0.02)
+        assert got["metadata"]["type"] == "candidate"
+
+
+def test_compact_storage_upsert_fetch_and_memory():
+    store = SimpleVectorStore(storage="int8")
+    vectors = random_vectors(10)
+    fill(store, vectors)
+    store.upsert([("id_0", vectors[1], {"type": "job"})])
+
+    assert len(store.vectors) == 10
+    fetched = store.fetch(["id_0", "missing"]).vectors
+    assert list(fetched) == ["id_0"]
+    np.testing.assert_allclose(fetched["id_0"].values, normalize(vectors[1]), atol=0.01)
+    assert store.memory_stats()["bytes_per_vector"] == 64 + 4
+
+
+def test_compare_storage_modes_reports_memory_and_recall():
+    vectors = random_vectors(500)
+    report = compare_storage_modes(vectors, vectors[:20] + 0.05, top_k=10)
+    assert report["float32"] == {"bytes_per_vector": 256, "recall_at_k": 1.0}
+    assert report["float16"]["bytes_per_vector"] == 128
+    assert report["int8"]["bytes_per_vector"] == 68
+    assert report["float16"]["recall_at_k"] > 0.95
+    assert report["int8"]["recall_at_k"] > 0.9
+
+
+@pytest.mark.parametrize("projection", ["random", "pca"])
+def test_reduced_dimensions_with_exact_rescoring(projection):
+    vectors = random_vectors(300, dimensions=256)
+    exact = SimpleVectorStore()
+    options = {"min_fit_rows": 100} if projection == "pca" else {}
+    reduced = SimpleVectorStore(reduce_dimensions=64, projection=projection, keep_originals=True,
+                                projection_options=options)
+    fill(exact, vectors)
+    fill(reduced, vectors)
+
+    query = vectors[7] + 0.05
+    expected = exact.query(query, top_k=3).matches
+    found = reduced.query(query, top_k=3).matches
+    assert found[0]["id"] == "id_7"
+    assert found[0]["score"] == pytest.approx(expected[0]["score"], abs=1e-5)
+    np.testing.assert_allclose(reduced.fetch(["id_7"]).vectors["id_7"].values, normalize(vectors[7]), atol=1e-6)
+
+
+def test_reduced_dimensions_without_originals_saves_memory():
+    vectors = random_vectors(50, dimensions=256)
+    store = SimpleVectorStore(reduce_dimensions=32)
+    fill(store, vectors)
+    assert store.memory_stats()["bytes_per_vector"] == 32 * 4
+    fetched = store.fetch(["id_3"]).vectors["id_3"]
+    assert fetched.values.shape == (32,) and fetched.reduced
+    # A vector fetched from the store is queried back as a reduced one
+    assert store.query(fetched.values, top_k=1, reduced=True).matches[0]["id"] == "id_3"
+    # Without that intent only full-size queries are accepted
+    assert store.query(fetched.values, top_k=1).matches == []
+    assert store.query(vectors[3], top_k=1).matches[0]["id"] == "id_3"
+
+
+def test_pca_fits_after_min_rows_and_refits_as_the_corpus_grows():
+    vectors = random_vectors(500, dimensions=64)
+    store = SimpleVectorStore(reduce_dimensions=16, projection="pca",
+                              projection_options={"min_fit_rows": 100, "refit_growth": 2})
+    fill(store, vectors[:60])
+    # Below the minimum the vectors are kept and searched full-size
+    assert store.query(vectors[5], top_k=1).matches[0]["id"] == "id_5"
+    assert not store._projection.fitted and store.memory_stats()["bytes_per_vector"] == 64 * 4
+
+    fill(store, vectors[:150])
+    assert store.query(vectors[120], top_k=1).matches[0]["id"] == "id_120"
+    assert store._projection.fitted_rows == 150
+    # No originals: PCA saves the memory, and is not refitted later
+    assert store.memory_stats()["bytes_per_vector"] == 16 * 4
+    fill(store, vectors)
+    store.query(vectors[0], top_k=1)
+    assert store._projection.fitted_rows == 150
+
+    # With the originals kept it is refitted each time the corpus doubles
+    kept = SimpleVectorStore(reduce_dimensions=16, projection="pca", keep_originals=True,
+                             projection_options={"min_fit_rows": 100, "refit_growth": 2})
+    fill(kept, vectors[:150])
+    kept.query(vectors[0], top_k=1)
+    fill(kept, vectors)
+    assert kept.query(vectors[450], top_k=1).matches[0]["id"] == "id_450"
+    assert kept._projection.fitted_rows == 500
+
+    # An explicit fit does not wait for the minimum
+    small = SimpleVectorStore(reduce_dimensions=16, projection="pca")
+    fill(small, vectors[:20])
+    small.fit_projection()
+    assert small._partitions["job"].matrix.dimensions == 16
+    assert small.query(vectors[4], top_k=1).matches[0]["id"] == "id_4"
+
+
+def test_matrix_query_matches_brute_force_cosine():
+    vectors = random_vectors(1000)
+    store = SimpleVectorStore()
+    fill(store, vectors)
+    store.upsert([("id_1", vectors[2], {"type": "candidate"})])  # overwrite keeps its row
+
+    query = random_vectors(1, seed=5)[0]
+    candidates = [i for i in range(1000) if i % 2]
+    stored = normalize(vectors.copy())
+    stored[1] = normalize(vectors[2])
+    cosine = stored[candidates] @ normalize(query)
+    expected = [f"id_{candidates[i]}" for i in np.argsort(-cosine)[:10]]
+
+    matches = store.query(query, top_k=10, filter={"type": "candidate"}).matches
+    assert [m["id"] for m in matches] == expected
+    assert matches[0]["score"] == pytest.approx(float(cosine.max()), abs=1e-5)
+    assert len(store.vectors) == 1000
+    assert store.query(query, top_k=5, filter={"type": "nothing"}).matches == []
+
+
+def test_top_k_indices_matches_full_sort():
+    from backend.utils.vector_codecs import top_k_indices
+
+    scores = np.random.default_rng(1).normal(size=5000)
+    np.testing.assert_array_equal(top_k_indices(scores, 25), np.argsort(-scores)[:25])
+    np.testing.assert_array_equal(top_k_indices(scores[:3], 10), np.argsort(-scores[:3]))
+    np.testing.assert_array_equal(top_k_indices(np.ones(6), 3), [0, 1, 2])
+    assert len(top_k_indices(scores, 0)) == 0
+
+
+def test_type_partitions_route_filtered_queries():
+    vectors = random_vectors(40)
+    store = SimpleVectorStore(storage="int8")
+    fill(store, vectors)
+    assert store.memory_stats()["partitions"] == {"job": 20, "candidate": 20}
+
+    def untouchable(*args):
+        raise AssertionError("candidate partition scanned for a job query")
+
+    store._partitions["candidate"].search = untouchable
+    matches = store.query(vectors[4], top_k=3, filter={"type": "job"}).matches
+    assert matches[0]["id"] == "id_4"
+    assert all(m["metadata"]["type"] == "job" for m in matches)
+
+
+def test_changing_type_moves_vector_between_partitions():
+    vectors = random_vectors(6)
+    store = SimpleVectorStore()
+    fill(store, vectors)
+    store.upsert([("id_0", vectors[0], {"type": "candidate"})])
+
+    assert store.memory_stats()["partitions"] == {"job": 2, "candidate": 4}
+    assert store.query(vectors[0], top_k=1, filter={"type": "candidate"}).matches[0]["id"] == "id_0"
+    assert "id_0" not in [m["id"] for m in store.query(vectors[0], top_k=5, filter={"type": "job"}).matches]
+    # The row moved into the gap is still addressable
+    for i in (2, 4):
+        np.testing.assert_allclose(store.vectors[f"id_{i}"], normalize(vectors[i]), atol=1e-6)
+    assert [m["id"] for m in store.query(vectors[3], top_k=6).matches][0] == "id_3"
+
+
+def candidate_store():
+    store = SimpleVectorStore()
+    people = [
+        ("c0", ["Python", "Flask"], "2 years", "Backend"),
+        ("c1", ["Python", "React"], "5+ years", "Fullstack"),
+        ("c2", ["Java"], "7 years", "Backend"),
+        ("c3", ["React"], "", "Frontend"),
+    ]
+    vectors = random_vectors(len(people), seed=3)
+    store.upsert([
+        (cid, vector, {"type": "candidate", "skills": skills, "experience": experience, "position": position})
+        for (cid, skills, experience, position), vector in zip(people, vectors)
+    ])
+    store.upsert([("j0", vectors[0], {"type": "job", "skills": ["Python"]})])
+    return store, vectors
+
+
+@pytest.mark.parametrize("filter, expected", [
+    ({"skills": "Python"}, {"c0", "c1"}),
+    ({"skills": {"$in": ["Java", "Flask"]}}, {"c0", "c2"}),
+    ({"skills": {"$nin": ["Python"]}}, {"c2", "c3"}),
+    ({"experience": {"$gte": 5}}, {"c1", "c2"}),
+    ({"experience": {"$gt": 2, "$lte": 5}}, {"c1"}),
+    ({"position": {"$ne": "Backend"}}, {"c1", "c3"}),
+    ({"$or": [{"position": "Frontend"}, {"experience": {"$lt": 3}}]}, {"c0", "c3"}),
+    ({"$and": [{"skills": "Python"}, {"position": {"$eq": "Backend"}}]}, {"c0"}),
+    ({"skills": "Rust"}, set()),
+])
+def test_metadata_filters(filter, expected):
+    store, vectors = candidate_store()
+    matches = store.query(vectors[0], top_k=10, filter={"type": "candidate", **filter}).matches
+    assert {m["id"] for m in matches} == expected
+
+
+@pytest.mark.parametrize("filter", [
+    {"skills": {"$regex": "Py"}},
+    {"experience": {"$gte": "senior"}},
+    {"$not": {"skills": "Python"}},
+    {"$or": {"skills": "Python"}},
+    {"skills": {"$in": "Python"}},
+])
+def test_invalid_filters_raise_even_when_nothing_matches(filter):
+    from backend import pinecone_client
+    store, vectors = candidate_store()
+    for target in (store, SimpleVectorStore()):
+        with pytest.raises(FilterError):
+            target.query(vectors[0], top_k=5, filter={"type": "nobody", **filter})
+        with pytest.raises(FilterError):
+            target.query_many(vectors[:2], top_k=5, filter=filter)
+    with pytest.raises(FilterError):
+        pinecone_client.find_similar_candidates("python developer", filter=filter)
+
+
+def test_metadata_filters_follow_updates_and_moves():
+    store, vectors = candidate_store()
+    store.upsert([("c0", vectors[0], {"type": "job", "skills": ["Go"]})])  # moves c3 into c0's row
+    store.upsert([("c1", vectors[1], {"type": "candidate", "skills": ["Go"], "experience": 1})])
+
+    def ids(filter):
+        return {m["id"] for m in store.query(vectors[0], top_k=10, filter=filter).matches}
+
+    assert ids({"type": "candidate", "skills": "Python"}) == set()
+    assert ids({"type": "candidate", "skills": "React"}) == {"c3"}
+    assert ids({"type": "candidate", "experience": {"$gte": 5}}) == {"c2"}
+    assert ids({"type": {"$in": ["job", "candidate"]}, "skills": "Go"}) == {"c0", "c1"}
+    assert ids({"skills": "Python"}) == {"j0"}
+
+
+def test_move_with_numeric_field_on_early_rows_only():
+    rng = np.random.default_rng(7)
+    vectors = normalize(rng.standard_normal((100, 8)).astype(np.float32))
+    store = SimpleVectorStore()
+    store.upsert([
+        (f"c{i}", vectors[i], {"type": "candidate", **({"experience": i} if i < 5 else {})})
+        for i in range(100)
+    ])
+    store.upsert([("c10", vectors[10], {"type": "job"})])  # swap-removes the last row into c10's
+
+    assert [m.id for m in store.query(vectors[10], top_k=5, filter={"type": "job"}).matches] == ["c10"]
+    assert store.query(vectors[99], top_k=1).matches[0].id == "c99"
+    assert {m.id for m in store.query(vectors[0], top_k=10, filter={"experience": {"$gte": 3}}).matches} == {"c3", "c4"}
+
+
+def test_numeric_range_follows_small_and_large_batches_of_changes():
+    from backend.utils.vector_filters import MetadataIndex
+
+    rng = np.random.default_rng(3)
+    index, metadata = MetadataIndex(), []
+    for batch in (400, 5, 1, 30, 200, 2):
+        for _ in range(batch):
+            experience = {"experience": int(rng.integers(0, 20))} if rng.random() < 0.8 else {}
+            if metadata and rng.random() < 0.3:
+                row = int(rng.integers(len(metadata)))
+                index.remove(row, metadata[row], metadata[-1])
+                metadata[row] = metadata[-1]
+                metadata.pop()
+            elif metadata and rng.random() < 0.5:
+                row = int(rng.integers(len(metadata)))
+                index.add(row, experience, metadata[row])
+                metadata[row] = experience
+            else:
+                index.add(len(metadata), experience)
+                metadata.append(experience)
+        expected = [5 <= m.get("experience", -1) < 12 for m in metadata]
+        found = index.mask({"experience": {"$gte": 5, "$lt": 12}})
+        assert found.tolist() == expected
+
+
+def test_rejected_vector_leaves_partitions_consistent():
+    store, vectors = candidate_store()
+    count = len(store.vectors)
+    store.upsert([("c0", np.ones(3, dtype=np.float32), {"type": "job"})])  # wrong dimension: rejected
+    assert len(store.vectors) == count
+    assert store.query(vectors[0], top_k=1, filter={"type": "candidate"}).matches[0].id == "c0"
+
+
+def hnsw_store(**options):
+    options = {"M": 8, "ef_construction": 32, "ef_search": 16, "background": False, **options}
+    return SimpleVectorStore(index="hnsw", index_options=options)
+
+
+def assert_hnsw_consistent(ann):
+    """Live nodes and rows point at each other; every other row is pending, every other node a tombstone"""
+    rows = np.array(ann._row_node)
+    live = rows >= 0
+    assert (ann._node_row[rows[live]] == np.flatnonzero(live)).all()
+    assert ann._pending == set(np.flatnonzero(~live).tolist())
+    assert set(np.flatnonzero(ann._node_row < 0).tolist()) == set(ann._tombstones)
+
+
+def recall(found, expected):
+    return len({m["id"] for m in found} & {m["id"] for m in expected}) / len(expected)
+
+
+def test_hnsw_recall_against_exact_search_with_type_filter():
+    vectors = random_vectors(1200, dimensions=16)
+    exact, approximate = SimpleVectorStore(), hnsw_store(ef_search=48)
+    fill(exact, vectors)
+    fill(approximate, vectors)
+    for partition in approximate._partitions.values():
+        partition.ann.build()
+        assert not partition.ann._pending and len(partition.ann._node_row) == 600
+
+    queries = random_vectors(20, dimensions=16, seed=1)
+    for filter in (None, {"type": "candidate"}):
+        total = 0.0
+        for query in queries:
+            found = approximate.query(query, top_k=10, filter=filter).matches
+            assert len(found) == 10
+            if filter:
+                assert all(m["metadata"]["type"] == "candidate" for m in found)
+            total += recall(found, exact.query(query, top_k=10, filter=filter).matches)
+        assert total / len(queries) >= 0.9
+
+
+def test_hnsw_incremental_inserts_updates_and_moves():
+    vectors = random_vectors(800, dimensions=16)
+    store = hnsw_store()
+    fill(store, vectors[:400])
+    fill(store, vectors)  # overwrites the first half, appends the rest
+    assert len(store._partitions["job"].ann) == len(store._partitions["job"]) == 400
+
+    # Every stored vector finds itself
+    for i in (0, 1, 401, 799):
+        assert store.query(vectors[i], top_k=1).matches[0]["id"] == f"id_{i}"
+
+    # Moving ids out of a partition renumbers rows; the graph follows
+    store.upsert([(f"id_{i}", vectors[i], {"type": "candidate"}) for i in range(0, 200, 2)])
+    assert len(store._partitions["job"]) == 300
+    for i in (1, 202, 798):
+        match = store.query(vectors[i], top_k=1, filter={"type": "job" if i % 2 == 0 else "candidate"}).matches[0]
+        assert match["id"] == f"id_{i}"
+    assert len(store._partitions["job"].ann) == 300
+
+    # Inserts right after a move land in the rebuilt graph too
+    store.upsert([(f"id_{i}", vectors[i], {"type": "job"}) for i in range(0, 10, 2)])
+    assert store.query(vectors[4], top_k=1, filter={"type": "job"}).matches[0]["id"] == "id_4"
+    assert len(store._partitions["job"].ann) == 305
+
+
+def test_hnsw_changes_are_pending_and_tombstoned_until_the_rebuild_threshold():
+    vectors = random_vectors(600, dimensions=16)
+    store = hnsw_store(rebuild_fraction=0.25)
+    store.upsert([(f"id_{i}", vector, {"type": "job"}) for i, vector in enumerate(vectors)])
+    ann = store._partitions["job"].ann
+    ann.build()
+    builds = ann.builds
+
+    # Moves renumber rows; the graph keeps the old nodes as tombstones instead of rebuilding
+    store.upsert([(f"id_{i}", vectors[i], {"type": "candidate"}) for i in range(0, 100)])
+    # Overwritten rows are scored exactly until the next build
+    store.upsert([(f"id_{i}", vectors[i] + 1.0, {"type": "job"}) for i in range(300, 310)])
+    assert ann.builds == builds and len(ann._tombstones) == 110 and len(ann._pending) == 10 and len(ann) == 500
+    assert_hnsw_consistent(ann)
+    for i in (100, 305, 350, 599):
+        match = store.query(vectors[i] + (1.0 if 300 <= i < 310 else 0.0), top_k=1, filter={"type": "job"}).matches[0]
+        assert match["id"] == f"id_{i}"
+    found = store.query(vectors[0], top_k=50, filter={"type": "job"}).matches
+    assert len(found) == 50 and all(int(m["id"][3:]) >= 100 for m in found)
+
+    # Past the threshold the graph is rebuilt over the live rows (the batch's later moves tombstone a few again)
+    store.upsert([(f"id_{i}", vectors[i], {"type": "candidate"}) for i in range(100, 200)])
+    assert ann.builds > builds and len(ann) == 400
+    assert len(ann._tombstones) + len(ann._pending) <= 0.25 * len(ann._node_row)
+    assert_hnsw_consistent(ann)
+    assert store.query(vectors[350], top_k=1, filter={"type": "job"}).matches[0]["id"] == "id_350"
+
+
+def test_hnsw_builds_in_background_and_replays_concurrent_changes():
+    import threading
+    vectors = random_vectors(1200, dimensions=16)
+    store = hnsw_store(background=True)
+    store.upsert([(f"id_{i}", vector, {"type": "job"}) for i, vector in enumerate(vectors[:600])])
+    ann = store._partitions["job"].ann
+    ann.wait()
+
+    started, release = threading.Event(), threading.Event()
+    build = ann._build
+
+    def held_build(rows, reading):
+        started.set()
+        release.wait()
+        return build(rows, reading)
+
+    ann._build = held_build
+    # Enough new rows to start a build, which then waits while writes and queries go on without it
+    store.upsert([(f"id_{i}", vectors[i], {"type": "job"}) for i in range(600, 800)])
+    assert started.wait(5) and ann._thread is not None
+    store.upsert([(f"id_{i}", vectors[i] + 1.0, {"type": "job"}) for i in range(0, 20)])
+    store.upsert([(f"id_{i}", vectors[i], {"type": "candidate"}) for i in range(20, 60)])
+    store.upsert([(f"id_{i}", vectors[i], {"type": "job"}) for i in range(800, 1200)])
+    assert store.query(vectors[900], top_k=1, filter={"type": "job"}).matches[0]["id"] == "id_900"
+
+    # The build reads the rows as they are now; the journal turns every changed row into a pending one
+    release.set()
+    ann.wait()
+    del ann._build
+    assert len(ann) == len(store._partitions["job"]) == 1160
+    assert_hnsw_consistent(ann)
+    for i in (5, 100, 650, 799, 1100):
+        assert store.query(vectors[i] + (1.0 if i < 20 else 0.0), top_k=1, filter={"type": "job"}).matches[0]["id"] == f"id_{i}"
+
+
+def test_hnsw_with_metadata_filter_returns_only_matching_rows():
+    vectors = random_vectors(1000, dimensions=16)
+    store = hnsw_store()
+    store.upsert([
+        (f"id_{i}", vector, {"type": "candidate", "level": i % 4})
+        for i, vector in enumerate(vectors)
+    ])
+    for filter in ({"level": 1}, {"level": {"$in": [1, 2, 3]}}):
+        found = store.query(vectors[5], top_k=10, filter={"type": "candidate", **filter}).matches
+        assert len(found) == 10
+        assert all(store.metadata[m["id"]]["level"] != 0 for m in found)
+
+
+def assert_ivf_consistent(ann):
+    """Every row sits in exactly one list: the one of its nearest centroid"""
+    from backend.utils.ivf_index import nearest_centroids
+    members = np.concatenate([ann._lists[i][:ann._sizes[i]] for i in range(len(ann._lists))])
+    assert sorted(members.tolist()) == list(range(len(ann)))
+    expected = nearest_centroids(ann.matrix.decode(), ann.centroids)
+    for i in range(len(ann._lists)):
+        assert (expected[ann._lists[i][:ann._sizes[i]]] == i).all()
+
+
+def test_ivf_recall_against_exact_search_with_filters():
+    vectors = random_vectors(3000, dimensions=16)
+    exact = SimpleVectorStore()
+    approximate = SimpleVectorStore(index="ivf", index_options={"nprobe": 16, "min_train_rows": 500, "background": False})
+    for store in (exact, approximate):
+        store.upsert([
+            (f"id_{i}", vector, {"type": "candidate", "level": i % 4})
+            for i, vector in enumerate(vectors)
+        ])
+    ann = approximate._partitions["candidate"].ann
+    assert ann.trained and ann.trainings >= 1
+    assert_ivf_consistent(ann)
+
+    queries = random_vectors(20, dimensions=16, seed=1)
+    for filter in ({"type": "candidate"}, {"type": "candidate", "level": {"$in": [1, 2, 3]}}):
+        assert not ann.exact_is_cheaper(int(approximate._partitions["candidate"].index.mask(filter).sum()), 10)
+        total = 0.0
+        for query in queries:
+            found = approximate.query(query, top_k=10, filter=filter).matches
+            assert len(found) == 10
+            total += recall(found, exact.query(query, top_k=10, filter=filter).matches)
+        assert total / len(queries) >= 0.85
+
+
+def test_ivf_retrains_in_background_and_replays_concurrent_changes():
+    vectors = random_vectors(1600, dimensions=16)
+    store = SimpleVectorStore(index="ivf", index_options={"min_train_rows": 400, "retrain_fraction": 0.5})
+    fill(store, vectors[:800])  # 400 jobs: the first training starts in the background
+    ann = store._partitions["job"].ann
+    # Changes made while training runs are journaled and re-assigned on install
+    store.upsert([(f"id_{i}", vectors[i] + 1.0, {"type": "job"}) for i in range(0, 100, 2)])
+    store.upsert([(f"id_{i}", vectors[i], {"type": "candidate"}) for i in range(100, 200, 2)])
+    store.upsert([(f"id_{i}", vectors[i], {"type": "job"}) for i in range(800, 1600, 2)])
+    ann.wait()
+    assert ann.trainings >= 2
+    assert len(ann) == len(store._partitions["job"]) == 750
+    assert_ivf_consistent(ann)
+    for i in (0, 202, 1598):
+        assert store.query(vectors[i] + (1.0 if i < 100 else 0.0), top_k=1, filter={"type": "job"}).matches[0]["id"] == f"id_{i}"
+
+
+def test_ivf_failed_background_training_is_cleared_and_retried_later(monkeypatch):
+    from backend.utils import ivf_index
+    vectors = random_vectors(1600, dimensions=16)
+    store = SimpleVectorStore(index="ivf", index_options={"min_train_rows": 400, "retrain_fraction": 0.5})
+
+    def failing(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ivf_index, "train_centroids", failing)
+    fill(store, vectors[:800])
+    ann = store._partitions["job"].ann
+    ann.wait()
+    # No thread or journal is left behind, and the next changes don't restart training at once
+    assert not ann.trained and ann._thread is None and ann._journal is None
+    store.upsert([(f"id_{i}", vectors[i], {"type": "job"}) for i in range(800, 820, 2)])
+    assert ann._thread is None and ann._journal is None
+
+    monkeypatch.undo()
+    store.upsert([(f"id_{i}", vectors[i], {"type": "job"}) for i in range(820, 1600, 2)])
+    ann.wait()
+    assert ann.trained and len(ann) == 800
+    assert_ivf_consistent(ann)
+
+
+def test_pq_codes_are_one_byte_per_subspace_and_scored_by_lookup_table():
+    from backend.utils.vector_codecs import make_matrix
+    vectors = normalize(random_vectors(300, dimensions=1536))
+    matrix = make_matrix("pq", 1536, train_rows=300)
+    matrix.append(vectors[:299])
+    assert not matrix.trained
+    assert np.allclose(matrix.scores(vectors[0]), vectors[:299] @ vectors[0], atol=1e-5)
+
+    matrix.append(vectors[299:])
+    assert matrix.trained and matrix.subspaces == 96
+    assert matrix.bytes_per_vector == 96 and matrix.nbytes == 300 * 96
+    # ADC scores equal dot products with the decoded (reconstructed) rows
+    assert np.allclose(matrix.scores(vectors[5]), matrix.decode() @ vectors[5], atol=1e-4)
+    assert np.allclose(matrix.scores(vectors[5], [7, 3]), matrix.decode([7, 3]) @ vectors[5], atol=1e-4)
+
+    before = matrix.decode([299])[0]
+    assert matrix.remove(3) == 299
+    assert np.array_equal(matrix.decode([3])[0], before)
+
+
+def test_pq_store_reranks_exactly_with_originals():
+    vectors = random_vectors(1000, dimensions=32)
+    exact = SimpleVectorStore()
+    compact = SimpleVectorStore(storage="pq", storage_options={"train_rows": 256}, keep_originals=True,
+                                rescore_factor=20)
+    fill(exact, vectors)
+    fill(compact, vectors)
+    assert compact._partitions["job"].matrix.trained
+    stats = compact.memory_stats()
+    assert stats["search_bytes_per_vector"] == 2
+
+    total = 0.0
+    for query in random_vectors(10, dimensions=32, seed=1):
+        expected = exact.query(query, top_k=5, filter={"type": "candidate"}).matches
+        found = compact.query(query, top_k=5, filter={"type": "candidate"}).matches
+        total += recall(found, expected)
+        for got in found:
+            # Reranked scores are exact cosine similarities
+            assert got["score"] == pytest.approx(float(normalize(query) @ normalize(vectors[int(got["id"][3:])])), abs=1e-5)
+    assert total / 10 >= 0.9
+    assert np.allclose(compact.fetch(["id_3"]).vectors["id_3"].values, normalize(vectors[3]), atol=1e-6)
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"storage": "int8", "keep_originals": True},
+    {"reduce_dimensions": 16, "projection": "pca", "projection_options": {"min_fit_rows": 100}},
+])
+def test_query_many_matches_single_queries(options, monkeypatch):
+    import backend.utils.vector_codecs as codecs
+    monkeypatch.setattr(codecs, "SCORE_BLOCK_ROWS", 64)  # several blocks per partition
+    vectors = random_vectors(500)
+    store = SimpleVectorStore(**options)
+    store.upsert([
+        (f"id_{i}", vector, {"type": "candidate" if i % 2 else "job", "level": i % 3})
+        for i, vector in enumerate(vectors)
+    ])
+    queries = random_vectors(12, seed=1)
+    for filter in (None, {"type": "candidate"}, {"type": "candidate", "level": {"$ne": 0}}):
+        batch = store.query_many(queries, top_k=7, filter=filter)
+        assert len(batch) == len(queries)
+        for query, results in zip(queries, batch):
+            single = store.query(query, top_k=7, filter=filter).matches
+            assert [m["id"] for m in results.matches] == [m["id"] for m in single]
+            assert [m["score"] for m in results.matches] == pytest.approx([m["score"] for m in single], abs=1e-5)
+
+
+def test_find_similar_candidates_batch_uses_one_store_call(monkeypatch):
+    from backend import pinecone_client
+    store = SimpleVectorStore()
+    monkeypatch.setattr("backend.utils.simple_store._simple_store_instance", store)
+    monkeypatch.setattr(pinecone_client, "USE_PINECONE", False)
+    texts = ["python developer", "react frontend engineer", "aws devops sql"]
+    store.upsert([
+        (f"c{i}", pinecone_client.get_embedding(text), {"type": "candidate", "name": text})
+        for i, text in enumerate(texts)
+    ])
+    store.upsert([("j0", pinecone_client.get_embedding("python"), {"type": "job"})])
+
+    calls = []
+    query_many = store.query_many
+    monkeypatch.setattr(store, "query_many", lambda *a, **kw: calls.append(a) or query_many(*a, **kw))
+    results = pinecone_client.find_similar_candidates_batch(texts, top_k=2)
+    assert len(calls) == 1
+    assert [r.matches[0]["id"] for r in results] == ["c0", "c1", "c2"]
+    assert all(m["metadata"]["type"] == "candidate" for r in results for m in r.matches)
+
+
+def test_get_simple_store_creates_one_store_across_threads(monkeypatch):
+    import threading
+    import time
+    from backend.utils import simple_store
+    created = []
+
+    def slow_create():
+        time.sleep(0.05)
+        created.append(SimpleVectorStore())
+        return created[-1]
+
+    monkeypatch.setattr(simple_store, "_simple_store_instance", None)
+    monkeypatch.setattr(simple_store, "_create_simple_store", slow_create)
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(simple_store.get_simple_store())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(store is created[0] for store in stores)
+
+
+def test_results_are_slotted_with_lazy_metadata():
+    import pickle
+
+    store = SimpleVectorStore()
+    fill(store, random_vectors(10))
+    response = store.query(random_vectors(1, seed=1)[0], top_k=3)
+    match = response.matches[0]
+    assert not hasattr(match, "__dict__")
+    assert match._source is not None and match._metadata is None
+    assert match.metadata == store.metadata[match.id]
+    assert match["id"] == match.id and match.get("score") == match.score
+
+    # Pickling carries only the match's own metadata, not the store's
+    copy = pickle.loads(pickle.dumps(store.query(random_vectors(1, seed=1)[0], top_k=3)))
+    assert [(m.id, m.metadata) for m in copy.matches] == [(m.id, m.metadata) for m in response.matches]
+    assert copy.matches[0]._source is None
+
+    assert store.query(random_vectors(1, seed=1)[0], top_k=3, include_metadata=False).matches[0].metadata is None
+    fetched = store.fetch([match.id]).vectors[match.id]
+    assert fetched.metadata == match.metadata and len(fetched.values) == 64
+
+
+def test_columnar_metadata_interns_values_and_decodes_text_lazily():
+    store = SimpleVectorStore()
+    vectors = random_vectors(3)
+    text = "Senior engineer – 10 years of Python. " * 20
+    store.upsert([
+        ("c0", vectors[0], {"type": "candidate", "skills": ["Python", "SQL"], "experience": 5, "text": text}),
+        ("c1", vectors[1], {"type": "candidate", "skills": ["Python"], "rating": None}),
+    ])
+    assert store.metadata["c0"] == {"type": "candidate", "skills": ["Python", "SQL"], "experience": 5, "text": text}
+    assert store.metadata["c1"] == {"type": "candidate", "skills": ["Python"], "rating": None}
+    columns = store._metadata._data.columns
+    assert columns["skills"][0][0] is columns["skills"][1][0]
+    assert "text" not in columns
+    assert dict(store.metadata_items(text_limit=12))["c0"]["text"] == text[:12]
+    assert "text" not in dict(store.metadata_items(text_limit=0))["c0"]
+
+    # A match keeps the metadata its query saw, even after the id is overwritten
+    match = store.query(vectors[0], top_k=1).matches[0]
+    store.upsert([("c0", vectors[0], {"type": "candidate", "name": "updated"})])
+    assert match.metadata["text"] == text
+    assert store.metadata["c0"] == {"type": "candidate", "name": "updated"}
+
+
+def test_columnar_metadata_compacts_overwritten_rows(monkeypatch):
+    from backend.utils import metadata_columns
+
+    monkeypatch.setattr(metadata_columns, "COMPACT_MIN_ROWS", 4)
+    store = SimpleVectorStore()
+    vectors = random_vectors(2)
+    for version in range(20):
+        store.upsert([(f"id_{i}", vectors[i], {"type": "job", "version": version, "text": f"v{version}"}) for i in range(2)])
+    assert store._metadata._data.count <= 8
+    assert store.metadata["id_1"] == {"type": "job", "version": 19, "text": "v19"}
@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend.utils.rwlock import RWLock
+from backend.utils.simple_store import SimpleVectorStore
+from backend.utils.vector_codecs import normalize
+
+
+def test_rwlock_allows_parallel_readers_and_exclusive_writers():
+    lock = RWLock()
+    readers_inside = threading.Barrier(3, timeout=5)
+    state = {"writing": False, "overlap": False}
+
+    def reader():
+        with lock.read():
+            readers_inside.wait()  # all three readers hold the lock at once
+            if state["writing"]:
+                state["overlap"] = True
+
+    def writer():
+        with lock.write():
+            state["writing"] = True
+            threading.Event().wait(0.01)
+            state["writing"] = False
+
+    threads = [threading.Thread(target=reader) for _ in range(3)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not state["overlap"]
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"storage": "int8", "keep_originals": True},
+    {"index": "hnsw", "index_options": {"M": 6, "ef_construction": 16, "ef_search": 8}},
+])
+def test_queries_stay_consistent_under_concurrent_ingest(options, capsys):
+    """
+    Every id always maps to the same vector, so any returned score must equal
+    the exact similarity with that id's vector; a torn read would not.
+    """
+    dimensions, count = 32, 600
+    vectors = np.random.default_rng(0).normal(size=(count, dimensions)).astype(np.float32)
+    unit = normalize(vectors)
+    store = SimpleVectorStore(**options)
+    store.upsert([(f"id_{i}", vectors[i], {"type": "candidate", "round": 0}) for i in range(100)])
+
+    errors = []
+    stop = threading.Event()
+
+    def writer(seed):
+        rng = np.random.default_rng(seed)
+        try:
+            for round_number in range(1, 40):
+                ids = rng.choice(count, 20, replace=False)
+                store.upsert([
+                    # New ids, overwrites and moves between the two type partitions
+                    (f"id_{i}", vectors[i], {"type": "candidate" if rng.random() < 0.7 else "job", "round": round_number})
+                    for i in ids
+                ])
+        except Exception as e:
+            errors.append(e)
+
+    def reader(seed):
+        rng = np.random.default_rng(seed)
+        queries = rng.normal(size=(20, dimensions)).astype(np.float32)
+        try:
+            while not stop.is_set():
+                for query in queries[:3]:
+                    for match in store.query(query, top_k=5, filter={"type": "candidate"}).matches:
+                        assert match["metadata"]["type"] == "candidate"
+                        expected = float(unit[int(match["id"][3:])] @ normalize(query))
+                        assert match["score"] == pytest.approx(expected, abs=0.02)
+                for results in store.query_many(queries, top_k=3):
+                    assert len(results.matches) == 3
+                fetched = store.fetch([f"id_{i}" for i in rng.choice(count, 5)]).vectors
+                for vector_id, vector in fetched.items():
+                    assert np.allclose(vector.values, unit[int(vector_id[3:])], atol=0.02)
+                assert all(metadata["type"] in ("candidate", "job") for _, metadata in store.metadata_items())
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(3)]
+    readers = [threading.Thread(target=reader, args=(seed,)) for seed in range(10, 16)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join(timeout=60)
+    stop.set()
+    for thread in readers:
+        thread.join(timeout=60)
+
+    assert not errors, errors[:3]
+    # Errors inside query/upsert are caught and printed by the store
+    assert "Error in" not in capsys.readouterr().out
+    assert len(store.vectors) == len(store.metadata)
+    assert sum(len(p) for p in store._partitions.values()) == len(store.vectors)
@@ -0,0 +1,233 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from backend.utils.store_persistence import load_snapshot, open_shared_store, open_store
+from conftest import items, random_vectors, results
+
+
+def test_wal_replay_restores_upserts(tmp_path):
+    vectors = random_vectors(50)
+    store = open_store(str(tmp_path))
+    store.upsert(items(vectors))
+    store.upsert([("id_0", vectors[1], {"type": "candidate", "name": "moved"})])
+    expected = results(store, vectors[:5], {"type": "candidate"})
+    store.persistence.close()
+
+    reopened = open_store(str(tmp_path))
+    assert len(reopened.vectors) == 50
+    assert reopened.metadata["id_0"]["name"] == "moved"
+    assert results(reopened, vectors[:5], {"type": "candidate"}) == expected
+
+
+def test_directory_is_owned_by_one_store(tmp_path):
+    vectors = random_vectors(4)
+    store = open_store(str(tmp_path))
+    store.upsert(items(vectors[:2]))
+    for opener in (open_store, open_shared_store):
+        with pytest.raises(RuntimeError, match="already open"):
+            opener(str(tmp_path))
+    store.persistence.close()
+
+    shared = open_shared_store(str(tmp_path))
+    assert len(open_shared_store(str(tmp_path)).vectors) == 2
+    with pytest.raises(RuntimeError, match="already open"):
+        open_store(str(tmp_path))
+    shared.persistence.close()
+
+
+def test_invalid_items_never_reach_the_wal(tmp_path):
+    vectors = random_vectors(10)
+    store = open_store(str(tmp_path))
+    store.upsert(items(vectors[:5]))
+    store.upsert([("short", vectors[5][:32], {"type": "job"}), ("id_5", vectors[5], {"type": "job"}),
+                  ("matrix", vectors[:2], {"type": "job"}), ("no_metadata", vectors[6], None)])
+    assert set(store.vectors) == {f"id_{i}" for i in range(6)}
+    size = store.persistence.wal.size
+    store.upsert([("short", vectors[7][:32], {"type": "other"})])
+    assert store.persistence.wal.size == size
+    store.persistence.close()
+
+    reopened = open_store(str(tmp_path))
+    assert set(reopened.vectors) == {f"id_{i}" for i in range(6)}
+
+
+def test_replay_skips_records_that_cannot_be_applied(tmp_path):
+    vectors = random_vectors(10)
+    store = open_store(str(tmp_path))
+    store.upsert(items(vectors[:5]))
+    # A record logged by an older version that checked nothing
+    store.persistence.wal.append([("bad", vectors[5][:32], {"type": "candidate"})])
+    store.upsert(items(vectors[5:], start=5))
+    store.persistence.close()
+
+    reopened = open_store(str(tmp_path))
+    assert set(reopened.vectors) == {f"id_{i}" for i in range(10)}
+    assert set(reopened._partitions) == {"job", "candidate"}
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"storage": "int8", "keep_originals": True},
+    {"storage": "pq", "storage_options": {"train_rows": 256}},
+    {"index": "hnsw", "index_options": {"M": 8, "ef_search": 8}},
+    {"index": "ivf", "index_options": {"min_train_rows": 100, "nprobe": 4, "background": False}},
+])
+def test_snapshot_maps_vectors_and_keeps_accepting_writes(tmp_path, options):
+    vectors = random_vectors(600)
+    store = open_store(str(tmp_path), **options)
+    store.upsert(items(vectors[:500]))
+    store.save()
+    assert store.persistence.wal.size == 0
+    snapshotted = results(store, vectors[:5])
+    store.upsert(items(vectors[500:], start=500))
+    expected = results(store, vectors[:5])
+    store.persistence.close()
+
+    reopened = open_store(str(tmp_path))
+    assert reopened.storage == store.storage and reopened.index == store.index
+    matrix = reopened._partitions["job"].matrix
+    assert isinstance(matrix._data, np.memmap)
+    assert results(reopened, vectors[:5]) == expected
+
+    # Writes after a cold start stay in memory; the snapshot files are untouched
+    snapshot_files = sorted(os.listdir(tmp_path))
+    reopened.upsert([("id_0", vectors[3], {"type": "job"}), ("new", vectors[4], {"type": "job"})])
+    assert reopened.query(vectors[4], top_k=1, filter={"type": "job"}).matches[0]["id"] in ("new", "id_4")
+    assert sorted(os.listdir(tmp_path)) == snapshot_files
+    assert results(load_snapshot(str(tmp_path)), vectors[:5]) == snapshotted
+
+
+def test_snapshot_defers_row_state_until_used(tmp_path):
+    import shutil
+
+    vectors = random_vectors(300)
+    store = open_store(str(tmp_path), index="hnsw", index_options={"M": 8, "ef_search": 16})
+    store.upsert(items(vectors))
+    expected = results(store, vectors[:5], {"type": "candidate", "name": {"$ne": "n1"}})
+    snapshot = store.save()
+    store.persistence.close()
+
+    reopened = open_store(str(tmp_path))
+    partitions = reopened._partitions.values()
+    assert not reopened.loaded and not any(p.loaded for p in partitions)
+    assert len(reopened.vectors) == 300
+    # Sections are read from files opened with the snapshot, even once a newer one replaced it
+    shutil.rmtree(snapshot)
+    assert results(reopened, vectors[:5], {"type": "candidate", "name": {"$ne": "n1"}}) == expected
+    assert reopened.loaded and reopened._partitions["candidate"].loaded
+    assert not reopened._partitions["job"].loaded
+    job = reopened._partitions["job"]
+    assert job.ann.matrix is job.matrix
+
+
+def test_torn_wal_tail_is_dropped(tmp_path):
+    vectors = random_vectors(10)
+    store = open_store(str(tmp_path))
+    store.upsert(items(vectors[:5]))
+    store.upsert(items(vectors[5:], start=5))
+    store.persistence.close()
+    wal_path = tmp_path / "wal.log"
+    size = wal_path.stat().st_size
+    with open(wal_path, "r+b") as f:
+        f.truncate(size - 7)
+
+    reopened = open_store(str(tmp_path))
+    assert sorted(reopened.vectors) == sorted(f"id_{i}" for i in range(9))
+    # The partial record was cut off, so new records append cleanly after it
+    reopened.upsert(items(vectors[9:], start=9))
+    reopened.persistence.close()
+    assert len(open_store(str(tmp_path)).vectors) == 10
+
+
+def test_wal_is_folded_into_a_snapshot_when_it_grows(tmp_path):
+    vectors = random_vectors(40)
+    store = open_store(str(tmp_path), snapshot_wal_bytes=4096)
+    for start in range(0, 40, 10):
+        store.upsert(items(vectors[start:start + 10], start=start))
+    assert store.persistence.wal.size < 4096
+    assert (tmp_path / "CURRENT").exists()
+    store.persistence.close()
+    assert len(open_store(str(tmp_path)).vectors) == 40
+
+
+def test_shared_store_sees_other_workers_writes(tmp_path):
+    vectors = random_vectors(300)
+    worker_a = open_shared_store(str(tmp_path), snapshot_wal_bytes=0)
+    worker_b = open_shared_store(str(tmp_path), snapshot_wal_bytes=0)
+    worker_a.upsert(items(vectors[:100]))
+    worker_b.upsert(items(vectors[100:200], start=100))
+    worker_a.upsert([("id_150", vectors[0], {"type": "job", "name": "moved"})])
+    assert results(worker_a, vectors[:5]) == results(worker_b, vectors[:5])
+    assert worker_b.metadata["id_150"]["name"] == "moved"
+
+    # A snapshot by one worker is mapped by both, and the WAL starts over
+    assert worker_b.save() is not None
+    worker_b.upsert(items(vectors[200:], start=200))
+    assert worker_b.persistence.offset == worker_b.persistence.wal.size > 0
+    expected = results(worker_b, vectors[:5])
+    assert results(worker_a, vectors[:5]) == expected
+    for store in (worker_a, worker_b):
+        assert len(store.vectors) == 300
+        assert isinstance(store._partitions["job"].matrix._data, np.memmap)
+    late = open_shared_store(str(tmp_path))
+    assert results(late, vectors[:5]) == expected
+
+
+def test_shared_store_snapshots_before_the_mapped_padding_runs_out(tmp_path):
+    vectors = random_vectors(600)
+    writer = open_shared_store(str(tmp_path), snapshot_wal_bytes=0)
+    writer.upsert(items(vectors[:200]))
+    writer.save()
+    reader = open_shared_store(str(tmp_path), snapshot_wal_bytes=0)
+    padded = len(reader._partitions["job"].matrix._data)
+
+    # Well past the first snapshot's padding, in upserts smaller than what is left of it
+    for start in range(200, 600, 20):
+        writer.upsert(items(vectors[start:start + 20], start=start))
+        assert results(reader, vectors[start:start + 1]) == results(writer, vectors[start:start + 1])
+    for store in (reader, writer):
+        matrix = store._partitions["job"].matrix
+        assert len(store.vectors) == 600 and len(matrix._data) > padded
+        assert isinstance(matrix._data, np.memmap)
+
+
+def test_shared_store_checks_items_against_other_workers_writes(tmp_path):
+    vectors = random_vectors(20)
+    worker_a = open_shared_store(str(tmp_path), snapshot_wal_bytes=0)
+    worker_b = open_shared_store(str(tmp_path), snapshot_wal_bytes=0)
+    worker_a.upsert(items(vectors[:10]))
+    # worker_b has not synced, so only the check under the flock sees the dimension
+    worker_b.upsert([("short", vectors[10][:32], {"type": "job"})])
+    worker_b.upsert(items(vectors[10:12], start=10))
+    assert "short" not in worker_b.vectors and len(worker_b.vectors) == 12
+
+    # A bad record already in the WAL is skipped, and readers move past it
+    worker_b.persistence.wal.append([("bad", vectors[12][:32], {"type": "job"})])
+    worker_b.upsert(items(vectors[12:], start=12))
+    assert {vector_id for vector_id, _ in worker_a.metadata_items()} == {f"id_{i}" for i in range(20)}
+    assert worker_a.persistence.offset == worker_a.persistence.wal.size
+    assert not worker_a.persistence.changed
+
+
+def test_shared_store_across_processes(tmp_path):
+    vectors = random_vectors(20)
+    store = open_shared_store(str(tmp_path))
+    store.upsert(items(vectors[:10]))
+    np.save(tmp_path / "extra.npy", vectors[10:])
+    script = (
+        "import numpy as np\n"
+        "from backend.utils.store_persistence import open_shared_store\n"
+        f"store = open_shared_store({str(tmp_path)!r})\n"
+        "assert len(store.vectors) == 10\n"
+        f"extra = np.load({str(tmp_path / 'extra.npy')!r})\n"
+        "store.upsert([(f'id_{10 + i}', v, {'type': 'job'}) for i, v in enumerate(extra)])\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, "-c", script], cwd=root, check=True, capture_output=True)
+    assert len(store.vectors) == 10
+    assert store.query(vectors[15], top_k=1).matches[0]["id"] == "id_15"
+    assert len(store.vectors) == 20
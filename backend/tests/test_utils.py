@@ -26,4 +26,59 @@ def test_score_candidate():
     assert "name" in result
     assert "score" in result
     assert "experience" in result
-    assert 0 <= result["score"] <= 100
\ No newline at end of file
+    assert 0 <= result["score"] <= 100
+
+def test_keyword_scanner_matches_str_count():
+    import random
+    from backend.utils.keywords import TECH_KEYWORDS, KeywordScanner, scan_keywords
+
+    # TECH_KEYWORDS uses the findall fast path; "aa" can overlap itself and forces the exact path
+    scanners = [KeywordScanner(TECH_KEYWORDS), KeywordScanner(TECH_KEYWORDS + ("aa",))]
+    pieces = list(TECH_KEYWORDS) + ["aa", "a", "script", " ", "post", "gre"]
+    rng = random.Random(0)
+    for _ in range(200):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+        for scanner in scanners:
+            counts = scanner.count(text)
+            assert counts == {keyword: text.count(keyword) for keyword in scanner.keywords}
+
+    counts = scan_keywords("JavaScript and PostgreSQL, not Java")
+    assert counts["javascript"] == 1 and counts["java"] == 2
+    assert counts["postgresql"] == 1 and counts["sql"] == 1
+    assert scan_keywords("JavaScript and PostgreSQL, not Java") is counts
+
+
+def test_score_candidate_advanced_matching_keywords():
+    from backend.utils.scoring import score_candidate_advanced
+
+    result = score_candidate_advanced(
+        {"name": "Jane", "resume": "Backend developer: Python, Flask, REST APIs"},
+        job_text="Python API developer",
+    )
+    assert result["matching_keywords"] == ["python", "developer", "api"]
+
+def test_logging_is_level_gated_sampled_and_per_subsystem(capsys):
+    import json
+    from backend.utils.log import configure, get_logger
+
+    calls = []
+    def costly():
+        calls.append(1)
+        return "computed"
+
+    try:
+        configure(level="INFO", levels="test_store=DEBUG", format="json", debug_sample=0.5)
+        quiet, verbose = get_logger("test_quiet"), get_logger("test_store")
+        quiet.debug("Skipped", value=costly)
+        for i in range(4):
+            verbose.debug("Sampled", i=i, value=costly)
+        quiet.info("Shown", count=3)
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    finally:
+        configure()
+
+    # Below the level nothing is evaluated; debug keeps every second line
+    assert len(calls) == 2
+    assert [line["event"] for line in lines] == ["Sampled", "Sampled", "Shown"]
+    assert lines[0]["subsystem"] == "test_store" and lines[0]["value"] == "computed"
+    assert lines[2]["level"] == "INFO" and lines[2]["count"] == 3
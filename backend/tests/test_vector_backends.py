@@ -0,0 +1,218 @@
+import time
+
+import pytest
+from backend.utils.embeddings import get_text_fingerprints
+from backend.utils.vector_backends import LocalVectorBackend, PineconeHTTPBackend, VectorBackendError
+from backend.utils.vector_server import LocalVectorServer
+
+TEXTS = [f"Candidate {i}: python developer with {i} years of flask" for i in range(250)]
+
+
+@pytest.fixture
+def server():
+    with LocalVectorServer() as server:
+        yield server
+
+
+def _items(texts, kind="candidate"):
+    vectors = get_text_fingerprints(texts)
+    return [(f"{kind}{i}", vector, {"type": kind, "name": text}) for i, (text, vector) in enumerate(zip(texts, vectors))]
+
+
+def test_http_backend_batches_upserts_against_local_server(server):
+    backend = PineconeHTTPBackend(server.url, api_key="test", max_batch_size=100)
+    assert backend.upsert(_items(TEXTS)) == 250
+    assert server.batch_sizes == [100, 100, 50]
+
+    query = get_text_fingerprints([TEXTS[7]])[0]
+    remote = backend.query(query, top_k=3, filter={"type": "candidate"})
+    local = LocalVectorBackend(server.store()).query(query, top_k=3, filter={"type": "candidate"})
+    assert [m.id for m in remote.matches] == [m.id for m in local.matches]
+    assert remote.matches[0].id == "candidate7"
+    assert remote.matches[0].metadata["name"] == TEXTS[7]
+
+    fetched = backend.fetch(["candidate7", "missing"])
+    assert list(fetched.vectors) == ["candidate7"]
+    assert fetched.vectors["candidate7"].values == pytest.approx(query.tolist(), abs=1e-6)
+
+
+def test_http_backend_retries_and_raises(server):
+    backend = PineconeHTTPBackend(server.url, max_batch_size=100, backoff=0.001)
+    server.fail_next(2, status=503)
+    backend.upsert(_items(TEXTS[:10]))
+    assert server.request_count == 3
+
+    server.fail_next(1, status=400)
+    with pytest.raises(VectorBackendError):
+        backend.upsert(_items(TEXTS[:10]))
+
+
+def test_sdk_backend_retries_queries_and_fetches():
+    from types import SimpleNamespace
+
+    from backend.utils.vector_backends import PineconeVectorBackend
+
+    class FlakyIndex:
+        def __init__(self):
+            self.failures = {"query": 2, "fetch": 1}
+
+        def _fail(self, operation):
+            if self.failures[operation]:
+                self.failures[operation] -= 1
+                raise ConnectionError("reset")
+
+        def query(self, **kwargs):
+            self._fail("query")
+            return SimpleNamespace(matches=[SimpleNamespace(id="candidate0", score=0.9, metadata={})])
+
+        def fetch(self, **kwargs):
+            self._fail("fetch")
+            return SimpleNamespace(vectors={"candidate0": SimpleNamespace(values=[1.0], metadata={})})
+
+    index = FlakyIndex()
+    backend = PineconeVectorBackend(index, backoff=0.001)
+    assert [m.id for m in backend.query([1.0], top_k=1).matches] == ["candidate0"]
+    assert list(backend.fetch(["candidate0"]).vectors) == ["candidate0"]
+    assert index.failures == {"query": 0, "fetch": 0}
+
+
+def test_failed_local_upsert_is_reported(monkeypatch):
+    from backend import pinecone_client
+    from backend.utils.simple_store import SimpleVectorStore
+
+    store = SimpleVectorStore()
+    monkeypatch.setattr("backend.utils.vector_backends._backend_instance", LocalVectorBackend(store))
+    monkeypatch.setattr(store, "_apply", lambda items: 1 / 0)
+    with pytest.raises(VectorBackendError):
+        LocalVectorBackend(store).upsert(_items(TEXTS[:2]))
+    assert not pinecone_client.store_candidate_embeddings([("c1", get_text_fingerprints(["x"])[0], "x", {})])
+
+
+def test_client_writes_and_reads_through_the_selected_backend(server, monkeypatch):
+    from backend import pinecone_client
+    monkeypatch.setattr("backend.utils.vector_backends._backend_instance",
+                        PineconeHTTPBackend(server.url, max_batch_size=100))
+
+    assert pinecone_client.store_job_embedding("job1", "python flask developer")
+    assert pinecone_client.store_candidate_embeddings([
+        (candidate_id, vector, metadata["name"], metadata) for candidate_id, vector, metadata in _items(TEXTS[:120])
+    ])
+    assert server.batch_sizes == [1, 100, 20]
+    assert len(server.store().vectors) == 121
+
+    jobs = pinecone_client.find_similar_jobs_for_vector(get_text_fingerprints(["python flask"])[0])
+    assert [m.id for m in jobs.matches] == ["job1"]
+    results = pinecone_client.find_similar_candidates_batch(TEXTS[:2], top_k=1)
+    assert [r.matches[0].id for r in results] == ["candidate0", "candidate1"]
+
+
+def test_write_behind_coalesces_and_shows_pending_writes(server):
+    from backend.utils.write_behind import WriteBehindQueue, merge_pending
+    from backend.utils.vector_results import QueryResponse
+
+    backend = PineconeHTTPBackend(server.url, max_batch_size=100, max_retries=0)
+    queue = WriteBehindQueue(backend, max_items=200, max_delay=60)
+    try:
+        for item in _items(TEXTS[:150]):
+            queue.put([item])
+        assert server.request_count == 0 and len(queue.pending()) == 150
+
+        query = get_text_fingerprints([TEXTS[3]])[0]
+        merged = merge_pending([QueryResponse()], [query], 2, {"type": "candidate"}, queue.pending())
+        assert merged[0].matches[0].id == "candidate3"
+        assert merge_pending([QueryResponse()], [query], 2, {"type": "job"}, queue.pending())[0].matches == []
+
+        assert queue.flush()
+        assert server.batch_sizes == [100, 50] and queue.pending() == {}
+
+        # Reaching max_items writes without waiting out the window
+        queue.put(_items(TEXTS[:200], kind="job"))
+        for _ in range(500):
+            if len(server.batch_sizes) == 4:
+                break
+            time.sleep(0.01)
+        assert server.batch_sizes == [100, 50, 100, 100]
+
+        server.fail_next(1, status=400)
+        assert not queue.wait(queue.put(_items(TEXTS[:1])), timeout=5)
+        assert queue.stats["failed_batches"] == 1
+    finally:
+        queue.close()
+
+
+def test_client_write_behind_reads_its_own_writes(server, monkeypatch):
+    from backend import pinecone_client
+    from backend.config import Config
+    monkeypatch.setattr("backend.utils.vector_backends._backend_instance",
+                        PineconeHTTPBackend(server.url, max_batch_size=100))
+    monkeypatch.setattr(Config, "VECTOR_WRITE_BEHIND", True)
+    monkeypatch.setattr(Config, "VECTOR_WRITE_BEHIND_DELAY_MS", 60_000)
+    monkeypatch.setattr(pinecone_client, "_write_queue", None)
+
+    try:
+        for candidate_id, vector, metadata in _items(TEXTS[:120]):
+            assert pinecone_client.store_candidate_embeddings([(candidate_id, vector, metadata["name"], metadata)])
+        assert server.request_count == 0
+
+        results = pinecone_client.find_similar_candidates_batch(TEXTS[:2], top_k=1)
+        assert [r.matches[0].id for r in results] == ["candidate0", "candidate1"]
+        assert list(pinecone_client.fetch_vectors(["candidate5", "missing"]).vectors) == ["candidate5"]
+
+        assert pinecone_client.flush_writes()
+        assert server.batch_sizes == [100, 20]
+        results = pinecone_client.find_similar_candidates_batch(TEXTS[:2], top_k=1)
+        assert [r.matches[0].id for r in results] == ["candidate0", "candidate1"]
+    finally:
+        pinecone_client.get_write_queue().close()
+
+
+def test_write_behind_blocks_past_max_pending_and_bounds_query_overfetch(monkeypatch):
+    import threading
+    from backend import pinecone_client
+    from backend.config import Config
+    from backend.utils.simple_store import SimpleVectorStore
+
+    class SlowBackend(LocalVectorBackend):
+        def __init__(self, store):
+            super().__init__(store)
+            self.release = threading.Event()
+            self.top_ks = []
+
+        def upsert(self, items):
+            self.release.wait(5)
+            return super().upsert(items)
+
+        def query_many(self, vectors, top_k=10, filter=None, include_metadata=True):
+            self.top_ks.append(top_k)
+            return super().query_many(vectors, top_k, filter, include_metadata)
+
+    backend = SlowBackend(SimpleVectorStore())
+    backend.release.set()
+    backend.upsert(_items(TEXTS[:50]))
+    backend.release.clear()
+    monkeypatch.setattr("backend.utils.vector_backends._backend_instance", backend)
+    monkeypatch.setattr(Config, "VECTOR_WRITE_BEHIND", True)
+    monkeypatch.setattr(Config, "VECTOR_WRITE_BEHIND_DELAY_MS", 60_000)
+    monkeypatch.setattr(Config, "VECTOR_WRITE_BEHIND_MAX_PENDING", 200)
+    monkeypatch.setattr(pinecone_client, "_write_queue", None)
+    queue = pinecone_client.get_write_queue()
+    try:
+        # Re-writes of 3 stored ids plus 150 new ones: only the 3 can shadow backend matches
+        queue.put(_items(TEXTS[:3]) + _items(TEXTS[100:250], kind="new"))
+        assert queue.pending() is queue.pending()
+        query = get_text_fingerprints([TEXTS[1]])[0]
+        results = pinecone_client._query_many([query], 5, {"type": "candidate"})
+        assert [m.id for m in results[0].matches][0] == "candidate1"
+        assert len(results[0].matches) == 5 and backend.top_ks == [5, 6]
+
+        blocked = threading.Thread(target=queue.put, args=(_items(TEXTS[:100]),))
+        blocked.start()
+        blocked.join(0.2)
+        assert blocked.is_alive() and queue.stats["blocked_puts"] == 1
+        backend.release.set()
+        blocked.join(5)
+        assert not blocked.is_alive()
+        assert queue.flush(5) and len(backend.store.vectors) == 250
+    finally:
+        backend.release.set()
+        queue.close()
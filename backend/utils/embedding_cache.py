@@ -0,0 +1,158 @@
+# ===== FILE: ./backend/utils/embedding_cache.py =====
+
+"""
+Content-addressed cache for embedding vectors.
+
+Entries are keyed by sha256(model + normalized text). The memory tier is a
+bounded LRU; when a cache directory is configured, vectors are also written
+to disk as .npy files so a restart does not re-embed the corpus.
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.config import Config
+from backend.utils.log import get_logger
+
+log = get_logger("embeddings")
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = 4096, cache_dir: str = None):
+        self.max_entries = max(0, int(max_entries))
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_writes": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Cache key for an already-normalized text and a model name"""
+        digest = hashlib.sha256()
+        digest.update(model.encode())
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """Return the cached vector for key, or None on a miss"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return vector
+
+        vector = self._read_disk(key)
+        with self._lock:
+            if vector is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, vector)
+        return vector
+
+    def put(self, key: str, vector) -> np.ndarray:
+        """Cache a vector (stored read-only) and return the cached array"""
+        vector = np.array(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        with self._lock:
+            self._remember(key, vector)
+        self._write_disk(key, vector)
+        return vector
+
+    def clear(self):
+        """Drop the memory tier and reset stats (the disk tier is left alone)"""
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["disk_enabled"] = bool(self.cache_dir)
+        return stats
+
+    def _remember(self, key, vector):
+        # Caller holds the lock
+        if self.max_entries == 0:
+            return
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            vector = np.load(self._disk_path(key))
+        except (OSError, ValueError):
+            return None
+        vector.flags.writeable = False
+        return vector
+
+    def _write_disk(self, key, vector):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial vector
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                np.save(handle, vector)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Embedding cache disk write failed", error=e)
+            return
+        with self._lock:
+            self._stats["disk_writes"] += 1
+
+
+_embedding_cache_instance = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """Get or create the process-wide embedding cache"""
+    global _embedding_cache_instance
+    if _embedding_cache_instance is None:
+        with _embedding_cache_lock:
+            if _embedding_cache_instance is None:
+                _embedding_cache_instance = EmbeddingCache(
+                    max_entries=Config.EMBEDDING_CACHE_SIZE,
+                    cache_dir=Config.EMBEDDING_CACHE_DIR,
+                )
+    return _embedding_cache_instance
+
+
+def _reset_locks_after_fork():
+    # A fork can happen while another thread holds a cache lock; the child
+    # would then deadlock on first use, so give it fresh locks.
+    global _embedding_cache_lock
+    _embedding_cache_lock = threading.Lock()
+    if _embedding_cache_instance is not None:
+        _embedding_cache_instance._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
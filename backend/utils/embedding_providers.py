@@ -0,0 +1,166 @@
+# ===== FILE: ./backend/utils/embedding_providers.py =====
+
+"""
+Pluggable embedding providers with a real batch path.
+
+A provider embeds one batch of texts per call. `embed_texts` splits larger
+inputs into chunks of the provider's batch limit, runs the chunks on a
+bounded thread pool and retries failed chunks with exponential backoff.
+"""
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from backend.config import Config
+
+
+class EmbeddingProviderError(Exception):
+    """Raised when a provider cannot embed a batch"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class EmbeddingProvider:
+    """Base class: subclasses implement embed_batch for up to max_batch_size texts"""
+    name = "base"
+
+    def __init__(self, dimensions: int = 1536, max_batch_size: int = 2048):
+        self.dimensions = dimensions
+        self.max_batch_size = max(1, int(max_batch_size))
+
+    def normalize(self, text: str) -> str:
+        """Text form the provider treats as identical (used for cache keys)"""
+        return text
+
+    def model_key(self, model: str = None) -> str:
+        """Everything besides the text that decides a vector (used for cache keys)"""
+        return f"{self.name}:{model}:{self.dimensions}"
+
+    def embed_batch(self, texts: list, model: str = None) -> np.ndarray:
+        raise NotImplementedError
+
+
+class FingerprintProvider(EmbeddingProvider):
+    """Offline provider backed by the deterministic text fingerprint"""
+    name = "fingerprint"
+
+    def normalize(self, text: str) -> str:
+        # The fingerprint only looks at the lowercased text
+        return text.lower()
+
+    def embed_batch(self, texts: list, model: str = None) -> np.ndarray:
+        from backend.utils.embeddings import get_text_fingerprints
+        return get_text_fingerprints(texts, self.dimensions)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Client for the OpenAI embeddings API (or anything speaking the same protocol)"""
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1",
+                 model: str = "text-embedding-ada-002", dimensions: int = 1536,
+                 max_batch_size: int = 2048, timeout: float = 30.0):
+        super().__init__(dimensions=dimensions, max_batch_size=max_batch_size)
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+
+    def model_key(self, model: str = None) -> str:
+        # Another server speaking the same protocol may serve a different model under the same name
+        return f"{self.name}:{self.base_url}:{model or self.model}:{self.dimensions}"
+
+    def embed_batch(self, texts: list, model: str = None) -> np.ndarray:
+        try:
+            response = requests.post(
+                f"{self.base_url}/embeddings",
+                json={"model": model or self.model, "input": list(texts)},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise EmbeddingProviderError(f"Embedding request failed: {e}", retryable=True) from e
+
+        if response.status_code != 200:
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise EmbeddingProviderError(
+                f"Embedding API returned {response.status_code}: {response.text[:200]}",
+                retryable=retryable,
+            )
+
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        if len(data) != len(texts):
+            raise EmbeddingProviderError(f"Expected {len(texts)} embeddings, got {len(data)}")
+        return np.array([item["embedding"] for item in data], dtype=np.float32)
+
+
+def _embed_chunk(provider, texts, model, max_retries, backoff):
+    """Embed one chunk, retrying retryable failures with exponential backoff and jitter"""
+    attempt = 0
+    while True:
+        try:
+            return provider.embed_batch(texts, model)
+        except EmbeddingProviderError as e:
+            if not e.retryable or attempt >= max_retries:
+                raise
+        delay = backoff * (2 ** attempt)
+        time.sleep(delay + random.uniform(0, delay))
+        attempt += 1
+
+
+def embed_texts(provider: EmbeddingProvider, texts: list, model: str = None,
+                max_workers: int = 4, max_retries: int = 3, backoff: float = 0.5) -> np.ndarray:
+    """
+    Embed any number of texts into an (N, dimensions) float32 matrix, in input order
+    """
+    if not texts:
+        return np.empty((0, provider.dimensions), dtype=np.float32)
+
+    size = provider.max_batch_size
+    chunks = [texts[start:start + size] for start in range(0, len(texts), size)]
+    if len(chunks) == 1 or max_workers <= 1:
+        results = [_embed_chunk(provider, chunk, model, max_retries, backoff) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            futures = [
+                pool.submit(_embed_chunk, provider, chunk, model, max_retries, backoff)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+    return np.concatenate(results, axis=0)
+
+
+def create_embedding_provider(name: str = None) -> EmbeddingProvider:
+    """Build the provider named in config ("fingerprint" or "openai")"""
+    name = (name or Config.EMBEDDING_PROVIDER).lower()
+    if name == "fingerprint":
+        return FingerprintProvider(Config.EMBEDDING_DIMENSIONS, Config.EMBEDDING_BATCH_SIZE)
+    if name == "openai":
+        return OpenAIEmbeddingProvider(
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_API_BASE,
+            model=Config.EMBEDDING_MODEL,
+            dimensions=Config.EMBEDDING_DIMENSIONS,
+            max_batch_size=Config.EMBEDDING_BATCH_SIZE,
+        )
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+_provider_instance = None
+_provider_lock = threading.Lock()
+
+def get_embedding_provider():
+    """Get or create the configured embedding provider"""
+    global _provider_instance
+    if _provider_instance is None:
+        with _provider_lock:
+            if _provider_instance is None:
+                _provider_instance = create_embedding_provider()
+    return _provider_instance
@@ -0,0 +1,136 @@
+# ===== FILE: ./backend/utils/embedding_server.py =====
+
+"""
+Local stand-in for the OpenAI embeddings API.
+
+Serves POST /v1/embeddings with OpenAI-shaped responses built from the text
+fingerprint, so the HTTP provider can be exercised without network access.
+Failures can be injected to test retry handling.
+
+Run standalone with: python -m backend.utils.embedding_server --port 8765
+"""
+
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.utils.embeddings import get_text_fingerprints
+
+
+class _EmbeddingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        if self.path.rstrip("/") not in ("/v1/embeddings", "/embeddings"):
+            return self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        with server.lock:
+            server.request_count += 1
+            if server.failures_pending > 0:
+                server.failures_pending -= 1
+                return self._send(server.failure_status, {"error": {"message": "Injected failure"}})
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": {"message": "Invalid JSON body"}})
+
+        texts = payload.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts or len(texts) > server.max_batch_size:
+            return self._send(400, {"error": {"message": f"input must hold 1-{server.max_batch_size} items"}})
+
+        with server.lock:
+            server.batch_sizes.append(len(texts))
+        vectors = get_text_fingerprints(texts, server.dimensions)
+        self._send(200, {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": index, "embedding": vector.tolist()}
+                for index, vector in enumerate(vectors)
+            ],
+            "model": payload.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": sum(len(t.split()) for t in texts),
+                      "total_tokens": sum(len(t.split()) for t in texts)},
+        })
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep test output quiet
+        pass
+
+
+class LocalEmbeddingServer:
+    """OpenAI-compatible embeddings server on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 dimensions: int = 1536, max_batch_size: int = 2048):
+        self._server = ThreadingHTTPServer((host, port), _EmbeddingHandler)
+        self._server.daemon_threads = True
+        self._server.lock = threading.Lock()
+        self._server.dimensions = dimensions
+        self._server.max_batch_size = max_batch_size
+        self._server.request_count = 0
+        self._server.batch_sizes = []
+        self._server.failures_pending = 0
+        self._server.failure_status = 503
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def request_count(self) -> int:
+        return self._server.request_count
+
+    @property
+    def batch_sizes(self) -> list:
+        return list(self._server.batch_sizes)
+
+    def fail_next(self, count: int, status: int = 503):
+        """Make the next `count` requests fail with the given HTTP status"""
+        with self._server.lock:
+            self._server.failures_pending = count
+            self._server.failure_status = status
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = LocalEmbeddingServer(args.host, args.port)
+    print(f"🚀 Local embedding server listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -3,76 +3,176 @@
 import os
 import random
 import hashlib
+from functools import lru_cache
+
+import numpy as np
 from dotenv import load_dotenv
 
+from backend.config import Config
+from backend.utils.embedding_cache import get_embedding_cache
+from backend.utils.embedding_providers import embed_texts, get_embedding_provider
+from backend.utils.keywords import TECH_KEYWORDS, scan_keywords
+from backend.utils.log import get_logger
+
+log = get_logger("embeddings")
+
 load_dotenv()
 
-def get_text_fingerprint(text: str, dimensions: int = 1536) -> list:
+# Keyword -> boosted dimensions. Keyword i boosts every 10th index starting at i.
+KEYWORD_BOOSTS = {
+    keyword: list(range(i, i + 100, 10)) for i, keyword in enumerate(TECH_KEYWORDS)
+}
+KEYWORDS = tuple(KEYWORD_BOOSTS)
+
+NOISE_SIGMA = 0.2
+BOOST_BASE = 0.5
+BOOST_PER_OCCURRENCE = 0.2
+
+_TWO_PI = 2.0 * np.pi
+
+
+def _fingerprint_seed(text_lower: str) -> int:
+    """Seed derived from the lowercased text (matches the original md5 scheme)"""
+    text_hash = hashlib.md5(text_lower.encode()).hexdigest()
+    return int(text_hash, 16) % 10000
+
+
+def fingerprint_generator(seed: int) -> random.Random:
+    """
+    Fresh generator for one fingerprint.
+
+    Each call gets its own random.Random, so concurrent fingerprints in
+    threads or processes never share (or reseed) generator state, and the
+    global random module is left untouched.
+    """
+    return random.Random(seed)
+
+
+def _raw_words(generator: random.Random, count: int) -> np.ndarray:
+    """Next `count` 32-bit MT19937 outputs; getrandbits emits them little-endian, low word first"""
+    return np.frombuffer(generator.getrandbits(32 * count).to_bytes(4 * count, 'little'), dtype='<u4')
+
+
+@lru_cache(maxsize=1024)
+def _base_noise(seed: int, dimensions: int) -> np.ndarray:
+    """
+    Reproduce `random.seed(seed); [random.gauss(0, 0.2) ...]` with NumPy.
+
+    We pull the generator's raw 32-bit words in one call and replay
+    random() (53-bit doubles from two words) and gauss() (Box-Muller,
+    cos/sin pairs) vectorized. There are only 10000 seeds, so the noise
+    per seed is cached.
+    """
+    pairs = (dimensions + 1) // 2
+    words = _raw_words(fingerprint_generator(seed), pairs * 4).astype(np.uint64)
+    a = (words[0::2] >> np.uint64(5)).astype(np.float64)
+    b = (words[1::2] >> np.uint64(6)).astype(np.float64)
+    uniforms = (a * 67108864.0 + b) * (1.0 / 9007199254740992.0)
+
+    x2pi = uniforms[0::2] * _TWO_PI
+    g2rad = np.sqrt(-2.0 * np.log(1.0 - uniforms[1::2]))
+    noise = np.empty(pairs * 2, dtype=np.float64)
+    noise[0::2] = np.cos(x2pi) * g2rad
+    noise[1::2] = np.sin(x2pi) * g2rad
+    noise = noise[:dimensions] * NOISE_SIGMA
+    noise.flags.writeable = False
+    return noise
+
+
+@lru_cache(maxsize=8)
+def _boost_matrix(dimensions: int) -> np.ndarray:
+    """(len(KEYWORDS), dimensions) 0/1 matrix of the dimensions each keyword boosts"""
+    matrix = np.zeros((len(KEYWORDS), dimensions), dtype=np.float64)
+    for row, keyword in enumerate(KEYWORDS):
+        indices = [idx for idx in KEYWORD_BOOSTS[keyword] if idx < dimensions]
+        matrix[row, indices] = 1.0
+    matrix.flags.writeable = False
+    return matrix
+
+
+def _keyword_strengths(text: str) -> np.ndarray:
+    """Boost strength per keyword: 0 when absent, 0.5 + 0.2 * count otherwise"""
+    counts = scan_keywords(text)
+    counts = np.array([counts[keyword] for keyword in KEYWORDS], dtype=np.float64)
+    return np.where(counts > 0, BOOST_BASE + counts * BOOST_PER_OCCURRENCE, 0.0)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, None]
+
+
+def get_text_fingerprints(texts: list, dimensions: int = 1536) -> np.ndarray:
+    """
+    Fingerprint N texts into one (N, dimensions) float32 matrix
+    """
+    count = len(texts)
+    if count == 0:
+        return np.empty((0, dimensions), dtype=np.float32)
+
+    matrix = np.empty((count, dimensions), dtype=np.float64)
+    strengths = np.empty((count, len(KEYWORDS)), dtype=np.float64)
+    for row, text in enumerate(texts):
+        matrix[row] = _base_noise(_fingerprint_seed(text.lower()), dimensions)
+        strengths[row] = _keyword_strengths(text)
+
+    matrix += strengths @ _boost_matrix(dimensions)
+    return _normalize_rows(matrix).astype(np.float32)
+
+
+def get_text_fingerprint(text: str, dimensions: int = 1536) -> np.ndarray:
     """
     Create better deterministic embeddings based on text content
     """
-    # Create a hash-based seed for determinism
-    text_lower = text.lower()
-    text_hash = hashlib.md5(text_lower.encode()).hexdigest()
-    seed = int(text_hash, 16) % 10000
-    random.seed(seed)
-    
-    # Start with random vector
-    vector = [random.gauss(0, 0.2) for _ in range(dimensions)]
-    
-    # Strong keyword boosts with better distribution
-    keyword_boosts = {
-        'python': list(range(0, 100, 10)),
-        'flask': list(range(1, 100, 10)),
-        'django': list(range(2, 100, 10)),
-        'react': list(range(3, 100, 10)),
-        'javascript': list(range(4, 100, 10)),
-        'node': list(range(5, 100, 10)),
-        'java': list(range(6, 100, 10)),
-        'backend': list(range(7, 100, 10)),
-        'frontend': list(range(8, 100, 10)),
-        'developer': list(range(9, 100, 10)),
-        'api': list(range(10, 110, 10)),
-        'web': list(range(11, 111, 10)),
-        'database': list(range(12, 112, 10)),
-        'sql': list(range(13, 113, 10)),
-        'postgresql': list(range(14, 114, 10)),
-        'mongodb': list(range(15, 115, 10)),
-        'docker': list(range(16, 116, 10)),
-        'aws': list(range(17, 117, 10)),
-        'cloud': list(range(18, 118, 10)),
-        'microservices': list(range(19, 119, 10))
-    }
-    
-    # Apply keyword boosts
-    for keyword, indices in keyword_boosts.items():
-        if keyword in text_lower:
-            count = text_lower.count(keyword)
-            boost_strength = 0.5 + (count * 0.2)  # Stronger boosts
-            for idx in indices:
-                if idx < dimensions:
-                    vector[idx] += boost_strength
-    
-    # Normalize to unit length
-    norm = (sum(x*x for x in vector) ** 0.5) or 1.0
-    vector = [x / norm for x in vector]
-    
-    return vector
-
-def get_embedding(text: str, model: str = "text-embedding-ada-002") -> list:
+    return get_text_fingerprints([text], dimensions)[0]
+
+def _cache_key(cache, provider, text: str, model: str) -> str:
+    return cache.make_key(provider.normalize(text), provider.model_key(model))
+
+def get_embedding(text: str, model: str = "text-embedding-ada-002") -> np.ndarray:
     """
     Generate embeddings for text - falls back to improved mock if OpenAI fails
     """
-    # Use improved mock embeddings for now
-    print(f"🔧 Generating improved mock embedding for: {text[:60]}...")
-    return get_text_fingerprint(text)
+    provider = get_embedding_provider()
+    cache = get_embedding_cache()
+    key = _cache_key(cache, provider, text, model)
+    vector = cache.get(key)
+    if vector is not None:
+        return vector
+
+    log.debug("Generating embedding", provider=provider.name, chars=len(text))
+    return cache.put(key, embed_texts(provider, [text], model, max_retries=Config.EMBEDDING_MAX_RETRIES,
+                                           backoff=Config.EMBEDDING_RETRY_BACKOFF)[0])
 
-def batch_get_embeddings(texts: list, model: str = "text-embedding-ada-002") -> list:
+def batch_get_embeddings(texts: list, model: str = "text-embedding-ada-002") -> np.ndarray:
     """
     Generate embeddings for multiple texts in batch
     """
-    embeddings = []
-    for text in texts:
-        embedding = get_embedding(text, model)
-        embeddings.append(embedding)
-    return embeddings
\ No newline at end of file
+    provider = get_embedding_provider()
+    cache = get_embedding_cache()
+    keys = [_cache_key(cache, provider, text, model) for text in texts]
+    vectors = [cache.get(key) for key in keys]
+
+    # Embed each distinct missing text once, chunked and in parallel
+    missing = {}
+    for position, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(keys[position], position)
+    if missing:
+        fresh = embed_texts(
+            provider,
+            [texts[position] for position in missing.values()],
+            model,
+            max_workers=Config.EMBEDDING_MAX_WORKERS,
+            max_retries=Config.EMBEDDING_MAX_RETRIES,
+            backoff=Config.EMBEDDING_RETRY_BACKOFF,
+        )
+        computed = {key: cache.put(key, vector) for key, vector in zip(missing, fresh)}
+        for position, key in enumerate(keys):
+            if vectors[position] is None:
+                vectors[position] = computed[key]
+
+    if not vectors:
+        return np.empty((0, provider.dimensions), dtype=np.float32)
+    return np.stack(vectors)
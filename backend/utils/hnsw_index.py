@@ -0,0 +1,495 @@
+# ===== FILE: ./backend/utils/hnsw_index.py =====
+
+"""
+HNSW (hierarchical navigable small world) graph index for the local store.
+
+The graph's nodes are rows of a partition's VectorMatrix; similarities are
+computed against the (possibly compact) matrix itself, so the index adds
+only the neighbour lists on top of the stored vectors.
+
+Upserts don't touch the graph: a new or overwritten row is "pending" and
+scored exactly next to the graph search, and a removed or overwritten
+row's node stays in the graph as a tombstone (walked, never returned).
+Once those pile up the graph is rebuilt in bulk, with numpy, in a
+background thread (by default) that reads the matrix only under `reading`
+(the store's read lock, set by the partition), one block at a time.
+maintain() swaps the finished graph in and replays the changes made while
+it was built. Tunables:
+
+    M                 max neighbours per node per layer (2 * M on layer 0)
+    ef_construction   candidates considered per node while building (build quality)
+    ef_search         candidate list size while querying (recall vs latency)
+    rebuild_fraction  share of pending rows and tombstones that triggers a rebuild
+"""
+
+import math
+import heapq
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+from backend.utils.ivf_index import nearest_centroids, train_centroids
+from backend.utils.log import get_logger
+from backend.utils.vector_codecs import SCORE_BLOCK_ROWS, normalize
+
+log = get_logger("store")
+
+# Layers whose all-pairs scan stays under this many multiply-adds find candidates exactly
+EXACT_BUILD_WORK = 1 << 34
+# Larger layers are clustered; each node is matched against the nodes of its this many nearest clusters
+BUILD_PROBE = 4
+# Nodes handled per matrix product while building
+BUILD_BLOCK_ROWS = 256
+# Bound on the candidate vectors decoded at once for neighbour selection
+SELECT_BLOCK_VALUES = 1 << 22
+
+
+def _merge_best(ids, scores, more_ids, more_scores, width):
+    """Per row, the `width` best distinct ids of two -1 padded candidate lists; returns (ids, scores)"""
+    ids, scores = np.concatenate([ids, more_ids], axis=1), np.concatenate([scores, more_scores], axis=1)
+    order = np.lexsort((-scores, ids), axis=-1)
+    ids, scores = np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+    repeated = np.zeros(ids.shape, dtype=bool)
+    repeated[:, 1:] = ids[:, 1:] == ids[:, :-1]
+    scores[repeated | (ids < 0)] = -np.inf
+    best = np.argsort(-scores, axis=1, kind="stable")[:, :width]
+    ids, scores = np.take_along_axis(ids, best, axis=1), np.take_along_axis(scores, best, axis=1)
+    ids[scores == -np.inf] = -1
+    return ids, scores
+
+
+class HNSWIndex:
+    kind = "hnsw"
+
+    def __init__(self, matrix, M: int = 16, ef_construction: int = 100, ef_search: int = 50,
+                 rebuild_fraction: float = 0.2, background: bool = True, seed: int = 0):
+        """
+        rebuild_fraction: rebuild the graph once pending rows and tombstones
+        reach this share of its nodes. background=False builds in the calling thread.
+        """
+        self.matrix = matrix
+        self.M = max(2, int(M))
+        self.M0 = 2 * self.M
+        self.ef_construction = max(1, int(ef_construction))
+        self.ef_search = max(1, int(ef_search))
+        self.rebuild_fraction = rebuild_fraction
+        self.background = background
+        self.seed = seed
+        self.builds = 0
+        self._level_multiplier = 1.0 / math.log(self.M)
+        self._reset()
+        # Graph nodes keep their numbers while matrix rows are renumbered by swap-removes
+        self._row_node = []  # matrix row -> node (-1 while pending)
+        self._pending = set()  # rows scored exactly until the next build
+        self._changes = 0
+        self._next_build = 0
+        self._thread = None
+        self._result = None
+        self._journal = None
+        self.reading = None  # context manager factory guarding matrix reads from other threads
+
+    def _reset(self):
+        self._layer0 = np.empty((0, self.M0), dtype=np.int64)  # node -> neighbours, padded with -1
+        self._upper = []  # layer 1.. -> (sorted nodes, their neighbours padded with -1)
+        self._entry = None
+        self._max_level = -1
+        self._node_row = np.empty(0, dtype=np.int64)  # node -> matrix row (-1 for a tombstone)
+        # Removed nodes stay in the graph, with their vectors, so paths through them still work
+        self._tombstones = {}  # node -> vector
+
+    def __getstate__(self):
+        # An in-flight build is not persisted; it restarts on the next change.
+        # The matrix and lock are not either: the partition attaches them again on load
+        state = self.__dict__.copy()
+        state.update(matrix=None, reading=None, _thread=None, _result=None, _journal=None)
+        return state
+
+    def __len__(self):
+        return len(self._row_node)
+
+    def add(self, row: int):
+        """Register the matrix row `row` (rows are added in order); it is pending until the next build"""
+        self._install_pending()
+        if row != len(self._row_node):
+            raise ValueError(f"HNSW rows must be added in order: expected {len(self._row_node)}, got {row}")
+        self._row_node.append(-1)
+        self._pending.add(row)
+        self._changed(("add",))
+
+    def update(self, row: int, vector):
+        """A row's vector was overwritten (vector is the previous one): its node becomes a tombstone"""
+        self._install_pending()
+        self._detach(row, vector)
+        self._changed(("update", row, vector))
+
+    def remove(self, row: int, vector):
+        """
+        Drop a row (vector is its search-space vector, read before the matrix
+        dropped it); the last row takes its number (mirrors VectorMatrix.remove).
+        """
+        self._install_pending()
+        last = len(self._row_node) - 1
+        # A build in flight may have read the moved row at either number, so it is re-added as pending
+        moved = self.matrix.decode([row])[0].copy() if self._journal is not None and row != last else None
+        self._drop(row, vector)
+        if not self._row_node:
+            self._reset()
+        self._changed(("remove", row, vector, moved))
+
+    @property
+    def needs_maintenance(self) -> bool:
+        """A background build has finished and waits to be installed"""
+        return self._result is not None
+
+    def maintain(self):
+        self._install_pending()
+
+    def build(self):
+        """Rebuild the graph now, in the calling thread"""
+        self._journal = []
+        self._result = self._build(len(self._row_node))
+        self._install_pending()
+
+    def wait(self):
+        """Block until background builds have caught up with the changes so far, installing each result"""
+        while self._thread is not None or self._result is not None:
+            thread = self._thread
+            if thread is not None:
+                thread.join()
+            self._install_pending()
+            self._maybe_build()
+
+    def exact_is_cheaper(self, matching: int, k: int) -> bool:
+        """
+        Whether scanning the `matching` rows beats a graph search for k results.
+        A search visits roughly ef / selectivity nodes with up to M0 neighbours
+        each, plus the pending rows, so small partitions and very selective
+        filters are scanned.
+        """
+        rows = len(self._row_node)
+        if not rows or len(self._pending) == rows:
+            return True
+        selectivity = matching / rows
+        return matching <= max(self.ef_search, k) * self.M0 / selectivity + len(self._pending) * selectivity
+
+    def search(self, query, k: int, mask=None, ef: int = None):
+        """Approximate top-k rows for a normalized query; returns (rows, scores), best first.
+
+        With a mask only matching rows are returned; the candidate list is
+        widened by the mask's selectivity so enough matches survive.
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if not self._row_node or k <= 0:
+            return empty
+        query = np.asarray(query, dtype=np.float32)
+        rows, scores = self._search_graph(query, k, mask, ef)
+        if self._pending:
+            pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+            if mask is not None:
+                pending = pending[mask[pending]]
+            if len(pending):
+                rows = np.concatenate([rows, pending])
+                scores = np.concatenate([scores, self.matrix.scores(query, pending)])
+        order = np.lexsort((rows, -scores))[:k]
+        return rows[order], scores[order]
+
+    def _search_graph(self, query, k, mask, ef):
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        nodes = len(self._node_row)
+        live = nodes - len(self._tombstones)
+        if self._entry is None or live <= 0:
+            return empty
+        ef = max(ef or self.ef_search, k)
+        if mask is not None:
+            rows = len(self._row_node)
+            ef = int(math.ceil(ef / max(float(mask[:rows].mean()), 1.0 / rows)))
+        # Tombstones are walked but never returned, so look further as they pile up
+        ef = min(nodes, int(math.ceil(ef * nodes / live)))
+
+        entry = [self._entry]
+        for layer in range(self._max_level, 0, -1):
+            # A bulk-built layer 0 has few long links, so layer 1 is searched as widely and all its hits enter
+            found = self._search_layer(query, entry, ef if layer == 1 else 1, layer)
+            entry = [node for _, node in found] if layer == 1 else [found[0][1]]
+        node_row = self._node_row
+        found = [(score, node_row[node]) for score, node in self._search_layer(query, entry, ef, 0)]
+        found = [hit for hit in found if hit[1] >= 0 and (mask is None or mask[hit[1]])][:k]
+        if not found:
+            return empty
+        scores, rows = zip(*found)
+        return np.array(rows, dtype=np.int64), np.array(scores, dtype=np.float32)
+
+    def _detach(self, row, vector):
+        """Turn a row's node into a tombstone holding `vector`; the row becomes pending"""
+        node = self._row_node[row]
+        if node >= 0:
+            self._tombstones[node] = np.array(vector, dtype=np.float32)
+            self._node_row[node] = -1
+            self._row_node[row] = -1
+        self._pending.add(row)
+
+    def _drop(self, row, vector):
+        node = self._row_node[row]
+        if node >= 0:
+            self._tombstones[node] = np.array(vector, dtype=np.float32)
+            self._node_row[node] = -1
+        self._pending.discard(row)
+        last = len(self._row_node) - 1
+        moved = self._row_node.pop()
+        if last != row:
+            self._row_node[row] = moved
+            if moved >= 0:
+                self._node_row[moved] = row
+            else:
+                self._pending.discard(last)
+                self._pending.add(row)
+
+    def _changed(self, event):
+        self._changes += 1
+        if self._journal is not None:
+            self._journal.append(event)
+        else:
+            self._maybe_build()
+
+    def _maybe_build(self):
+        if self._thread is not None or self._journal is not None or self._changes < self._next_build:
+            return
+        stale = len(self._pending) + len(self._tombstones)
+        if not stale or stale <= self.rebuild_fraction * len(self._node_row):
+            return
+        if not self.background:
+            self.build()
+            return
+        # Changes from here on are journaled and replayed when the graph is installed
+        self._journal = []
+        self._thread = threading.Thread(target=self._build_in_background, args=(len(self._row_node),), daemon=True)
+        self._thread.start()
+
+    def _build_in_background(self, rows):
+        try:
+            self._result = self._build(rows, self.reading or nullcontext)
+        except Exception:
+            log.exception("HNSW build failed", rows=rows)
+            # Nothing to install: stop journaling, and retry only after another round of changes
+            self._journal = None
+            self._next_build = self._changes + max(1, int(self.rebuild_fraction * rows))
+        finally:
+            # An install may already have started the next build
+            if self._thread is threading.current_thread():
+                self._thread = None
+
+    def _install_pending(self):
+        """Swap in a finished build: nodes are the rows it started with, then the journal is replayed"""
+        if self._result is None:
+            return
+        layer0, upper, entry, max_level, rows = self._result
+        journal = self._journal
+        self._result = self._journal = self._thread = None
+
+        self._reset()
+        self._layer0, self._upper = layer0, upper
+        self._entry, self._max_level = entry, max_level
+        self._node_row = np.arange(rows, dtype=np.int64)
+        self._row_node = list(range(rows))
+        self._pending = set()
+        for event in journal:
+            if event[0] == "add":
+                self._pending.add(len(self._row_node))
+                self._row_node.append(-1)
+            elif event[0] == "update":
+                self._detach(event[1], event[2])
+            else:
+                _, row, vector, moved = event
+                self._drop(row, vector)
+                if moved is not None:
+                    self._detach(row, moved)
+        if not self._row_node:
+            self._reset()
+        self.builds += 1
+        self._changes = len(journal)
+        self._next_build = 0
+
+    def _build(self, rows, reading=nullcontext):
+        """Neighbour lists for nodes 0..rows-1 (the rows at the start), read in blocks under `reading`"""
+        rng = np.random.default_rng(self.seed + self.builds)
+        levels = np.floor(-np.log(1.0 - rng.random(rows)) * self._level_multiplier).astype(np.int64)
+        if not rows:
+            return np.empty((0, self.M0), dtype=np.int64), [], None, -1, 0
+        layer0 = self._build_layer(np.arange(rows), self.M0, rng, reading)
+        upper = []
+        for layer in range(1, int(levels.max()) + 1):
+            nodes = np.flatnonzero(levels >= layer)
+            upper.append((nodes, self._build_layer(nodes, self.M, rng, reading)))
+        entry = int(np.argmax(levels))
+        return layer0, upper, entry, int(levels[entry]), rows
+
+    def _build_layer(self, nodes, limit, rng, reading):
+        """Heuristic neighbours for each node, plus reverse links, pruned to the `limit` most similar"""
+        candidates, scores = self._candidates(nodes, rng, reading)
+        chosen = np.full((len(nodes), self.M), -1, dtype=np.int64)
+        chosen_scores = np.full((len(nodes), self.M), -np.inf, dtype=np.float32)
+        width = max(1, candidates.shape[1] * self.matrix.dimensions)
+        step = max(1, min(BUILD_BLOCK_ROWS, SELECT_BLOCK_VALUES // width))
+        for start in range(0, len(nodes), step):
+            block = slice(start, start + step)
+            chosen[block], chosen_scores[block] = self._select_neighbours(candidates[block], scores[block], reading)
+
+        valid = chosen >= 0
+        sources = np.broadcast_to(nodes[:, None], chosen.shape)[valid]
+        targets, similarity = chosen[valid], chosen_scores[valid]
+        sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+        similarity = np.concatenate([similarity, similarity])
+        # One copy of each link, then each node's most similar first
+        order = np.lexsort((-similarity, targets, sources))
+        sources, targets, similarity = sources[order], targets[order], similarity[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        sources, targets, similarity = sources[first], targets[first], similarity[first]
+        order = np.lexsort((-similarity, sources))
+        sources, targets = sources[order], targets[order]
+        starts = np.flatnonzero(np.concatenate(([True], sources[1:] != sources[:-1])))
+        rank = np.arange(len(sources)) - np.repeat(starts, np.diff(np.append(starts, len(sources))))
+        keep = rank < limit
+
+        links = np.full((len(nodes), limit), -1, dtype=np.int64)
+        links[np.searchsorted(nodes, sources[keep]), rank[keep]] = targets[keep]
+        return links
+
+    def _candidates(self, nodes, rng, reading):
+        """
+        Up to ef_construction most similar other nodes for each node, best
+        first (-1 padded): exactly for small layers, otherwise among the
+        nodes sharing one of its BUILD_PROBE nearest clusters.
+        """
+        count = min(self.ef_construction, len(nodes) - 1)
+        candidates = np.full((len(nodes), max(count, 0)), -1, dtype=np.int64)
+        scores = np.full(candidates.shape, -np.inf, dtype=np.float32)
+        if count <= 0:
+            return candidates, scores
+        if len(nodes) ** 2 * self.matrix.dimensions <= EXACT_BUILD_WORK:
+            groups = [np.arange(len(nodes))]
+        else:
+            nlist = int(math.sqrt(len(nodes)))
+            sample = np.sort(rng.choice(len(nodes), min(len(nodes), 64 * nlist), replace=False))
+            centroids = train_centroids(normalize(self._read(nodes[sample], reading)), nlist, seed=self.seed)
+            probe = min(BUILD_PROBE, len(centroids))
+            nearest = np.concatenate([
+                np.argpartition(-(self._read(nodes[start:start + SCORE_BLOCK_ROWS], reading) @ centroids.T),
+                                probe - 1, axis=1)[:, :probe]
+                for start in range(0, len(nodes), SCORE_BLOCK_ROWS)
+            ])
+            # Each node joins its nearest clusters, so its neighbours across a cluster border are seen too
+            order = np.argsort(nearest.ravel(), kind="stable")
+            bounds = np.searchsorted(nearest.ravel()[order], np.arange(len(centroids) + 1))
+            groups = [order[bounds[i]:bounds[i + 1]] // probe for i in range(len(centroids))]
+        for group in groups:
+            pool = nodes[group]
+            for start in range(0, len(group), BUILD_BLOCK_ROWS):
+                block = group[start:start + BUILD_BLOCK_ROWS]
+                queries = self._read(nodes[block], reading)
+                with reading():
+                    # Nodes past the end were removed meanwhile; they are tombstoned on install
+                    present = pool[pool < len(self.matrix)]
+                    found, similarity = self.matrix.top_k_many(queries, count + 1, present)
+                own = found == nodes[block][:, None]
+                found[own], similarity[own] = -1, -np.inf
+                candidates[block], scores[block] = _merge_best(
+                    candidates[block], scores[block], found, similarity, count
+                )
+        return candidates, scores
+
+    def _select_neighbours(self, candidates, scores, reading):
+        """
+        HNSW neighbour heuristic for a block of nodes: take candidates best
+        first, skipping any that is closer to an already chosen neighbour than
+        to the node. This keeps links spread across clusters. Top up with the
+        best skipped ones. Returns (neighbours, similarities), -1 padded.
+        """
+        blocks, width = candidates.shape
+        valid = candidates >= 0
+        vectors = self._read(np.where(valid, candidates, 0).ravel(), reading)
+        vectors = vectors.reshape(blocks, width, self.matrix.dimensions)
+        between = vectors @ vectors.transpose(0, 2, 1)
+        chosen = np.zeros((blocks, width), dtype=bool)
+        taken = np.zeros(blocks, dtype=np.int64)
+        closest = np.full((blocks, width), -np.inf, dtype=np.float32)  # best similarity to a chosen one
+        for j in range(width):
+            accept = valid[:, j] & (taken < self.M) & (closest[:, j] <= scores[:, j])
+            if accept.any():
+                chosen[:, j] = accept
+                taken += accept
+                np.maximum(closest, np.where(accept[:, None], between[:, j], -np.inf), out=closest)
+            if (taken >= self.M).all():
+                break
+        # Top up with the best skipped candidates
+        rank = np.cumsum(valid & ~chosen, axis=1)
+        chosen |= valid & ~chosen & (rank <= (self.M - taken)[:, None])
+
+        order = np.argsort(~chosen, axis=1, kind="stable")[:, :self.M]
+        picked = np.take_along_axis(chosen, order, axis=1)
+        neighbours = np.where(picked, np.take_along_axis(candidates, order, axis=1), -1)
+        similarity = np.where(picked, np.take_along_axis(scores, order, axis=1), -np.inf)
+        if neighbours.shape[1] < self.M:
+            pad = self.M - neighbours.shape[1]
+            neighbours = np.pad(neighbours, ((0, 0), (0, pad)), constant_values=-1)
+            similarity = np.pad(similarity, ((0, 0), (0, pad)), constant_values=-np.inf)
+        return neighbours, similarity
+
+    def _read(self, rows, reading):
+        """Search-space vectors of build nodes; rows removed since the build started read as zeros"""
+        out = np.zeros((len(rows), self.matrix.dimensions), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            block = rows[start:start + SCORE_BLOCK_ROWS]
+            with reading():
+                present = block < len(self.matrix)
+                out[start:start + len(block)][present] = self.matrix.decode(block[present])
+        return out
+
+    def _scores(self, query, nodes):
+        """Similarities of a query to graph nodes, tombstones included"""
+        rows = self._node_row[nodes]
+        if not self._tombstones:
+            return self.matrix.scores(query, rows)
+        live = rows >= 0
+        if live.all():
+            return self.matrix.scores(query, rows)
+        scores = np.empty(len(nodes), dtype=np.float32)
+        if live.any():
+            scores[live] = self.matrix.scores(query, rows[live])
+        for i in np.flatnonzero(~live):
+            scores[i] = self._tombstones[nodes[i]] @ query
+        return scores
+
+    def _neighbours(self, node, layer):
+        if layer == 0:
+            return self._layer0[node]
+        nodes, links = self._upper[layer - 1]
+        return links[np.searchsorted(nodes, node)]
+
+    def _search_layer(self, query, entry_points, ef, layer):
+        """Best-first search on one layer; returns [(score, node)] best first"""
+        visited = set(entry_points)
+        scores = self._scores(query, entry_points).tolist()
+        candidates = [(-score, node) for score, node in zip(scores, entry_points)]
+        heapq.heapify(candidates)
+        results = [(score, node) for score, node in zip(scores, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_score, node = heapq.heappop(candidates)
+            if -negative_score < results[0][0] and len(results) >= ef:
+                break
+            fresh = [n for n in self._neighbours(node, layer).tolist() if n >= 0 and n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for score, neighbour in zip(self._scores(query, fresh).tolist(), fresh):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbour))
+                    heapq.heappush(results, (score, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
@@ -0,0 +1,130 @@
+# ===== FILE: ./backend/utils/ingest.py =====
+
+"""
+Bulk ingest pipeline: embed in a process pool, then upsert in large batches.
+
+Texts are split into chunked work units and embedded on a shared
+ProcessPoolExecutor, so ingest scales with the number of cores instead of
+running on the request thread. Results come back in input order, with a
+per-item error instead of failing the whole upload.
+"""
+
+import os
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.config import Config
+
+
+def _embed_work_unit(provider, texts, model, max_retries=0, backoff=0.5):
+    """
+    Runs in a worker process. Embeds one chunk, retrying retryable failures
+    with backoff. If the batch still fails for a non-retryable reason, embeds
+    item by item so one bad text only fails itself; a retryable failure that
+    outlasts the retries (rate limit, outage) fails the whole chunk instead.
+    Returns (vectors, errors) with None in the slots that failed.
+    """
+    from backend.utils.embedding_providers import EmbeddingProviderError, _embed_chunk
+
+    try:
+        return list(_embed_chunk(provider, texts, model, max_retries, backoff)), [None] * len(texts)
+    except Exception as e:
+        if len(texts) == 1 or (isinstance(e, EmbeddingProviderError) and e.retryable):
+            return [None] * len(texts), [f"{type(e).__name__}: {e}"] * len(texts)
+
+    vectors, errors = [], []
+    for text in texts:
+        try:
+            vectors.append(_embed_chunk(provider, [text], model, max_retries, backoff)[0])
+            errors.append(None)
+        except Exception as e:
+            vectors.append(None)
+            errors.append(f"{type(e).__name__}: {e}")
+    return vectors, errors
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_ingest_pool():
+    """Shared process pool for bulk embedding (created on first use)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=Config.INGEST_WORKERS or os.cpu_count())
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def embed_in_processes(texts: list, model: str = "text-embedding-ada-002", chunk_size: int = None,
+                       executor=None, provider=None):
+    """
+    Embed texts across a process pool. Cached texts are not re-embedded and
+    fresh vectors are added to the cache.
+
+    Returns (vectors, errors), both in input order.
+    """
+    from backend.utils.embedding_cache import get_embedding_cache
+    from backend.utils.embedding_providers import get_embedding_provider
+
+    provider = provider or get_embedding_provider()
+    cache = get_embedding_cache()
+    chunk_size = chunk_size or Config.INGEST_CHUNK_SIZE
+    model_key = provider.model_key(model)
+    keys = [cache.make_key(provider.normalize(text), model_key) for text in texts]
+    vectors = [cache.get(key) for key in keys]
+    errors = [None] * len(texts)
+
+    missing = [position for position, vector in enumerate(vectors) if vector is None]
+    if not missing:
+        return vectors, errors
+
+    executor = executor or get_ingest_pool()
+    units = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+    futures = [
+        executor.submit(_embed_work_unit, provider, [texts[position] for position in unit], model,
+                        Config.EMBEDDING_MAX_RETRIES, Config.EMBEDDING_RETRY_BACKOFF)
+        for unit in units
+    ]
+    for unit, future in zip(units, futures):
+        try:
+            unit_vectors, unit_errors = future.result()
+        except Exception as e:
+            # The worker itself died (e.g. BrokenProcessPool); fail just this unit
+            unit_vectors, unit_errors = [None] * len(unit), [f"{type(e).__name__}: {e}"] * len(unit)
+        for position, vector, error in zip(unit, unit_vectors, unit_errors):
+            if error is None:
+                vectors[position] = cache.put(keys[position], vector)
+            else:
+                errors[position] = error
+    return vectors, errors
+
+
+def ingest_candidates(records: list, store_batch, batch_size: int = None, **embed_options) -> list:
+    """
+    Embed and store (candidate_id, resume_text, metadata) records.
+
+    store_batch receives lists of (candidate_id, vector, resume_text, metadata)
+    of up to batch_size items and returns True on success.
+    Returns one {"id", "status", "error"} dict per record, in input order.
+    """
+    batch_size = batch_size or Config.INGEST_UPSERT_BATCH_SIZE
+    vectors, errors = embed_in_processes([text for _, text, _ in records], **embed_options)
+
+    results = [
+        {"id": candidate_id, "status": "embedded" if error is None else "error", "error": error}
+        for (candidate_id, _, _), error in zip(records, errors)
+    ]
+    ready = [position for position, error in enumerate(errors) if error is None]
+    for start in range(0, len(ready), batch_size):
+        batch = ready[start:start + batch_size]
+        items = [(records[p][0], vectors[p], records[p][1], records[p][2]) for p in batch]
+        stored = store_batch(items)
+        for position in batch:
+            if stored:
+                results[position]["status"] = "stored"
+            else:
+                results[position].update(status="error", error="Vector store upsert failed")
+    return results
@@ -0,0 +1,353 @@
+# ===== FILE: ./backend/utils/ivf_index.py =====
+
+"""
+IVF (inverted file) index for the local store.
+
+k-means centroids are trained over a partition's stored rows, every row is
+assigned to its nearest centroid's list, and a query scans only the rows
+in its `nprobe` nearest lists. Memory on top of the matrix is one list
+entry per row plus the centroids.
+
+Until enough rows are stored the index is untrained and the partition
+scans exactly. Training is redone (in a background thread by default)
+once the corpus has changed by retrain_fraction since the last training,
+or once new rows fit their centroids noticeably worse than the training
+set did. The background thread trains on a sample decoded when it starts
+and reads the matrix only under `reading` (the store's read lock, set by
+its partition), one block of rows at a time.
+"""
+
+import math
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+from backend.utils.log import get_logger
+from backend.utils.vector_codecs import SCORE_BLOCK_ROWS, normalize
+
+log = get_logger("store")
+
+# Rows sampled per centroid for training, as in the usual IVF recipes
+TRAIN_ROWS_PER_LIST = 64
+# Drop in mean centroid similarity of new rows (vs the training rows) that counts as drift
+FIT_DRIFT = 0.05
+
+
+def train_centroids(vectors, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on normalized rows; returns (nlist, d) normalized centroids"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroids(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        sums = np.add.reduceat(vectors[order], starts[filled], axis=0)
+        centroids[filled] = normalize(sums)
+        # Reseed empty lists from random rows
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+def nearest_centroids(vectors, centroids) -> np.ndarray:
+    """Index of the best centroid for each row, computed in blocks"""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        stop = min(start + SCORE_BLOCK_ROWS, len(vectors))
+        out[start:stop] = np.argmax(vectors[start:stop] @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, matrix, nlist: int = 0, nprobe: int = 8, min_train_rows: int = 1024,
+                 retrain_fraction: float = 0.5, background: bool = True, seed: int = 0):
+        """
+        nlist: number of lists (0 = about sqrt(rows) at training time).
+        nprobe: lists scanned per query.
+        """
+        self.matrix = matrix
+        self.nlist = nlist
+        self.nprobe = max(1, int(nprobe))
+        self.min_train_rows = max(1, int(min_train_rows))
+        self.retrain_fraction = retrain_fraction
+        self.background = background
+        self.seed = seed
+        self.centroids = None
+        self.trainings = 0
+        self._count = 0
+        self._assignments = np.zeros(64, dtype=np.int64)
+        self._slots = np.zeros(64, dtype=np.int64)
+        self._lists = []
+        self._sizes = None
+        self._trained_rows = 0
+        self._changes = 0
+        self._baseline_fit = 0.0
+        self._new_fit_total = 0.0
+        self._new_fit_count = 0
+        self._thread = None
+        self._result = None
+        self._journal = None
+        self._journal_full = False
+        self._sampled_changes = 0
+        self._next_training = 0
+        self.reading = None  # context manager factory guarding matrix reads from other threads
+
+    def __len__(self):
+        return self._count
+
+    def __getstate__(self):
+        # An in-flight background training is not persisted; it restarts on the next change.
+        # The matrix and lock are not either: the partition attaches them again on load
+        state = self.__dict__.copy()
+        state.update(matrix=None, reading=None, _thread=None, _result=None, _journal=None, _journal_full=False)
+        return state
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, row: int):
+        """Register the matrix row `row` (rows are added in order)"""
+        self._install_pending()
+        if row != self._count:
+            raise ValueError(f"IVF rows must be added in order: expected {self._count}, got {row}")
+        self._count += 1
+        if len(self._assignments) < self._count:
+            self._assignments = np.resize(self._assignments, 2 * self._count)
+            self._slots = np.resize(self._slots, 2 * self._count)
+        self._changed(("set", row))
+        if self.trained:
+            self._place(row, self._assign_row(row))
+        self._maybe_train()
+
+    def update(self, row: int, vector=None):
+        """Re-assign a row whose vector was overwritten"""
+        self._install_pending()
+        self._changed(("set", row))
+        if self.trained:
+            self._unplace(row)
+            self._place(row, self._assign_row(row))
+        self._maybe_train()
+
+    def remove(self, row: int, vector=None):
+        """Drop a row; the last row takes its number (mirrors VectorMatrix.remove)"""
+        self._install_pending()
+        last = self._count - 1
+        self._changed(("remove", row, last))
+        if self.trained:
+            self._unplace(row)
+            if row != last:
+                target = self._assignments[last]
+                self._lists[target][self._slots[last]] = row
+                self._assignments[row], self._slots[row] = target, self._slots[last]
+        self._count -= 1
+        self._maybe_train()
+
+    @property
+    def needs_maintenance(self) -> bool:
+        """A background training has finished and waits to be installed"""
+        return self._result is not None
+
+    def maintain(self):
+        self._install_pending()
+
+    def exact_is_cheaper(self, matching: int, k: int) -> bool:
+        """Scan exactly until trained, or when the matching rows are fewer than a probe would visit"""
+        if not self.trained or not self._count:
+            return True
+        selectivity = matching / self._count
+        return matching <= self._count * self._probe_count(selectivity) / len(self._lists)
+
+    def search(self, query, k: int, mask=None):
+        """Top-k rows from the nearest lists; returns (rows, scores), best first"""
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if not self.trained or k <= 0:
+            return empty
+        query = np.asarray(query, dtype=np.float32)
+        selectivity = 1.0 if mask is None else max(float(mask[:self._count].mean()), 1.0 / self._count)
+        probe = np.argsort(-(self.centroids @ query), kind="stable")[:self._probe_count(selectivity)]
+        rows = np.concatenate([self._lists[i][:self._sizes[i]] for i in probe])
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if not len(rows):
+            return empty
+        scores = self.matrix.scores(query, rows)
+        winners = np.argsort(-scores, kind="stable")[:k]
+        return rows[winners], scores[winners]
+
+    def train(self):
+        """Train centroids now, in the calling thread"""
+        self._journal, self._sampled_changes = [], self._changes
+        self._result = self._compute_training(self._training_sample(), self._count)
+        self._install_pending()
+
+    def wait(self):
+        """Block until background training has caught up with the changes so far, installing each result"""
+        while self._thread is not None or self._result is not None:
+            thread = self._thread
+            if thread is not None:
+                thread.join()
+            self._install_pending()
+            self._maybe_train()
+
+    def _probe_count(self, selectivity):
+        # Selective filters leave fewer matches per list, so probe more lists
+        return min(len(self._lists), int(math.ceil(self.nprobe / selectivity)))
+
+    def _changed(self, event):
+        self._changes += 1
+        if self._journal is None or self._journal_full:
+            return
+        if len(self._journal) >= max(1024, self._count):
+            # Past one event per row, re-assigning every row on install is as cheap as replaying
+            self._journal_full = True
+            self._journal.clear()
+        else:
+            self._journal.append(event)
+
+    def _maybe_train(self):
+        if self._thread is not None or self._journal is not None or self._count < self.min_train_rows:
+            return
+        if self._changes < self._next_training:
+            return
+        if self.trained:
+            grown = self._changes >= self.retrain_fraction * max(1, self._trained_rows)
+            worse_fit = (
+                self._new_fit_count >= 100
+                and self._new_fit_total / self._new_fit_count < self._baseline_fit - FIT_DRIFT
+            )
+            if not (grown or worse_fit):
+                return
+        if not self.background:
+            self.train()
+            return
+        # Rows touched from here on are journaled and re-assigned when the result is installed.
+        # The sample is decoded here, under the caller's write lock
+        self._journal, self._sampled_changes = [], self._changes
+        sample, rows = self._training_sample(), self._count
+        self._thread = threading.Thread(target=self._train_in_background, args=(sample, rows), daemon=True)
+        self._thread.start()
+
+    def _train_in_background(self, sample, rows):
+        try:
+            self._result = self._compute_training(sample, rows, self.reading or nullcontext)
+        except Exception:
+            log.exception("IVF training failed", rows=rows)
+            # Nothing to install: stop journaling, and retry only after another round of changes
+            self._journal = None
+            self._next_training = self._changes + max(1, int(self.retrain_fraction * self._count))
+        finally:
+            # An install may already have started the next training
+            if self._thread is threading.current_thread():
+                self._thread = None
+
+    def _training_sample(self):
+        nlist = self._target_nlist()
+        size = min(self._count, nlist * TRAIN_ROWS_PER_LIST)
+        rng = np.random.default_rng(self.seed + self.trainings)
+        rows = np.sort(rng.choice(self._count, size, replace=False))
+        return self.matrix.decode(rows).copy()
+
+    def _target_nlist(self):
+        return self.nlist or max(1, int(round(math.sqrt(self._count))))
+
+    def _compute_training(self, sample, rows, reading=nullcontext):
+        """Centroids for a sample and the list of every row; rows are read in blocks under `reading`"""
+        centroids = train_centroids(normalize(sample), self._target_nlist(), seed=self.seed + self.trainings)
+        assignments = np.empty(rows, dtype=np.int64)
+        for start in range(0, rows, SCORE_BLOCK_ROWS):
+            with reading():
+                # Rows removed meanwhile are journaled; the ones past the end are re-assigned on install
+                stop = min(start + SCORE_BLOCK_ROWS, rows, len(self.matrix))
+                if stop > start:
+                    block = self.matrix.decode(np.arange(start, stop))
+            if stop <= start:
+                assignments = assignments[:start]
+                break
+            assignments[start:stop] = nearest_centroids(block, centroids)
+        baseline = float(np.mean(np.max(normalize(sample) @ centroids.T, axis=1)))
+        return centroids, assignments, baseline
+
+    def _install_pending(self):
+        """Swap in a finished training, re-assigning rows touched while it ran"""
+        if self._result is None:
+            return
+        centroids, assignments, baseline = self._result
+        journal = self._journal
+        if self._journal_full:
+            journal, assignments = [], assignments[:0]
+        self._result = self._journal = self._thread = None
+        self._journal_full = False
+
+        dirty = set(range(len(assignments), self._count))
+        assignments = np.resize(assignments, max(len(assignments), self._count))
+        for event in journal:
+            if event[0] == "set":
+                dirty.add(event[1])
+            else:
+                _, row, last = event
+                dirty.discard(row)
+                if last in dirty:
+                    dirty.discard(last)
+                    dirty.add(row)
+                else:
+                    assignments[row] = assignments[last]
+        assignments = assignments[:self._count]
+        if dirty:
+            rows = np.array(sorted(row for row in dirty if row < self._count), dtype=np.int64)
+            if len(rows):
+                assignments[rows] = nearest_centroids(self.matrix.decode(rows), centroids)
+
+        self.centroids = centroids
+        self._rebuild_lists(assignments)
+        self.trainings += 1
+        self._trained_rows = self._count
+        # Changes made while it ran count towards the next training
+        self._changes -= self._sampled_changes
+        self._next_training = 0
+        self._baseline_fit = baseline
+        self._new_fit_total, self._new_fit_count = 0.0, 0
+
+    def _rebuild_lists(self, assignments):
+        nlist = len(self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        self._lists = [order[bounds[i]:bounds[i + 1]].copy() for i in range(nlist)]
+        self._sizes = counts.astype(np.int64)
+        self._assignments = np.resize(assignments, max(64, 2 * self._count))
+        self._slots = np.zeros(len(self._assignments), dtype=np.int64)
+        self._slots[order] = np.arange(len(order)) - bounds[assignments[order]]
+
+    def _assign_row(self, row):
+        similarities = self.centroids @ self.matrix.decode([row])[0]
+        best = int(np.argmax(similarities))
+        self._new_fit_total += float(similarities[best])
+        self._new_fit_count += 1
+        return best
+
+    def _place(self, row, target):
+        members, size = self._lists[target], self._sizes[target]
+        if size == len(members):
+            members = self._lists[target] = np.resize(members, max(16, 2 * size))
+        members[size] = row
+        self._sizes[target] = size + 1
+        self._assignments[row], self._slots[row] = target, size
+
+    def _unplace(self, row):
+        """Remove a row from its list, moving the list's last entry into its slot"""
+        target, slot = self._assignments[row], self._slots[row]
+        members = self._lists[target]
+        last_slot = self._sizes[target] - 1
+        moved = members[last_slot]
+        members[slot] = moved
+        self._slots[moved] = slot
+        self._sizes[target] = last_slot
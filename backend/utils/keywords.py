@@ -0,0 +1,80 @@
+# ===== FILE: ./backend/utils/keywords.py =====
+
+"""
+Single-pass keyword counting shared by embeddings and scoring.
+
+One compiled regex finds every keyword occurrence in one scan of the text,
+and results are cached per text, so a resume that is fingerprinted and then
+scored is only scanned once.
+"""
+
+import re
+from collections import Counter
+from functools import lru_cache
+from types import MappingProxyType
+
+# Order matters: keyword i drives the i-th group of fingerprint boosts
+TECH_KEYWORDS = (
+    'python', 'flask', 'django', 'react', 'javascript',
+    'node', 'java', 'backend', 'frontend', 'developer',
+    'api', 'web', 'database', 'sql', 'postgresql',
+    'mongodb', 'docker', 'aws', 'cloud', 'microservices',
+)
+
+
+class KeywordScanner:
+    """
+    Counts keyword occurrences exactly like `text.count(keyword)` per keyword,
+    but in one pass over the text.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        longest_first = sorted(set(self.keywords), key=len, reverse=True)
+        # Zero-width lookahead so matches may overlap (e.g. "sql" inside "postgresql")
+        self._pattern = re.compile("(?=(" + "|".join(map(re.escape, longest_first)) + "))")
+        # The alternation reports only the longest keyword starting at a position;
+        # shorter keywords that are its prefixes ("java" in "javascript") start there too
+        self._prefixes = {
+            keyword: tuple(other for other in longest_first if other != keyword and keyword.startswith(other))
+            for keyword in longest_first
+        }
+
+        # A keyword whose prefix is also its suffix ("aa") could overlap itself;
+        # str.count skips those overlaps, so such vocabularies take the slow path
+        self._self_overlapping = any(
+            keyword[:size] == keyword[-size:]
+            for keyword in longest_first for size in range(1, len(keyword))
+        )
+
+    def count(self, text_lower: str) -> dict:
+        if self._self_overlapping:
+            return self._count_positional(text_lower)
+        found = Counter(self._pattern.findall(text_lower))
+        counts = dict.fromkeys(self.keywords, 0)
+        for longest, occurrences in found.items():
+            for keyword in (longest,) + self._prefixes[longest]:
+                counts[keyword] += occurrences
+        return counts
+
+    def _count_positional(self, text_lower: str) -> dict:
+        counts = dict.fromkeys(self.keywords, 0)
+        next_free = {}
+        for match in self._pattern.finditer(text_lower):
+            start = match.start()
+            longest = match.group(1)
+            for keyword in (longest,) + self._prefixes[longest]:
+                # str.count never counts overlapping occurrences of the same keyword
+                if start >= next_free.get(keyword, 0):
+                    counts[keyword] += 1
+                    next_free[keyword] = start + len(keyword)
+        return counts
+
+
+_scanner = KeywordScanner(TECH_KEYWORDS)
+
+
+@lru_cache(maxsize=512)
+def scan_keywords(text: str) -> MappingProxyType:
+    """Case-insensitive TECH_KEYWORDS counts for text (cached, read-only)"""
+    return MappingProxyType(_scanner.count(text.lower()))
@@ -0,0 +1,165 @@
+# ===== FILE: ./backend/utils/log.py =====
+
+"""
+Structured, level-gated logging for the backend.
+
+    log = get_logger("store")
+    log.debug("Stored vector", id=vector_id, dimensions=len(vector))
+
+Each subsystem logs under "talentmatch.<subsystem>". A call first checks the
+level; below it, nothing is formatted or written. Field values that are
+callables are called only when the line is emitted, for the rare field that
+is costly to compute. Settings (see Config):
+
+    LOG_LEVEL         default level, e.g. INFO
+    LOG_LEVELS        per-subsystem overrides: "store=DEBUG,embeddings=WARNING"
+    LOG_FORMAT        "text" (key=value) or "json" (one object per line)
+    LOG_DEBUG_SAMPLE  fraction of debug lines emitted when debug is on (1 = all)
+"""
+
+import sys
+import json
+import time
+import logging
+import threading
+
+ROOT = "talentmatch"
+
+_configured = False
+_configure_lock = threading.Lock()
+_loggers = {}
+_sample_every = 1  # emit every Nth debug line
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time, as print() did"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_format: bool = False):
+        super().__init__()
+        self.json_format = json_format
+
+    def format(self, record):
+        fields = {
+            key: value() if callable(value) else value
+            for key, value in getattr(record, "fields", {}).items()
+        }
+        subsystem = record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        if self.json_format:
+            entry = {"time": timestamp, "level": record.levelname, "subsystem": subsystem,
+                     "event": record.getMessage(), **fields}
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        line = f"{timestamp} {record.levelname:<7} {subsystem}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class Logger:
+    """Thin wrapper over a stdlib logger taking an event name plus fields"""
+
+    __slots__ = ("_logger", "_sample_every", "_debug_calls")
+
+    def __init__(self, logger, sample_every: int = 1):
+        self._logger = logger
+        self._sample_every = sample_every
+        self._debug_calls = 0
+
+    @property
+    def debug_enabled(self) -> bool:
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, event, **fields):
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        if self._sample_every > 1:
+            self._debug_calls += 1
+            if self._debug_calls % self._sample_every:
+                return
+        self._logger.debug(event, extra={"fields": fields}, stacklevel=2)
+
+    def info(self, event, **fields):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info(event, extra={"fields": fields}, stacklevel=2)
+
+    def warning(self, event, **fields):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._logger.warning(event, extra={"fields": fields}, stacklevel=2)
+
+    def error(self, event, **fields):
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._logger.error(event, extra={"fields": fields}, stacklevel=2)
+
+    def exception(self, event, **fields):
+        """error() with the current exception's traceback"""
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._logger.error(event, extra={"fields": fields}, exc_info=True, stacklevel=2)
+
+
+def parse_levels(spec: str) -> dict:
+    """"store=DEBUG, embeddings=warning" -> {"store": "DEBUG", "embeddings": "WARNING"}"""
+    levels = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            subsystem, level = part.split("=", 1)
+            levels[subsystem.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(level: str = None, levels: str = None, format: str = None, debug_sample: float = None):
+    """
+    Install the handler and levels (defaults from Config). get_logger calls
+    this on first use; call it again to change settings at runtime.
+    """
+    global _configured, _sample_every
+    from backend.config import Config
+
+    level = (level or Config.LOG_LEVEL).upper()
+    levels = parse_levels(Config.LOG_LEVELS if levels is None else levels)
+    json_format = (format or Config.LOG_FORMAT) == "json"
+    debug_sample = Config.LOG_DEBUG_SAMPLE if debug_sample is None else debug_sample
+    with _configure_lock:
+        root = logging.getLogger(ROOT)
+        root.setLevel(level)
+        root.propagate = False
+        handler = next((h for h in root.handlers if isinstance(h, _StdoutHandler)), None)
+        if handler is None:
+            handler = _StdoutHandler()
+            root.addHandler(handler)
+        handler.setFormatter(StructuredFormatter(json_format))
+        for name in set(levels) | set(_loggers):
+            logging.getLogger(f"{ROOT}.{name}").setLevel(levels.get(name, logging.NOTSET))
+        _sample_every = max(1, round(1 / debug_sample)) if debug_sample > 0 else sys.maxsize
+        for logger in _loggers.values():
+            logger._sample_every = _sample_every
+        _configured = True
+
+
+def get_logger(subsystem: str) -> Logger:
+    """Logger for a subsystem ("store", "pinecone", "embeddings", ...)"""
+    logger = _loggers.get(subsystem)
+    if logger is None:
+        if not _configured:
+            configure()
+        with _configure_lock:
+            logger = _loggers.get(subsystem)
+            if logger is None:
+                logger = _loggers[subsystem] = Logger(logging.getLogger(f"{ROOT}.{subsystem}"), _sample_every)
+    return logger
@@ -0,0 +1,259 @@
+# ===== FILE: ./backend/utils/metadata_columns.py =====
+
+"""
+Columnar metadata for the local vector store.
+
+Instead of one dict per vector, every field is a row-aligned column. String
+values and string list elements (type, skills, ...) are interned, so a value
+shared by many rows is stored once. Text previews live in an append-only
+UTF-8 blob addressed by (offset, length) per row and are decoded only when
+a caller reads them; metadata_items(text_limit=...) decodes just a prefix.
+
+Rows are append-only: an overwrite writes a new row and the old one is
+compacted away later. Query matches pin the rows they found, so their lazy
+metadata is what the query saw even if the id is overwritten meanwhile.
+metadata[id] still returns a plain dict (lists come back as lists).
+"""
+
+import sys
+from operator import itemgetter
+from collections.abc import Mapping
+
+import numpy as np
+
+from backend.utils.vector_codecs import PaddedRows
+
+# Fields whose string values go to the text blob instead of a column
+TEXT_FIELDS = ("text",)
+# Rows left behind by overwrites are compacted away once they exceed both this and the live rows
+COMPACT_MIN_ROWS = 1024
+
+
+class _Missing:
+    """Marks a row that does not have a column's field (None is a valid value)"""
+
+    def __reduce__(self):
+        return "_MISSING"
+
+    def __repr__(self):
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(sys.intern(item) if isinstance(item, str) else item for item in value)
+    return value
+
+
+class _TextColumn:
+    """Append-only UTF-8 strings packed into one growable byte blob"""
+
+    def __init__(self, capacity: int = 64):
+        self._blob = np.zeros(4096, dtype=np.uint8)
+        self._spans = np.full((max(1, capacity), 2), -1, dtype=np.int64)  # row -> (offset, length); -1 = none
+        self.rows = 0
+        self.used = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_blob"] = PaddedRows(self._blob[:self.used], self.used + self.used // 8 + 4096)
+        state["_spans"] = PaddedRows(self._spans[:self.rows], self.rows + self.rows // 8 + 64)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Padding rows come back as zeros; mark them empty
+        self._spans[self.rows:] = -1
+
+    @property
+    def nbytes(self) -> int:
+        return self._blob.nbytes + self._spans.nbytes
+
+    def append(self, text):
+        """Add the next row's text (None for none); bytes are written before the span that points at them"""
+        row = self.rows
+        if row >= len(self._spans):
+            spans = np.full((2 * len(self._spans), 2), -1, dtype=np.int64)
+            spans[:row] = self._spans[:row]
+            self._spans = spans
+        if text is not None:
+            data = np.frombuffer(text.encode(), dtype=np.uint8)
+            if self.used + len(data) > len(self._blob):
+                # Grow by half: text dominates metadata memory, so keep the slack small
+                blob = np.empty(max(self.used + len(data), len(self._blob) + len(self._blob) // 2), dtype=np.uint8)
+                blob[:self.used] = self._blob[:self.used]
+                self._blob = blob
+            self._blob[self.used:self.used + len(data)] = data
+            self._spans[row] = (self.used, len(data))
+            self.used += len(data)
+        self.rows += 1
+
+    def get(self, row, limit: int = None):
+        """A row's text (None if it has none); with limit, only its first `limit` characters"""
+        offset, length = self._spans[row].tolist()
+        if length < 0:
+            return None
+        if limit is not None:
+            # A character is at most 4 bytes, so 4 * limit bytes hold the whole prefix
+            length = min(length, 4 * limit)
+        return self._blob[offset:offset + length].tobytes().decode("utf-8", errors="ignore")[:limit]
+
+    def get_many(self, rows, limit: int = None) -> list:
+        """get() for many rows at once"""
+        spans = self._spans[np.asarray(rows, dtype=np.int64)]
+        if limit is not None:
+            spans[:, 1] = np.minimum(spans[:, 1], 4 * limit)
+        blob = memoryview(self._blob)
+        return [
+            None if length < 0 else str(blob[offset:offset + length], "utf-8", "ignore")[:limit]
+            for offset, length in spans.tolist()
+        ]
+
+
+class _Columns:
+    """
+    Append-only rows: field columns of interned values plus text blobs. A
+    row is never changed once written, so a reader holding a row number sees
+    that row as it was, whatever is appended later.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.columns = {}    # field -> row-aligned list of interned values (_MISSING where absent)
+        self.texts = {field: _TextColumn(capacity) for field in TEXT_FIELDS}
+        self.count = 0
+
+    def append(self, metadata) -> int:
+        row = self.count
+        values = {}
+        for field, value in metadata.items():
+            if not (field in self.texts and (value is None or isinstance(value, str))):
+                values[field] = _intern(value)
+        for field in values:
+            if field not in self.columns:
+                self.columns[field] = [_MISSING] * row
+        for field, column in list(self.columns.items()):
+            column.append(values.get(field, _MISSING))
+        for field, texts in self.texts.items():
+            texts.append(None if field in values else metadata.get(field))
+        self.count += 1
+        return row
+
+    def row(self, row, text_limit=None) -> dict:
+        metadata = {}
+        for field, column in list(self.columns.items()):
+            if row < len(column) and column[row] is not _MISSING:
+                value = column[row]
+                metadata[field] = list(value) if type(value) is tuple else value
+        if text_limit != 0:
+            for field, texts in self.texts.items():
+                text = texts.get(row, text_limit)
+                if text is not None:
+                    metadata[field] = text
+        return metadata
+
+    def rows(self, rows, text_limit=None) -> list:
+        """Metadata dicts for many rows, filled one column at a time"""
+        records = [{} for _ in rows]
+        if not rows:
+            return records
+        last = max(rows)
+        for field, column in list(self.columns.items()):
+            if last < len(column):
+                values = itemgetter(*rows)(column) if len(rows) > 1 else (column[rows[0]],)
+            else:  # a column added after some of these rows were read
+                values = [column[row] if row < len(column) else _MISSING for row in rows]
+            for record, value in zip(records, values):
+                if value is not _MISSING:
+                    record[field] = list(value) if type(value) is tuple else value
+        if text_limit != 0:
+            for field, texts in self.texts.items():
+                for record, text in zip(records, texts.get_many(rows, text_limit)):
+                    if text is not None:
+                        record[field] = text
+        return records
+
+
+class _Pinned:
+    """Metadata source for query matches: the rows the ids had when the query ran"""
+
+    __slots__ = ("_data", "_rows")
+
+    def __init__(self, data, rows):
+        self._data = data
+        self._rows = rows
+
+    def get(self, vector_id, default=None):
+        row = self._rows.get(vector_id)
+        return default if row is None else self._data.row(row)
+
+
+class ColumnarMetadata(Mapping):
+    """id -> metadata dict, stored column by column; overwrites append a new row"""
+
+    def __init__(self):
+        self._rows = {}       # id -> live row
+        self._data = _Columns()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __contains__(self, vector_id):
+        return vector_id in self._rows
+
+    def __getitem__(self, vector_id):
+        return self.row(vector_id)
+
+    def __setitem__(self, vector_id, metadata):
+        self._rows[vector_id] = self._data.append(metadata)
+        garbage = self._data.count - len(self._rows)
+        if garbage > max(COMPACT_MIN_ROWS, len(self._rows)):
+            self.compact()
+
+    def row(self, vector_id, text_limit: int = None) -> dict:
+        """
+        Materialize one id's metadata. text_limit truncates text fields to
+        that many characters (0 leaves them out).
+        """
+        return self._data.row(self._rows[vector_id], text_limit)
+
+    def text(self, vector_id, field: str = "text", limit: int = None):
+        """One text field, decoded on demand"""
+        return self._data.texts[field].get(self._rows[vector_id], limit)
+
+    def items(self, text_limit: int = None):
+        """(id, metadata) pairs; text_limit as in row()"""
+        return list(zip(self._rows, self._data.rows(list(self._rows.values()), text_limit)))
+
+    def pin(self, ids) -> _Pinned:
+        """A source for lazy match metadata, fixed to the rows these ids have now"""
+        return _Pinned(self._data, {vector_id: self._rows[vector_id] for vector_id in ids})
+
+    def compact(self):
+        """Drop rows left behind by overwrites (pinned sources keep the old rows)"""
+        data = _Columns(len(self._rows))
+        live = self._data.rows(list(self._rows.values()))
+        self._rows = {vector_id: data.append(metadata) for vector_id, metadata in zip(self._rows, live)}
+        self._data = data
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size: column slots, interned values counted once, and the text blobs"""
+        slots = 8 * self._data.count * len(self._data.columns)
+        values = {
+            id(item): item
+            for column in self._data.columns.values()
+            for value in column
+            for item in (value if isinstance(value, tuple) else (value,))
+            if isinstance(item, str)
+        }
+        return slots + sum(sys.getsizeof(item) for item in values.values()) + sum(
+            texts.nbytes for texts in self._data.texts.values()
+        )
@@ -0,0 +1,106 @@
+# ===== FILE: ./backend/utils/projection.py =====
+
+"""
+Dimensionality reduction for stored embeddings.
+
+Projections map full-size embeddings (e.g. 1536-d) to a smaller space
+(e.g. 256-d) before they enter the store. Random projection needs no data;
+PCA is fitted on a sample of the stored corpus once it holds min_fit_rows
+vectors (until then the store keeps them full-size), and refitted each time
+the corpus grows refit_growth-fold when the full vectors are kept.
+"""
+
+import numpy as np
+
+
+class RandomProjection:
+    """Gaussian random projection (Johnson-Lindenstrauss); ready immediately"""
+    kind = "random"
+
+    def __init__(self, input_dimensions: int, output_dimensions: int, seed: int = 0):
+        self.input_dimensions = input_dimensions
+        self.output_dimensions = output_dimensions
+        rng = np.random.default_rng(seed)
+        self.components = (
+            rng.standard_normal((input_dimensions, output_dimensions)) / np.sqrt(output_dimensions)
+        ).astype(np.float32)
+
+    @property
+    def fitted(self) -> bool:
+        return True
+
+    def needs_fit(self, rows: int, can_refit: bool) -> bool:
+        return False
+
+    def fit(self, vectors, rows: int = None):
+        return self
+
+    def transform(self, vectors) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float32) @ self.components
+
+
+class PCAProjection:
+    """Principal components of the stored vectors; must be fitted before use"""
+    kind = "pca"
+
+    def __init__(self, input_dimensions: int, output_dimensions: int, max_fit_rows: int = 10000,
+                 min_fit_rows: int = 1000, refit_growth: float = 2.0, seed: int = 0):
+        """
+        min_fit_rows: stored vectors needed before the first automatic fit.
+        refit_growth: refit once the corpus is this many times the size it was at the last fit (0 = never).
+        """
+        self.input_dimensions = input_dimensions
+        self.output_dimensions = output_dimensions
+        self.max_fit_rows = max_fit_rows
+        self.min_fit_rows = max(1, int(min_fit_rows))
+        self.refit_growth = refit_growth
+        self.seed = seed
+        self.mean = None
+        self.components = None
+        self.fitted_rows = 0
+
+    @property
+    def fitted(self) -> bool:
+        return self.components is not None
+
+    def needs_fit(self, rows: int, can_refit: bool) -> bool:
+        """Whether a store of `rows` vectors should (re)fit now; refits need the full vectors"""
+        if not self.fitted:
+            return rows >= self.min_fit_rows
+        return can_refit and self.refit_growth > 0 and rows >= self.refit_growth * max(1, self.fitted_rows)
+
+    def fit(self, vectors, rows: int = None):
+        """Fit on (a random sample of) the given rows; rows is the corpus size they were sampled from"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.fitted_rows = rows or len(vectors)
+        if len(vectors) > self.max_fit_rows:
+            rng = np.random.default_rng(self.seed)
+            vectors = vectors[rng.choice(len(vectors), self.max_fit_rows, replace=False)]
+        self.mean = vectors.mean(axis=0)
+        centered = (vectors - self.mean).astype(np.float64)
+        # Eigenvectors of the d x d covariance always give output_dimensions
+        # components, even when there are fewer rows than dimensions
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        order = np.argsort(eigenvalues)[::-1][:self.output_dimensions]
+        self.components = eigenvectors[:, order].astype(np.float32)
+        return self
+
+    def transform(self, vectors) -> np.ndarray:
+        if not self.fitted:
+            raise RuntimeError("PCAProjection must be fitted before transform")
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components
+
+
+PROJECTION_TYPES = {
+    "random": RandomProjection,
+    "pca": PCAProjection,
+}
+
+
+def make_projection(kind: str, input_dimensions: int, output_dimensions: int, **options):
+    """Create a projection ("random" or "pca") from input to output dimensions; options go to the projection"""
+    try:
+        projection_type = PROJECTION_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown projection: {kind}") from None
+    return projection_type(input_dimensions, output_dimensions, **options)
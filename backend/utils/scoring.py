@@ -1,6 +1,7 @@
 # ===== FILE: ./backend/utils/scoring.py =====
 
 import random
+from backend.utils.keywords import scan_keywords
 # Remove the problematic import and use a fallback
 
 def score_candidate(candidate_data: dict):
@@ -15,7 +16,8 @@ def score_candidate(candidate_data: dict):
     if resume_text:
         # Simple keyword matching for bonus points
         keywords = ["python", "flask", "react", "django", "javascript", "backend", "developer"]
-        keyword_bonus = sum(10 for keyword in keywords if keyword in resume_text.lower())
+        counts = scan_keywords(resume_text)
+        keyword_bonus = sum(10 for keyword in keywords if counts[keyword])
         base_score = min(100, base_score + keyword_bonus)
     
     return {
@@ -31,14 +33,15 @@ def score_candidate_advanced(candidate_data: dict, job_text: str = ""):
     
     if job_text:
         # Simple keyword matching between candidate and job
-        candidate_text = candidate_data.get("resume", "").lower()
-        job_text_lower = job_text.lower()
+        # Shares the cached scan made by score_candidate above
+        candidate_counts = scan_keywords(candidate_data.get("resume", ""))
+        job_counts = scan_keywords(job_text)
         
         matching_keywords = []
         keywords = ["python", "flask", "react", "django", "javascript", "backend", "developer", "web", "api"]
         
         for keyword in keywords:
-            if keyword in candidate_text and keyword in job_text_lower:
+            if candidate_counts[keyword] and job_counts[keyword]:
                 matching_keywords.append(keyword)
         
         # Add bonus for matching keywords
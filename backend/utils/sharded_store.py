@@ -0,0 +1,474 @@
+# ===== FILE: ./backend/utils/sharded_store.py =====
+
+"""
+Local vector store split across worker processes.
+
+Each shard is a SimpleVectorStore in its own process. Ids are assigned to
+shards by jump consistent hashing of md5(id). A query is sent to every
+shard at once, and their top-k lists are merged by score. On a shard count
+change only the ids whose shard changes are moved: growing from N to N + 1
+shards moves about 1 / (N + 1) of the corpus.
+
+Each shard reports how long it spent on every query, and stats() gives
+per-shard latency percentiles over the most recent queries.
+
+A persistent sharded store belongs to one process: it holds a flock on
+<path>/sharded.lock while open, and a second process (e.g. another
+gunicorn worker) opening the same path gets an error instead of starting
+its own shard processes on the same shard directories.
+"""
+
+import os
+import time
+import heapq
+import shutil
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from collections.abc import Mapping
+
+import numpy as np
+
+from backend.utils.log import get_logger
+from backend.utils.rwlock import RWLock
+from backend.utils.vector_filters import validate_filter
+from backend.utils.vector_results import FetchResponse, QueryResponse
+
+log = get_logger("store")
+
+# Recent query timings kept per shard for stats()
+LATENCY_WINDOW = 1000
+
+
+def shard_for(vector_id, shards: int) -> int:
+    """Shard of an id: jump consistent hash (Lamping & Veach) of its md5"""
+    key = int.from_bytes(hashlib.md5(str(vector_id).encode()).digest()[:8], "little")
+    bucket, jump = -1, 0
+    while jump < shards:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def _open_shard(path, store_options, persistence_options):
+    from backend.utils.simple_store import SimpleVectorStore
+
+    if path is None:
+        return SimpleVectorStore(**store_options)
+    from backend.utils.store_persistence import open_store
+    return open_store(path, **persistence_options, **store_options)
+
+
+def _moving(store, shards, shard):
+    """Items whose id no longer hashes to this shard (all of them on a retired shard); the store is unchanged"""
+    if store.reduce_dimensions and not store.keep_originals:
+        raise ValueError("Rebalancing needs the full vectors; enable keep_originals with reduce_dimensions")
+    return [
+        (vector_id, store.vectors[vector_id], metadata)
+        for vector_id, metadata in store.metadata_items()
+        if shard >= shards or shard_for(vector_id, shards) != shard
+    ]
+
+
+def _prune(store, store_options, shards, shard):
+    """Drop the ids that moved to other shards (which already hold them); returns the rebuilt store"""
+    kept = [
+        (vector_id, store.vectors[vector_id], metadata)
+        for vector_id, metadata in store.metadata_items()
+        if shard_for(vector_id, shards) == shard
+    ]
+    if len(kept) == len(store.vectors):
+        return store
+
+    from backend.utils.simple_store import SimpleVectorStore
+    rebuilt = SimpleVectorStore(**store_options)
+    rebuilt.replay(kept)
+    if store.persistence is not None:
+        rebuilt.persistence = store.persistence
+        rebuilt.save()
+    return rebuilt
+
+
+def _serve(connection, shard, path, store_options, persistence_options):
+    """Shard process loop: (command, args) requests in, (ok, result, seconds) replies out"""
+    store = _open_shard(path, store_options, persistence_options)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        command, args = request
+        started = time.perf_counter()
+        try:
+            if command == "upsert":
+                if not store.upsert(*args):
+                    raise RuntimeError("upsert failed, see the shard's log")
+                result = len(store.vectors)
+            elif command == "query":
+                result = store.query(*args).matches
+            elif command == "query_many":
+                result = [response.matches for response in store.query_many(*args)]
+            elif command == "fetch":
+                result = store.fetch(*args).vectors
+            elif command == "metadata_items":
+                result = store.metadata_items(*args)
+            elif command == "count":
+                result = len(store.vectors)
+            elif command == "memory_stats":
+                result = store.memory_stats()
+            elif command == "save":
+                result = store.save()
+            elif command == "missing":
+                result = [vector_id for vector_id in args[0] if vector_id not in store.vectors]
+            elif command == "moving":
+                result = _moving(store, args[0], shard)
+            elif command == "prune":
+                store = _prune(store, store_options, args[0], shard)
+                result = len(store.vectors)
+            else:
+                raise ValueError(f"Unknown shard command: {command}")
+            reply = (True, result)
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        connection.send(reply + (time.perf_counter() - started,))
+    if store.persistence is not None:
+        store.persistence.close()
+    connection.close()
+
+
+class _Shard:
+    def __init__(self, context, index, path, store_options, persistence_options):
+        self.index = index
+        self.path = path
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child, index, path, store_options, persistence_options),
+            name=f"vector-shard-{index}", daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()  # one request in flight per pipe
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.vectors = 0
+
+    def stop(self):
+        with self.lock:
+            self.connection.send(None)
+            self.process.join()
+            self.connection.close()
+
+
+class _ShardedVectors(Mapping):
+    """Read-only id -> vector view, fetched from the owning shard"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, vector_id):
+        found = self._store.fetch([vector_id]).vectors
+        if vector_id not in found:
+            raise KeyError(vector_id)
+        return found[vector_id].values
+
+    def __iter__(self):
+        return iter([vector_id for vector_id, _ in self._store.metadata_items(text_limit=0)])
+
+    def __len__(self):
+        return sum(shard.vectors for shard in self._store._shards)
+
+
+class ShardedVectorStore:
+    def __init__(self, shards: int = 2, path: str = None, persistence_options: dict = None,
+                 start_method: str = "spawn", **store_options):
+        """
+        shards: number of shard processes.
+        path: when set, shard i persists to path/shard-<i> through
+        store_persistence.open_store (with persistence_options: fsync,
+        snapshot_wal_bytes); a directory left with a different shard count is
+        rebalanced on open. RuntimeError if another process has it open.
+        store_options: passed to every shard's SimpleVectorStore.
+        """
+        self.path = path
+        self.store_options = store_options
+        self.persistence_options = dict(persistence_options or {})
+        self.vectors = _ShardedVectors(self)
+        self._context = multiprocessing.get_context(start_method)
+        self._lock = RWLock()  # requests take the read side, resize the write side
+        self._shards = []
+        self._gather_latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock_file = None
+
+        existing, interrupted = 0, None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._lock_directory()
+            existing = len([entry for entry in os.listdir(path) if entry.startswith("shard-")])
+            interrupted = self._read_resize_marker()
+            self._remove_retired()
+        self._start(existing or shards)
+        self._count_vectors()
+        if interrupted is not None:
+            # Finish a rebalance that stopped part way; it only moves what is still misplaced
+            log.warning("Resuming interrupted rebalance", shards=interrupted)
+            with self._lock.write():
+                self._rebalance(interrupted)
+        if len(self._shards) != shards:
+            self.resize(shards)
+        log.info("Sharded vector store started", shards=len(self._shards))
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._shards)
+
+    def _start(self, count):
+        for index in range(len(self._shards), count):
+            path = os.path.join(self.path, f"shard-{index}") if self.path else None
+            self._shards.append(_Shard(self._context, index, path, self.store_options, self.persistence_options))
+
+    def _count_vectors(self):
+        for shard, count in zip(self._shards, self._call(self._shards, "count", ())):
+            shard.vectors = count
+
+    def _call(self, shards, command, args_for):
+        """
+        Send a command to several shards at once and collect their replies in
+        order. args_for is one args tuple for all, or a list with one per shard.
+        """
+        shards = list(shards)
+        for shard in shards:  # always in index order, so concurrent calls cannot deadlock
+            shard.lock.acquire()
+        try:
+            for i, shard in enumerate(shards):
+                shard.connection.send((command, args_for[i] if isinstance(args_for, list) else args_for))
+            replies = [shard.connection.recv() for shard in shards]
+        finally:
+            for shard in shards:
+                shard.lock.release()
+        results = []
+        for shard, (ok, result, seconds) in zip(shards, replies):
+            if not ok:
+                raise RuntimeError(f"Shard {shard.index} failed on {command}: {result}")
+            if command in ("query", "query_many"):
+                shard.latencies.append(seconds)
+            results.append(result)
+        return results
+
+    def upsert(self, items) -> bool:
+        """Store vectors with metadata, each on the shard its id hashes to; False if a shard failed"""
+        try:
+            with self._lock.read():
+                self._upsert(items)
+        except Exception:
+            log.exception("Error in sharded upsert", items=len(items))
+            return False
+        return True
+
+    def _upsert(self, items):
+        groups = {}
+        for item in items:
+            if len(item) >= 3:
+                groups.setdefault(shard_for(item[0], len(self._shards)), []).append(tuple(item[:3]))
+            else:
+                log.warning("Invalid item format", item=item)
+        targets = [self._shards[index] for index in sorted(groups)]
+        counts = self._call(targets, "upsert", [(groups[shard.index],) for shard in targets])
+        for shard, count in zip(targets, counts):
+            shard.vectors = count
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True, reduced=False):
+        """Query every shard in parallel and merge their top-k lists (reduced as in SimpleVectorStore.query)"""
+        if filter:
+            validate_filter(filter)
+        try:
+            started = time.perf_counter()
+            args = (np.asarray(vector, dtype=np.float32), top_k, filter, include_metadata, reduced)
+            with self._lock.read():
+                per_shard = self._call(self._shards, "query", args)
+            matches = _merge(per_shard, top_k)
+            self._gather_latencies.append(time.perf_counter() - started)
+            return QueryResponse(matches)
+        except Exception:
+            log.exception("Error in sharded query", filter=filter)
+            return QueryResponse()
+
+    def query_many(self, vectors, top_k=10, filter=None, include_metadata=True, reduced=False):
+        """Top-k matches for each row of a query matrix; every shard searches the whole batch"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if filter:
+            validate_filter(filter)
+        try:
+            started = time.perf_counter()
+            with self._lock.read():
+                per_shard = self._call(self._shards, "query_many", (vectors, top_k, filter, include_metadata, reduced))
+            results = [_merge(lists, top_k) for lists in zip(*per_shard)]
+            self._gather_latencies.append(time.perf_counter() - started)
+            return [QueryResponse(matches) for matches in results]
+        except Exception:
+            log.exception("Error in sharded query_many", queries=len(vectors), filter=filter)
+            return [QueryResponse() for _ in vectors]
+
+    def fetch(self, ids):
+        """Fetch vectors by IDs from the shards that own them"""
+        try:
+            with self._lock.read():
+                groups = {}
+                for vector_id in ids:
+                    groups.setdefault(shard_for(vector_id, len(self._shards)), []).append(vector_id)
+                targets = [self._shards[index] for index in sorted(groups)]
+                found = self._call(targets, "fetch", [(groups[shard.index],) for shard in targets])
+            vectors = {}
+            for shard_vectors in found:
+                vectors.update(shard_vectors)
+            return FetchResponse(vectors)
+        except Exception:
+            log.exception("Error in sharded fetch")
+            return FetchResponse()
+
+    def metadata_items(self, text_limit=None):
+        with self._lock.read():
+            per_shard = self._call(self._shards, "metadata_items", (text_limit,))
+        return [item for items in per_shard for item in items]
+
+    @property
+    def metadata(self):
+        """Merged id -> metadata dict (a copy; gathered from every shard)"""
+        return dict(self.metadata_items())
+
+    def save(self):
+        """Snapshot every persistent shard"""
+        with self._lock.read():
+            return self._call(self._shards, "save", ())
+
+    def resize(self, shards: int):
+        """Change the shard count, moving only the ids whose shard changes"""
+        shards = max(1, int(shards))
+        with self._lock.write():
+            if shards == len(self._shards):
+                return
+            self._rebalance(shards)
+
+    def _rebalance(self, shards):
+        """
+        Move every id to the shard it hashes to among `shards`. Moved items are
+        copied to their new shards and confirmed there before any shard drops
+        them, so a crash part way leaves duplicates (finished on the next
+        open, via the RESIZING marker) rather than lost vectors.
+        """
+        previous = len(self._shards)
+        log.info("Rebalancing vector store", previous=previous, shards=shards)
+        self._write_resize_marker(shards)
+        self._start(shards)
+        moved = [item for items in self._call(self._shards, "moving", (shards,)) for item in items]
+        retired = self._shards[shards:]
+        self._shards = self._shards[:shards]
+        if moved:
+            self._upsert(moved)
+            groups = {}
+            for vector_id, _, _ in moved:
+                groups.setdefault(shard_for(vector_id, shards), []).append(vector_id)
+            targets = [self._shards[index] for index in sorted(groups)]
+            missing = sum(map(len, self._call(targets, "missing", [(groups[shard.index],) for shard in targets])))
+            if missing:
+                self._shards += retired
+                raise RuntimeError(f"Rebalance stopped: {missing} moved vectors are missing from their new "
+                                   "shards; no shard was pruned")
+        # Every moved item is in place: only now drop the old copies
+        for shard, count in zip(self._shards, self._call(self._shards, "prune", (shards,))):
+            shard.vectors = count
+        for shard in retired:
+            shard.stop()
+            if shard.path:
+                os.replace(shard.path, os.path.join(self.path, f"retired-{shard.index}"))
+        self._clear_resize_marker()
+        self._remove_retired()
+        log.info("Rebalanced vector store", moved=len(moved))
+
+    def _lock_directory(self):
+        """Hold an exclusive flock on the store directory until close()"""
+        import fcntl
+
+        self._lock_file = open(os.path.join(self.path, "sharded.lock"), "a+b")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(
+                f"Sharded vector store at {self.path} is open in another process; run a single "
+                "worker with VECTOR_SHARDS > 1, or give each worker its own VECTOR_STORE_PATH"
+            ) from None
+
+    def _write_resize_marker(self, shards):
+        if not self.path:
+            return
+        marker = os.path.join(self.path, "RESIZING")
+        with open(marker + ".tmp", "w") as f:
+            f.write(str(shards))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(marker + ".tmp", marker)
+
+    def _read_resize_marker(self):
+        try:
+            with open(os.path.join(self.path, "RESIZING")) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _clear_resize_marker(self):
+        if self.path:
+            os.remove(os.path.join(self.path, "RESIZING"))
+
+    def _remove_retired(self):
+        """Delete directories of shards retired by a finished rebalance"""
+        for entry in os.listdir(self.path) if self.path else []:
+            if entry.startswith("retired-"):
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def memory_stats(self):
+        with self._lock.read():
+            per_shard = self._call(self._shards, "memory_stats", ())
+        return {
+            "shards": len(per_shard),
+            "vectors": sum(stats["vectors"] for stats in per_shard),
+            "total_bytes": sum(stats["total_bytes"] for stats in per_shard),
+            "per_shard": per_shard,
+        }
+
+    def stats(self) -> dict:
+        """Per-shard query latency (worker-side service time) and end-to-end scatter-gather latency"""
+        return {
+            "shards": [
+                dict(shard=shard.index, vectors=shard.vectors, **_latency_summary(shard.latencies))
+                for shard in self._shards
+            ],
+            "gather": _latency_summary(self._gather_latencies),
+        }
+
+    def close(self):
+        with self._lock.write():
+            for shard in self._shards:
+                shard.stop()
+            self._shards = []
+            if self._lock_file is not None:
+                self._lock_file.close()  # releases the flock
+                self._lock_file = None
+
+
+def _merge(per_shard, top_k):
+    """Best top_k of several best-first match lists"""
+    return heapq.nlargest(top_k, (match for matches in per_shard for match in matches), key=lambda m: m.score)
+
+
+def _latency_summary(latencies):
+    samples = np.array(latencies, dtype=np.float64) * 1000
+    if not len(samples):
+        return {"queries": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    return {
+        "queries": len(samples),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "max_ms": float(samples.max()),
+    }
@@ -4,88 +4,786 @@
 Simple in-memory store for testing without Pinecone
 """
 
-class SimpleVectorStore:
-    def __init__(self):
-        self.vectors = {}
-        self.metadata = {}
-        print("🔄 SimpleVectorStore initialized - NEW VERSION")
-        print(f"   Memory address: {id(self)}")
-    
-    def upsert(self, items):
-        """Store vectors with metadata"""
-        print(f"📥 SIMPLE STORE: Storing {len(items)} items")
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+from backend.utils.hnsw_index import HNSWIndex
+from backend.utils.ivf_index import IVFIndex
+from backend.utils.log import get_logger
+from backend.utils.metadata_columns import ColumnarMetadata
+from backend.utils.projection import make_projection
+from backend.utils.rwlock import RWLock
+from backend.utils.store_persistence import DeferredAttributes
+from backend.utils.vector_codecs import MATRIX_TYPES, make_matrix, normalize, top_k_indices
+from backend.utils.vector_filters import FilterError, MetadataIndex, validate_filter
+from backend.utils.vector_results import FetchResponse, Match, QueryResponse, Vector
+
+log = get_logger("store")
+
+# Below this fraction of a partition, filtered rows are gathered and scored on their own
+GATHER_FRACTION = 0.25
+
+# Approximate indexes selectable with SimpleVectorStore(index=...); "flat" is the exact scan
+ANN_INDEXES = {
+    "hnsw": HNSWIndex,
+    "ivf": IVFIndex,
+}
+
+
+class _DecodedVectors(Mapping):
+    """Read-only id -> vector view over the store's partitions"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, vector_id):
+        with self._store._lock.read():
+            return self._store._partitions[self._store._locations[vector_id]].vector(vector_id)
+
+    def __contains__(self, vector_id):
+        return vector_id in self._store._locations
+
+    def __iter__(self):
+        with self._store._lock.read():
+            return iter(list(self._store._locations))
+
+    def __len__(self):
+        # Partition sizes are known without unpickling a snapshot's deferred id maps
+        return sum(len(partition) for partition in list(self._store._partitions.values()))
+
+
+class _MetadataView(Mapping):
+    """Read-only id -> metadata view over the store's columnar metadata; each read builds a dict"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, vector_id):
+        with self._store._lock.read():
+            return self._store._metadata[vector_id]
+
+    def __iter__(self):
+        with self._store._lock.read():
+            return iter(list(self._store._metadata))
+
+    def __len__(self):
+        return len(self._store._metadata)
+
+
+class _Partition(DeferredAttributes):
+    """
+    Rows of one metadata 'type': a search matrix (possibly reduced and
+    compact), optional row-aligned full-size originals and the id <-> row map.
+    """
+
+    # Row-sized Python state, unpickled from a snapshot when first used
+    deferred = ("ids", "rows", "index", "ann")
+
+    def __init__(self, storage, keep_originals, make_index=None, storage_options=None):
+        self.storage = storage
+        self.storage_options = storage_options or {}
+        self.keep_originals = keep_originals
+        self.make_index = make_index
+        self.reading = None  # the store's read lock, for index work on other threads; set by attach()
+        self.matrix = None
+        self.ann = None
+        self.originals = None
+        self.ids = []
+        self.rows = {}
+        self.index = MetadataIndex()
+
+    def __len__(self):
+        return len(self.matrix) if self.matrix is not None else 0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["reading"] = None
+        return state
+
+    def _attributes_loaded(self):
+        # Indexes are pickled without the matrix they search or the lock guarding it
+        if self.ann is not None:
+            self.ann.matrix = self.matrix
+            self.ann.reading = self.reading
+
+    def attach(self, reading):
+        """Hand the partition (and its index) the store's read lock"""
+        self.reading = reading
+        if self.loaded and self.ann is not None:
+            self.ann.reading = reading
+
+    def check(self, vector, reduced, metadata):
+        """Raise ValueError for a row put() could not store, before anything is changed"""
+        if np.ndim(vector) != 1 or np.ndim(reduced) != 1:
+            raise ValueError(f"Expected a 1-d vector, got shape {np.shape(vector)}")
+        if self.originals is not None and len(vector) != self.originals.dimensions:
+            raise ValueError(f"Vector has {len(vector)} dimensions, partition stores {self.originals.dimensions}")
+        if self.matrix is not None and len(reduced) != self.matrix.dimensions:
+            raise ValueError(f"Vector has {len(reduced)} dimensions, partition stores {self.matrix.dimensions}")
+        if not isinstance(metadata, dict):
+            raise ValueError(f"Metadata must be a dict, got {type(metadata).__name__}")
+
+    def put(self, vector_id, vector, reduced, metadata, previous=None):
+        """Insert or overwrite a row; reduced is its search-space form, previous the metadata it is replacing"""
+        self.check(vector, reduced, metadata)
+        if self.keep_originals and self.originals is None:
+            self.originals = make_matrix("float32", len(vector))
+        row = self.rows.get(vector_id)
+        if row is None:
+            # Matrices first: ids and the row map only change once the vector is stored
+            if self.originals is not None:
+                self.originals.append(vector)
+            if self.matrix is None:
+                self._set_matrix(make_matrix(self.storage, len(reduced), **self.storage_options))
+            self.matrix.append(reduced)
+            self.rows[vector_id] = len(self.ids)
+            self.ids.append(vector_id)
+            if self.ann is not None:
+                self.ann.add(len(self.ids) - 1)
+        else:
+            # The graph index keeps the overwritten vector as a tombstone, so read it first
+            replaced = self.matrix.decode([row])[0].copy() if self.ann is not None else None
+            if self.originals is not None:
+                self.originals.assign(row, vector)
+            self.matrix.assign(row, reduced)
+            if self.ann is not None:
+                self.ann.update(row, replaced)
+        self.index.add(self.rows[vector_id], metadata, previous)
+
+    def remove(self, vector_id, metadata, last_metadata):
+        """
+        Drop a row, keeping the matrices contiguous by moving the last row into
+        the gap; metadata and last_metadata are those rows' metadata
+        """
+        row = self.rows[vector_id]
+        # The graph index keeps a removed vector as a tombstone, so read it before the row is overwritten
+        removed = self.matrix.decode([row])[0].copy() if self.ann is not None else None
+        for matrix in (self.matrix, self.originals):
+            if matrix is not None:
+                matrix.remove(row)
+        self.index.remove(row, metadata, last_metadata)
+        if self.ann is not None:
+            self.ann.remove(row, removed)
+        del self.rows[vector_id]
+        last_id = self.ids.pop()
+        if last_id != vector_id:
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+
+    def vector(self, vector_id):
+        source = self.originals if self.originals is not None else self.matrix
+        return source.decode([self.rows[vector_id]])[0]
+
+    def full_vectors(self, rows=None):
+        """Full-size vectors: the originals, or the search matrix itself before a projection is fitted"""
+        return (self.originals if self.originals is not None else self.matrix).decode(rows)
+
+    def rebuild(self, reduce):
+        """Re-project every row from its full vector (after a projection fit)"""
+        full = self.full_vectors()
+        matrix = make_matrix(self.storage, reduce(full[:1]).shape[1], max(1, len(full)), **self.storage_options)
+        if len(full):
+            matrix.append(reduce(full))
+        self._set_matrix(matrix)
+    
+    def _set_matrix(self, matrix):
+        """Install a search matrix, (re)building the ANN index over its rows"""
+        self.matrix = matrix
+        if self.make_index is not None:
+            self.ann = self.make_index(matrix)
+            self.ann.reading = self.reading
+            for row in range(len(matrix)):
+                self.ann.add(row)
+
+    @property
+    def needs_maintenance(self) -> bool:
+        # An index still in an unread snapshot section is checked once it is used
+        return self.loaded and self.ann is not None and self.ann.needs_maintenance
+    
+    def maintain(self):
+        """Deferred index work: rebuild a graph full of tombstones, install a finished retraining"""
+        if self.ann is not None:
+            self.ann.maintain()
+    
+    def _use_ann(self, matching, keep):
+        return self.ann is not None and not self.ann.exact_is_cheaper(matching, keep)
+
+    def search(self, query, search_query, keep, rescore_k, filter=None):
+        """Top rows by search-space score, optionally rescored exactly; returns (rows, scores)"""
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.matrix is None or len(self.ids) == 0:
+            return empty
+        mask = self.index.mask(filter) if filter else None
+        matching = len(self.ids) if mask is None else int(np.count_nonzero(mask))
+        if matching == 0:
+            return empty
+        if self._use_ann(matching, keep):
+            rows, scores = self.ann.search(search_query, keep, mask)
+        elif filter:
+            # Resolve the filter to rows first; score only those when they are few
+            selected = np.flatnonzero(mask)
+            if len(selected) < GATHER_FRACTION * len(self.ids):
+                scores = self.matrix.scores(search_query, selected)
+            else:
+                scores = self.matrix.scores(search_query)[selected]
+            winners = top_k_indices(scores, keep)
+            rows, scores = selected[winners], scores[winners]
+        else:
+            scores = self.matrix.scores(search_query)
+            rows = top_k_indices(scores, keep)
+            scores = scores[rows]
+        if rescore_k is not None:
+            rows, scores = self._rescore(query, rows, rescore_k)
+        return rows, scores
+    
+    def search_many(self, queries, search_queries, keep, rescore_k, filter=None):
+        """search() for a block of queries with one blocked matrix-matrix product; one (rows, scores) per query"""
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.matrix is None or len(self.ids) == 0:
+            return [empty] * len(queries)
+        mask = self.index.mask(filter) if filter else None
+        matching = len(self.ids) if mask is None else int(np.count_nonzero(mask))
+        if matching == 0:
+            return [empty] * len(queries)
+        if self._use_ann(matching, keep):
+            # Graph and list walks are per query
+            found = [self.ann.search(search_query, keep, mask) for search_query in search_queries]
+        else:
+            rows, scores = self.matrix.top_k_many(search_queries, keep, None if mask is None else np.flatnonzero(mask))
+            found = list(zip(rows, scores))
+        if rescore_k is not None:
+            found = [self._rescore(query, rows, rescore_k) for query, (rows, _) in zip(queries, found)]
+        return found
+    
+    def _rescore(self, query, rows, rescore_k):
+        """Exact scores against the originals for candidate rows; the best rescore_k of them"""
+        scores = self.originals.scores(query, rows)
+        order = top_k_indices(scores, rescore_k)
+        return rows[order], scores[order]
+
+
+class SimpleVectorStore(DeferredAttributes):
+    # Per-id state, unpickled from a snapshot when first used
+    deferred = ("_metadata", "_locations")
+
+    def __init__(self, storage: str = "float32", reduce_dimensions: int = None,
+                 projection: str = "random", keep_originals: bool = False, rescore_factor: int = 4,
+                 index: str = "flat", index_options: dict = None, storage_options: dict = None,
+                 projection_options: dict = None):
+        """
+        Vectors are L2-normalized into contiguous matrices (grown amortized)
+        with an id <-> row mapping, so a query is a single matrix-vector
+        product. Rows are partitioned by metadata 'type', and a query
+        filtered on type only ever touches that partition.
+
+        storage: "float32", or "float16"/"int8"/"pq" to keep the matrix compact
+        and score directly against the encoded rows. storage_options go to the
+        matrix (subspaces and train_rows for "pq").
+
+        reduce_dimensions: project vectors down to this size before storing.
+        projection is "random" (ready immediately) or "pca" (stored full-size
+        until min_fit_rows vectors are in, then fitted on them; refitted as
+        the corpus grows when keep_originals is on, see projection.py).
+        projection_options go to the projection. With keep_originals the
+        full float32 vectors are kept too, and when the search matrix is
+        reduced or compact the top top_k * rescore_factor results are
+        rescored exactly against them.
+        
+        index: "flat" (exact scan), "hnsw" (approximate graph search, built
+        incrementally on upsert) or "ivf" (k-means lists, retrained in the
+        background as the corpus drifts). index_options are passed to the
+        index: M, ef_construction, ef_search, rebuild_fraction, background for HNSW;
+        nlist, nprobe for IVF. Partitions small enough to scan stay exact.
+        """
+        if storage not in MATRIX_TYPES:
+            raise ValueError(f"Unknown vector storage mode: {storage}")
+        if index != "flat" and index not in ANN_INDEXES:
+            raise ValueError(f"Unknown vector index: {index}")
+        self.storage = storage
+        self.storage_options = dict(storage_options or {})
+        self.reduce_dimensions = reduce_dimensions or None
+        self.projection_kind = projection
+        self.projection_options = dict(projection_options or {})
+        self.keep_originals = keep_originals
+        self.rescore_factor = max(1, rescore_factor)
+        self.index = index
+        self.index_options = dict(index_options or {})
+        self._metadata = ColumnarMetadata()
+        self.metadata = _MetadataView(self)
+        self.vectors = _DecodedVectors(self)
+        self.persistence = None  # set by store_persistence.open_store / open_shared_store
+        # Queries share the read side; upserts and deferred maintenance take the write side
+        self._lock = RWLock()
+        self._projection = None
+        self._partitions = {}
+        self._locations = {}
+        log.debug("SimpleVectorStore initialized", index=index, storage=storage)
+    
+    def _store_vector(self, vector_id, vector, metadata):
+        vector = normalize(vector)
+        dimensions = self._input_dimensions()
+        if dimensions is not None and (vector.ndim != 1 or len(vector) != dimensions):
+            raise ValueError(f"Vector has shape {vector.shape}, store holds {dimensions} dimensions")
+        if self.reduce_dimensions and self._projection is None:
+            self._projection = make_projection(
+                self.projection_kind, len(vector), self.reduce_dimensions, **self.projection_options
+            )
+        
+        partition_key = metadata.get('type')
+        reduced = self._reduce(vector)
+        partition = self._partitions.get(partition_key)
+        if partition is None:
+            partition = _Partition(
+                self.storage, self.keep_originals, self._make_index if self.index != "flat" else None,
+                self.storage_options,
+            )
+            partition.attach(self._lock.read)
+        # Validate against the target partition before a type move takes the row out of the old one
+        partition.check(vector, reduced, metadata)
+        self._partitions[partition_key] = partition
+        previous = self._locations.get(vector_id)
+        # The metadata index is told what the rows it changes were indexed with
+        replaced = self._metadata.row(vector_id, text_limit=0) if previous is not None else None
+        if previous is not None and previous != partition_key:
+            source = self._partitions[previous]
+            source.remove(vector_id, replaced, self._metadata.row(source.ids[-1], text_limit=0))
+            replaced = None
+        partition.put(vector_id, vector, reduced, metadata, replaced)
+        self._locations[vector_id] = partition_key
+    
+    def _make_index(self, matrix):
+        return ANN_INDEXES[self.index](matrix, **self.index_options)
+    
+    def _reduce(self, vectors):
+        """Normalized search-space form of full vectors (the vectors themselves until a PCA projection is fitted)"""
+        if self._projection is None or not self._projection.fitted:
+            return vectors
+        return normalize(self._projection.transform(vectors))
+    
+    def fit_projection(self):
+        """Fit (or refit) the projection on the stored vectors now, without waiting for min_fit_rows"""
+        with self._lock.write():
+            self._fit_projection()
+    
+    @property
+    def _reduces(self) -> bool:
+        """Whether the search matrices hold projected rather than full vectors"""
+        return self._projection is not None and self._projection.fitted
+
+    def _projection_due(self) -> bool:
+        return self._projection is not None and self._projection.needs_fit(len(self._locations), self.keep_originals)
+    
+    def _fit_projection(self):
+        """Fit the projection on a sample of the full vectors and re-project every partition"""
+        if self._projection is None or self._projection.kind == "random":
+            return
+        if self._projection.fitted and not self.keep_originals:
+            log.warning("Projection not refitted: the full vectors are not kept")
+            return
+        partitions = [p for p in self._partitions.values() if len(p)]
+        total = sum(len(p) for p in partitions)
+        if not total:
+            return
+        # Decode only the sampled rows, not the whole corpus
+        rng = np.random.default_rng(self._projection.seed)
+        sample = np.sort(rng.choice(total, min(total, self._projection.max_fit_rows), replace=False))
+        starts = np.cumsum([0] + [len(p) for p in partitions])
+        self._projection.fit(np.concatenate([
+            partition.full_vectors(sample[(sample >= start) & (sample < start + len(partition))] - start)
+            for partition, start in zip(partitions, starts)
+        ]), rows=total)
+        for partition in partitions:
+            partition.rebuild(self._reduce)
+        log.info("Projection fitted", rows=total, dimensions=self._projection.output_dimensions)
+    
+    def _maintain(self):
+        """
+        Run deferred work (other processes' writes to a shared store, PCA fit,
+        index rebuilds, retrained IVF lists) under
+        the write lock, so searches under the read lock never mutate the store.
+        """
+        def pending():
+            return (
+                (self.persistence is not None and self.persistence.changed)
+                or self._projection_due()
+                or any(p.needs_maintenance for p in list(self._partitions.values()))
+            )
+        
+        if not pending():
+            return
+        with self._lock.write():
+            if self.persistence is not None:
+                self.persistence.sync(self)
+            if self._projection_due():
+                self._fit_projection()
+            for partition in self._partitions.values():
+                if partition.needs_maintenance:
+                    partition.maintain()
+    
+    def memory_stats(self):
+        """Vector memory use for the current storage mode"""
+        self._maintain()
+        with self._lock.read():
+            return self._memory_stats()
+    
+    def _memory_stats(self):
+        total = sum(
+            matrix.nbytes
+            for partition in self._partitions.values()
+            for matrix in (partition.matrix, partition.originals) if matrix is not None
+        )
+        search = sum(p.matrix.nbytes for p in self._partitions.values() if p.matrix is not None)
+        count = len(self.vectors)
+        return {
+            "storage": self.storage,
+            "index": self.index,
+            "dimensions": self.reduce_dimensions,
+            "keep_originals": self.keep_originals,
+            "vectors": count,
+            "partitions": {str(key): len(p) for key, p in self._partitions.items()},
+            "bytes_per_vector": total / count if count else 0,
+            "search_bytes_per_vector": search / count if count else 0,
+            "total_bytes": total,
+            "metadata_bytes": self._metadata.nbytes,
+        }
+    
+    def headroom_low(self) -> bool:
+        """Whether a matrix mapped from the snapshot is about to outgrow its padding"""
+        return any(
+            matrix is not None and matrix.headroom_low
+            for partition in list(self._partitions.values())
+            for matrix in (partition.matrix, partition.originals)
+        )
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['persistence'] = None
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._lock = RWLock()
+        self._attach_partitions()
+    
+    def _adopt(self, other):
+        """Take over another store's state (a freshly mapped snapshot), keeping this object's lock and views"""
+        keep = {"vectors": self.vectors, "metadata": self.metadata, "persistence": self.persistence, "_lock": self._lock}
+        for name in self.deferred + ("_deferred",):
+            self.__dict__.pop(name, None)
+        self.__dict__.update(other.__dict__)
+        self.__dict__.update(keep)
+        self._attach_partitions()
+
+    def _attach_partitions(self):
+        # Background index work reads the matrices under this store's read lock
+        for partition in self._partitions.values():
+            partition.attach(self._lock.read)
+    
+    def metadata_items(self, text_limit=None):
+        """
+        Consistent (id, metadata) list, safe to iterate while upserts run.
+        text_limit truncates text previews to that many characters (0 omits them).
+        """
+        self._maintain()
+        with self._lock.read():
+            return self._metadata.items(text_limit)
+    
+    def upsert(self, items) -> bool:
+        """
+        Store vectors with metadata (logged to the WAL first when the store is
+        persistent). Invalid items are logged and dropped; False if the write failed.
+        """
+        try:
+            with self._lock.write():
+                # Only valid items reach the WAL, so a bad one can't break every later replay
+                items = self._valid_items(items)
+                if self.persistence is not None and items:
+                    items = self.persistence.log(self, items)
+                self._apply(items)
+                total_vectors = len(self._locations)
+        except Exception:
+            log.exception("Error in upsert", items=len(items))
+            return False
+        log.debug("Upserted", items=len(items), total_vectors=total_vectors)
+        if self.persistence is not None:
+            try:
+                with self._lock.read():
+                    self.persistence.maybe_snapshot(self)
+            except Exception:
+                # The items are already in the WAL, so the upsert itself stands
+                log.exception("Error in snapshot after upsert", items=len(items))
+        return True
+    
+    def _valid_items(self, items):
+        """The (id, vector, metadata) items this store can take; the rest are logged and dropped"""
+        dimensions = self._input_dimensions()
+        valid = []
+        for item in items:
+            try:
+                vector_id, vector, metadata = item
+                vector = np.asarray(vector, dtype=np.float32)
+                if vector.ndim != 1 or not len(vector):
+                    raise ValueError(f"Expected a 1-d vector, got shape {vector.shape}")
+                if dimensions is not None and len(vector) != dimensions:
+                    raise ValueError(f"Vector has {len(vector)} dimensions, store holds {dimensions}")
+                if not isinstance(metadata, dict):
+                    raise ValueError(f"Metadata must be a dict, got {type(metadata).__name__}")
+            except (TypeError, ValueError) as e:
+                log.warning("Invalid item", item_id=item[0] if isinstance(item, (tuple, list)) and item else None,
+                            error=e)
+                continue
+            dimensions = len(vector)
+            valid.append((vector_id, vector, metadata))
+        return valid
+    
+    def _input_dimensions(self):
+        """Size of the full vectors this store takes (None while it is empty)"""
+        if self._projection is not None:
+            return self._projection.input_dimensions
+        for partition in self._partitions.values():
+            for matrix in (partition.originals, partition.matrix):
+                if matrix is not None:
+                    return matrix.dimensions
+        return None
+    
+    def replay(self, items):
+        """Apply logged (id, vector, metadata) items quietly; returns how many"""
+        with self._lock.write():
+            return self._apply(items)
+    
+    def _apply(self, items):
+        """Apply items one by one; one that fails is logged and skipped, leaving the store as it was"""
+        count = 0
+        for vector_id, vector, metadata in items:
+            try:
+                self._store_vector(vector_id, vector, metadata)
+            except (TypeError, ValueError) as e:
+                log.warning("Skipping vector that cannot be stored", item_id=vector_id, error=e)
+                continue
+            self._metadata[vector_id] = metadata
+            count += 1
+        return count
+    
+    def save(self):
+        """
+        Snapshot a persistent store now and reset its WAL; returns the snapshot
+        path (None for a shared store another process wrote to meanwhile)
+        """
+        if self.persistence is None:
+            raise RuntimeError("Store is not persistent; open it with store_persistence.open_store")
+        self._maintain()
+        with self._lock.read():
+            return self.persistence.snapshot(self)
+    
+    def query(self, vector, top_k=10, filter=None, include_metadata=True, reduced=False):
+        """
+        Cosine similarity search: one matrix-vector product over the stored rows.
+        reduced: the vector is already in the search space, as fetch() returns
+        it from a reduced store without originals (Vector.reduced).
+        """
         try:
-            for i, item in enumerate(items):
-                if len(item) >= 3:
-                    vector_id, vector, metadata = item
-                    self.vectors[vector_id] = vector
-                    self.metadata[vector_id] = metadata
-                    print(f"   ✅ Stored: {vector_id} - {metadata.get('name', 'No name')}")
-                    print(f"   📊 Vector length: {len(vector)}")
-                else:
-                    print(f"⚠️  Invalid item format: {item}")
-            print(f"📊 SIMPLE STORE: Total vectors stored: {len(self.vectors)}")
-            print(f"📊 SIMPLE STORE: Total metadata entries: {len(self.metadata)}")
-        except Exception as e:
-            print(f"❌ SIMPLE STORE Error in upsert: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    def query(self, vector, top_k=10, filter=None):
-        """Simple cosine similarity search"""
+            self._maintain()
+            with self._lock.read():
+                results = self._query_matrix(vector, top_k, filter, include_metadata, reduced)
+            log.debug("Query", top_k=top_k, filter=filter, matches=len(results))
+            return QueryResponse(results)
+        except FilterError:
+            raise
+        except Exception:
+            log.exception("Error in query", filter=filter)
+            return QueryResponse()
+    
+    def query_many(self, vectors, top_k=10, filter=None, include_metadata=True, reduced=False):
+        """
+        Top-k matches for each row of a query matrix, in order. Exact search
+        scores all queries against each block of stored rows at once instead
+        of one full scan per query. reduced as in query().
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
         try:
-            import numpy as np
-            from sklearn.metrics.pairwise import cosine_similarity
-            
-            print(f"🔍 SIMPLE STORE: Querying with filter: {filter}")
-            print(f"📊 SIMPLE STORE: Total vectors: {len(self.vectors)}")
-            
-            results = []
-            for vector_id, stored_vector in self.vectors.items():
-                # Apply filter
-                current_type = self.metadata[vector_id].get('type')
-                if filter and current_type != filter.get('type'):
-                    continue
-                
-                # Calculate cosine similarity
-                similarity = cosine_similarity([vector], [stored_vector])[0][0]
-                results.append({
-                    'id': vector_id,
-                    'score': similarity,
-                    'metadata': self.metadata[vector_id]
-                })
-            
-            # Sort by score and return top_k
-            results.sort(key=lambda x: x['score'], reverse=True)
-            print(f"✅ SIMPLE STORE: Found {len(results)} matches, returning top {top_k}")
-            return type('MockResults', (), {'matches': results[:top_k]})
-        except Exception as e:
-            print(f"❌ SIMPLE STORE Error in query: {e}")
-            import traceback
-            traceback.print_exc()
-            return type('MockResults', (), {'matches': []})
+            self._maintain()
+            with self._lock.read():
+                results = self._query_many_matrix(vectors, top_k, filter, include_metadata, reduced)
+            log.debug("Query batch", queries=len(vectors), top_k=top_k, filter=filter)
+            return [QueryResponse(matches) for matches in results]
+        except FilterError:
+            raise
+        except Exception:
+            log.exception("Error in query_many", queries=len(vectors), filter=filter)
+            return [QueryResponse() for _ in vectors]
+    
+    def _prepare_queries(self, queries, reduced=False):
+        """Normalized queries, their search-space form and whether exact rescoring applies"""
+        queries = normalize(queries)
+        # Before a projection is fitted the search space is the full one
+        reduced = reduced and self._reduces
+        if reduced:
+            expected = self._projection.output_dimensions
+        else:
+            expected = self._input_dimensions()
+        if expected is not None and queries.shape[-1] != expected:
+            space = "reduced" if reduced else "full"
+            raise ValueError(f"Query has {queries.shape[-1]} dimensions, {space} vectors have {expected}")
+        if reduced:
+            return queries, queries, False
+        lossy = self._projection is not None or self.storage != "float32"
+        return queries, self._reduce(queries), lossy and self.keep_originals
+    
+    def _query_matrix(self, vector, top_k, filter, include_metadata=True, reduced=False):
+        """Search the partitions the filter allows; rescore exactly if originals are kept"""
+        query, search_query, rescore = self._prepare_queries(vector, reduced)
+        keep = top_k * self.rescore_factor if rescore else top_k
+        partitions, row_filter = self._route(filter)
+        
+        found = []
+        for partition in partitions:
+            rows, scores = partition.search(query, search_query, keep, top_k if rescore else None, row_filter)
+            found.extend((float(score), partition.ids[row]) for row, score in zip(rows, scores))
+        return self._matches(found, top_k, len(partitions) > 1, include_metadata)
+    
+    def _query_many_matrix(self, vectors, top_k, filter, include_metadata=True, reduced=False):
+        queries, search_queries, rescore = self._prepare_queries(vectors, reduced)
+        keep = top_k * self.rescore_factor if rescore else top_k
+        partitions, row_filter = self._route(filter)
+        
+        found = [[] for _ in queries]
+        for partition in partitions:
+            per_query = partition.search_many(queries, search_queries, keep, top_k if rescore else None, row_filter)
+            for hits, (rows, scores) in zip(found, per_query):
+                hits.extend((float(score), partition.ids[row]) for row, score in zip(rows, scores))
+        return [self._matches(hits, top_k, len(partitions) > 1, include_metadata) for hits in found]
+    
+    def _matches(self, found, top_k, merge, include_metadata=True):
+        """
+        Matches from (score, id) hits; hits from several partitions are merged
+        first. Metadata is looked up when a match's .metadata is first read.
+        """
+        if merge:
+            found.sort(key=lambda hit: -hit[0])
+            found = found[:top_k]
+        source = self._metadata.pin(vector_id for _, vector_id in found) if include_metadata else None
+        return [Match(vector_id, score, source=source) for score, vector_id in found]
+    
+    def _route(self, filter):
+        """Partitions a filter can match, plus the part of the filter left to evaluate on rows"""
+        if not filter:
+            return list(self._partitions.values()), None
+        validate_filter(filter)
+        if 'type' not in filter:
+            return list(self._partitions.values()), filter
+        
+        condition = filter['type']
+        if isinstance(condition, dict) and list(condition) == ['$in']:
+            keys = condition['$in']
+        elif isinstance(condition, dict) and list(condition) == ['$eq']:
+            keys = [condition['$eq']]
+        elif isinstance(condition, dict):
+            # Anything fancier on type is evaluated per row like any other field
+            return list(self._partitions.values()), filter
+        else:
+            keys = [condition]
+        rest = {field: value for field, value in filter.items() if field != 'type'}
+        partitions = [self._partitions[key] for key in keys if key in self._partitions]
+        return partitions, rest or None
     
     def fetch(self, ids):
         """Fetch vectors by IDs"""
         try:
             vectors = {}
-            for vector_id in ids:
-                if vector_id in self.vectors:
-                    vectors[vector_id] = type('MockVector', (), {
-                        'values': self.vectors[vector_id],
-                        'metadata': self.metadata[vector_id]
-                    })
-            return type('MockFetchResponse', (), {'vectors': vectors})
-        except Exception as e:
-            print(f"❌ SIMPLE STORE Error in fetch: {e}")
-            return type('MockFetchResponse', (), {'vectors': {}})
+            self._maintain()
+            with self._lock.read():
+                for vector_id in ids:
+                    if vector_id in self._locations:
+                        partition = self._partitions[self._locations[vector_id]]
+                        vectors[vector_id] = Vector(
+                            vector_id,
+                            partition.vector(vector_id),
+                            self._metadata[vector_id],
+                            reduced=partition.originals is None and self._reduces,
+                        )
+            return FetchResponse(vectors)
+        except Exception:
+            log.exception("Error in fetch")
+            return FetchResponse()
+
+def _storage_options(config):
+    """Matrix tunables from the config for the configured storage mode"""
+    if config.VECTOR_STORAGE == "pq":
+        return {"subspaces": config.PQ_SUBSPACES, "train_rows": config.PQ_TRAIN_ROWS}
+    return {}
+
+def _projection_options(config):
+    """Projection tunables from the config for the configured projection"""
+    if config.VECTOR_PROJECTION == "pca":
+        return {"min_fit_rows": config.VECTOR_PCA_MIN_FIT_ROWS, "refit_growth": config.VECTOR_PCA_REFIT_GROWTH}
+    return {}
+
+def _index_options(config):
+    """Index tunables from the config for the configured index kind"""
+    if config.VECTOR_INDEX == "hnsw":
+        return {
+            "M": config.HNSW_M,
+            "ef_construction": config.HNSW_EF_CONSTRUCTION,
+            "ef_search": config.HNSW_EF_SEARCH,
+        }
+    if config.VECTOR_INDEX == "ivf":
+        return {"nlist": config.IVF_NLIST, "nprobe": config.IVF_NPROBE}
+    return {}
 
 # Create a global instance
 _simple_store_instance = None
+_simple_store_lock = threading.Lock()
 
 def get_simple_store():
     """Get or create the simple store instance"""
     global _simple_store_instance
     if _simple_store_instance is None:
-        _simple_store_instance = SimpleVectorStore()
-    return _simple_store_instance
\ No newline at end of file
+        # Opening a persistent store takes the directory lock, so only one thread may do it
+        with _simple_store_lock:
+            if _simple_store_instance is None:
+                _simple_store_instance = _create_simple_store()
+    return _simple_store_instance
+
+
+def _create_simple_store():
+    from backend.config import Config
+    options = dict(
+        storage=Config.VECTOR_STORAGE,
+        storage_options=_storage_options(Config),
+        reduce_dimensions=Config.VECTOR_REDUCED_DIMENSIONS,
+        projection=Config.VECTOR_PROJECTION,
+        projection_options=_projection_options(Config),
+        keep_originals=Config.VECTOR_KEEP_ORIGINALS,
+        index=Config.VECTOR_INDEX,
+        index_options=_index_options(Config),
+    )
+    if Config.VECTOR_SHARDS > 1:
+        from backend.utils.sharded_store import ShardedVectorStore
+        return ShardedVectorStore(
+            Config.VECTOR_SHARDS,
+            path=Config.VECTOR_STORE_PATH,
+            persistence_options=dict(
+                fsync=Config.VECTOR_WAL_FSYNC, snapshot_wal_bytes=Config.VECTOR_SNAPSHOT_WAL_BYTES
+            ),
+            **options,
+        )
+    if Config.VECTOR_STORE_PATH and Config.VECTOR_STORE_SHARED:
+        from backend.utils.store_persistence import open_shared_store
+        return open_shared_store(
+            Config.VECTOR_STORE_PATH,
+            fsync=Config.VECTOR_WAL_FSYNC,
+            snapshot_wal_bytes=Config.VECTOR_SNAPSHOT_WAL_BYTES,
+            **options,
+        )
+    if Config.VECTOR_STORE_PATH:
+        from backend.utils.store_persistence import open_store
+        return open_store(
+            Config.VECTOR_STORE_PATH,
+            fsync=Config.VECTOR_WAL_FSYNC,
+            snapshot_wal_bytes=Config.VECTOR_SNAPSHOT_WAL_BYTES,
+            **options,
+        )
+    return SimpleVectorStore(**options)
\ No newline at end of file
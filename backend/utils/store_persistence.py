@@ -0,0 +1,609 @@
+# ===== FILE: ./backend/utils/store_persistence.py =====
+
+"""
+Durable snapshots and a write-ahead log for SimpleVectorStore.
+
+Layout of a store directory:
+
+    CURRENT                 name of the live snapshot
+    snapshot-000002/
+        store.pkl           store state (partitions, projection, settings)
+        sections/000001.pkl Deferred state: per-partition ids, metadata and ANN indexes, ...
+        arrays/000000.npy   every large array (vector matrices, originals, ...)
+    wal.log                 upserts since that snapshot
+
+Snapshot arrays are opened with np.load(mmap_mode="c"): cold start maps the
+vector files instead of reading them, and later writes stay private to the
+process. Row-sized Python state (ids, metadata columns, posting lists, HNSW
+links) is written as Deferred sections that are only unpickled when first
+used, so opening a snapshot costs the same at any corpus size. Upserts are
+appended to the WAL (length + crc32 framed records) before they are
+applied; a torn record at the tail is dropped on replay.
+
+A directory belongs to one open_store at a time: it holds an exclusive
+flock on owner.lock, and a second process (e.g. another gunicorn worker)
+gets an error instead of appending to the same WAL and losing writes when
+either one snapshots. Several processes share a directory (gunicorn workers)
+with open_shared_store, which takes the same lock shared. The snapshot files are mapped copy-on-write by every
+worker, so their pages are shared through the page cache. Appends are
+serialized by a flock on shared.lock. A small mapped `generation` file
+holds (generation, snapshot number, committed WAL bytes). A worker compares
+the generation before a query and, if another process has written, applies
+the new WAL records or maps the newer snapshot. Snapshot matrices are padded
+with spare rows; a worker snapshots before those run out, since a matrix
+that grows past them is copied into each worker's private memory.
+"""
+
+import os
+import io
+import json
+import shutil
+import pickle
+import struct
+import zlib
+import threading
+import itertools
+import mmap
+from contextlib import contextmanager
+
+import numpy as np
+
+from backend.utils.log import get_logger
+from backend.utils.vector_codecs import SCORE_BLOCK_ROWS, PaddedRows
+
+log = get_logger("persistence")
+
+# Arrays at least this big are written to their own .npy file and memory-mapped on load
+MMAP_MIN_BYTES = 64 * 1024
+
+_FRAME = struct.Struct("<II")        # payload length, crc32(payload)
+_RECORD = struct.Struct("<HII")      # id length, metadata length, dimensions
+_HEADER = struct.Struct("<QQQ")      # generation, snapshot number, committed WAL bytes
+
+
+class Deferred:
+    """
+    A value unpickled on first use. Pickles as the value itself; snapshots
+    write it to a section file of its own, and load_snapshot gives back a
+    Deferred that reads that file on get().
+    """
+
+    def __init__(self, value=None, load=None):
+        self._value = value
+        self._load = load
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._load is not None:
+            with self._lock:
+                if self._load is not None:
+                    self._value, self._load = self._load(), None
+        return self._value
+
+    def __reduce__(self):
+        return _identity, (self.get(),)
+
+
+def _identity(value):
+    return value
+
+
+class DeferredAttributes:
+    """
+    Mixin for snapshot state: the attributes named in `deferred` are pickled
+    together as one Deferred. After load_snapshot they are unpickled when one
+    of them is first read, and _attributes_loaded() runs.
+    """
+
+    deferred = ()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_deferred"] = Deferred({name: getattr(self, name) for name in self.deferred})
+        for name in self.deferred:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        values = state.get("_deferred")
+        if values is not None and not isinstance(values, Deferred):
+            # A plain pickle holds the values themselves
+            self._install(values)
+
+    def __getattr__(self, name):
+        deferred = self.__dict__.get("_deferred")
+        if deferred is None or name not in self.deferred:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        self._install(deferred.get())
+        return self.__dict__[name]
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the deferred attributes are in memory"""
+        return "_deferred" not in self.__dict__
+
+    def _install(self, values):
+        self.__dict__.update(values)
+        self._attributes_loaded()
+        self.__dict__.pop("_deferred", None)
+
+    def _attributes_loaded(self):
+        """Hook run once the deferred attributes are in place"""
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, directory, names):
+        """names: file number counter shared with the picklers of the snapshot's other sections"""
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.names = names
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Deferred):
+            name = f"{next(self.names):06d}.pkl"
+            with open(os.path.join(self.directory, "sections", name), "wb") as f:
+                _SnapshotPickler(f, self.directory, self.names).dump(obj.get())
+                f.flush()
+                os.fsync(f.fileno())
+            return ("section", name)
+        padding = None
+        if isinstance(obj, PaddedRows):
+            obj, padding = np.asarray(obj.array), obj.rows
+        if type(obj) not in (np.ndarray, np.memmap) or obj.dtype.hasobject:
+            return None
+        if obj.nbytes < MMAP_MIN_BYTES and padding is None:
+            return None
+        name = f"{next(self.names):06d}.npy"
+        path = os.path.join(self.directory, "arrays", name)
+        if padding is None:
+            np.save(path, np.ascontiguousarray(obj))
+        else:
+            # Written straight into the file, so the padding never exists in memory
+            target = np.lib.format.open_memmap(path, mode="w+", dtype=obj.dtype, shape=(padding,) + obj.shape[1:])
+            for start in range(0, len(obj), SCORE_BLOCK_ROWS):
+                stop = min(start + SCORE_BLOCK_ROWS, len(obj))
+                target[start:stop] = obj[start:stop]
+            target.flush()
+            del target
+        return ("npy", name)
+
+
+class _SnapshotFiles:
+    """
+    A snapshot's arrays (mapped) and section files (open), all taken when it
+    is loaded: a newer snapshot may delete the directory before a Deferred
+    section is read, and open files outlive that.
+    """
+
+    def __init__(self, path):
+        arrays_dir, sections_dir = os.path.join(path, "arrays"), os.path.join(path, "sections")
+        self.arrays = {name: np.load(os.path.join(arrays_dir, name), mmap_mode="c") for name in os.listdir(arrays_dir)}
+        self.sections = {
+            name: open(os.path.join(sections_dir, name), "rb")
+            for name in (os.listdir(sections_dir) if os.path.isdir(sections_dir) else ())
+        }
+
+    def load(self, file):
+        return _SnapshotUnpickler(file, self).load()
+
+    def load_section(self, name):
+        with self.sections.pop(name) as f:
+            return self.load(f)
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, files):
+        super().__init__(file)
+        self.files = files
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind == "npy":
+            # Each array is referenced once; dropping it here lets a replaced array be unmapped
+            return self.files.arrays.pop(name)
+        if kind == "section":
+            files = self.files
+            return Deferred(load=lambda: files.load_section(name))
+        raise pickle.UnpicklingError(f"Unknown persistent id: {pid}")
+
+
+def save_snapshot(store, directory: str) -> str:
+    """Write a new snapshot of the store and make it current; returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    current = _current_snapshot(directory)
+    generation = _snapshot_number(current) + 1
+    name = f"snapshot-{generation:06d}"
+    staging = os.path.join(directory, f".{name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(os.path.join(staging, "arrays"))
+    os.makedirs(os.path.join(staging, "sections"))
+
+    with open(os.path.join(staging, "store.pkl"), "wb") as f:
+        _SnapshotPickler(f, staging, itertools.count()).dump(store)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging, os.path.join(directory, name))
+    _write_atomic(os.path.join(directory, "CURRENT"), name.encode())
+
+    # Older snapshots are no longer referenced (mapped files stay valid until unmapped)
+    for entry in os.listdir(directory):
+        if entry.startswith("snapshot-") and entry != name:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return os.path.join(directory, name)
+
+
+def load_snapshot(directory: str):
+    """Map the current snapshot's store (its Deferred sections unread), or None if there is none"""
+    current = _current_snapshot(directory)
+    if current is None:
+        return None
+    path = os.path.join(directory, current)
+    files = _SnapshotFiles(path)
+    with open(os.path.join(path, "store.pkl"), "rb") as f:
+        return files.load(f)
+
+
+def _snapshot_number(name):
+    return int(name.rsplit("-", 1)[1]) if name else 0
+
+
+def _current_snapshot(directory):
+    try:
+        with open(os.path.join(directory, "CURRENT"), "rb") as f:
+            name = f.read().decode().strip()
+    except FileNotFoundError:
+        return None
+    return name if os.path.isdir(os.path.join(directory, name)) else None
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _decode_records(data):
+    """Yield ((id, vector, metadata), end offset) for the intact records at the start of data"""
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, offset)
+        payload = data[offset + _FRAME.size:offset + _FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return
+        key_length, meta_length, dimensions = _RECORD.unpack_from(payload)
+        start = _RECORD.size
+        vector_id = payload[start:start + key_length].decode()
+        start += key_length
+        metadata = json.loads(payload[start:start + meta_length])
+        start += meta_length
+        vector = np.frombuffer(payload, dtype="<f4", count=dimensions, offset=start).astype(np.float32)
+        offset += _FRAME.size + length
+        yield (vector_id, vector, metadata), offset
+
+
+class WriteAheadLog:
+    """Append-only binary log of upserted (id, vector, metadata) items"""
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "ab")
+
+    @property
+    def size(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def append(self, items):
+        """Log a batch of items; durable on return when fsync is on"""
+        buffer = io.BytesIO()
+        for vector_id, vector, metadata in items:
+            key = str(vector_id).encode()
+            meta = json.dumps(metadata, default=str).encode()
+            values = np.asarray(vector, dtype="<f4")
+            payload = _RECORD.pack(len(key), len(meta), len(values)) + key + meta + values.tobytes()
+            buffer.write(_FRAME.pack(len(payload), zlib.crc32(payload)))
+            buffer.write(payload)
+        self._file.write(buffer.getvalue())
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def replay(self):
+        """Yield logged (id, vector, metadata) items; a torn tail is cut off"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        offset = 0
+        for item, offset in _decode_records(data):
+            yield item
+        if offset < len(data):
+            log.warning("Dropping incomplete WAL records", bytes=len(data) - offset, path=self.path)
+            self.truncate(offset)
+
+    def read(self, start: int, stop: int):
+        """Logged items in the byte range [start, stop), which must hold whole records"""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(stop - start)
+        return [item for item, _ in _decode_records(data)]
+
+    def intact_size(self, start: int = 0) -> int:
+        """End of the last intact record, scanning from the record boundary `start`"""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        end = 0
+        for _, end in _decode_records(data):
+            pass
+        return start + end
+
+    def truncate(self, size: int = 0):
+        """Cut the log to `size` bytes (by default empty it, after a snapshot has captured its records)"""
+        self._file.truncate(size)
+        self._file.seek(size)
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _hold_directory(directory, exclusive):
+    """Flock owner.lock until the returned file is closed: exclusive for open_store, shared for open_shared_store"""
+    import fcntl
+
+    owner = open(os.path.join(directory, "owner.lock"), "a+b")
+    try:
+        fcntl.flock(owner, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        owner.close()
+        raise RuntimeError(
+            f"Vector store at {directory} is already open elsewhere; several processes must all "
+            "use open_shared_store (VECTOR_STORE_SHARED=true)"
+        ) from None
+    return owner
+
+
+class StorePersistence:
+    """Snapshot + WAL bookkeeping attached to a store as store.persistence"""
+
+    # Whether other processes may hold the directory at the same time
+    shared = False
+
+    def __init__(self, directory: str, fsync: bool = True, snapshot_wal_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.snapshot_wal_bytes = snapshot_wal_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._owner = _hold_directory(directory, exclusive=not self.shared)
+        self.wal = WriteAheadLog(os.path.join(directory, "wal.log"), fsync=fsync)
+        # Snapshots run under the store's read lock, so several may be requested at once
+        self._snapshot_lock = threading.Lock()
+
+    @property
+    def changed(self) -> bool:
+        """Whether another process has written since this store last synced"""
+        return False
+
+    def sync(self, store) -> int:
+        """Apply other processes' writes; the caller holds the store's write lock"""
+        return 0
+
+    def log(self, store, items):
+        """Log valid items before the caller (holding the store's write lock) applies them; returns them"""
+        self.wal.append(items)
+        return items
+
+    def maybe_snapshot(self, store):
+        """Snapshot once the WAL has grown past snapshot_wal_bytes"""
+        if not self.snapshot_wal_bytes or self.wal.size < self.snapshot_wal_bytes:
+            return
+        with self._snapshot_lock:
+            if self.wal.size >= self.snapshot_wal_bytes:
+                self._snapshot(store)
+
+    def snapshot(self, store) -> str:
+        """Write a snapshot and empty the WAL; the caller holds the store's read lock"""
+        with self._snapshot_lock:
+            return self._snapshot(store)
+
+    def _snapshot(self, store):
+        path = save_snapshot(store, self.directory)
+        self.wal.truncate()
+        return path
+
+    def close(self):
+        self.wal.close()
+        self._owner.close()  # releases the flock
+
+
+def open_store(directory: str, fsync: bool = True, snapshot_wal_bytes: int = 256 * 1024 * 1024, **store_options):
+    """
+    Open a persistent store: map the current snapshot (or create an empty
+    store with store_options), replay the WAL and log further upserts.
+    RuntimeError if another store has the directory open.
+    """
+    from backend.utils.simple_store import SimpleVectorStore
+
+    persistence = StorePersistence(directory, fsync=fsync, snapshot_wal_bytes=snapshot_wal_bytes)
+    store = load_snapshot(directory)
+    if store is None:
+        store = SimpleVectorStore(**store_options)
+    replayed = store.replay(persistence.wal.replay())
+    store.persistence = persistence
+    log.info("Vector store opened", directory=directory, vectors=len(store.vectors), replayed=replayed)
+    return store
+
+
+class _SharedHeader:
+    """The mapped `generation` file: (generation, snapshot number, committed WAL bytes)"""
+
+    def __init__(self, path):
+        with open(path, "a+b") as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                f.truncate(_HEADER.size)
+            self._map = mmap.mmap(f.fileno(), _HEADER.size)
+
+    @property
+    def generation(self) -> int:
+        return struct.unpack_from("<Q", self._map)[0]
+
+    def read(self):
+        return _HEADER.unpack_from(self._map)
+
+    def write(self, generation, snapshot, committed):
+        # Readers that skip the lock only look at the generation, so it goes last
+        self._map[8:_HEADER.size] = _HEADER.pack(0, snapshot, committed)[8:]
+        self._map[:8] = struct.pack("<Q", generation)
+
+    def close(self):
+        self._map.close()
+
+
+class SharedStorePersistence(StorePersistence):
+    """
+    Persistence for a directory opened by several processes. Any process may
+    upsert: it takes the exclusive flock, applies the records other
+    processes have committed, appends its own and bumps the generation.
+    Readers catch up under the shared flock when the generation moves.
+    """
+
+    shared = True
+
+    def __init__(self, directory: str, fsync: bool = True, snapshot_wal_bytes: int = 256 * 1024 * 1024):
+        super().__init__(directory, fsync=fsync, snapshot_wal_bytes=snapshot_wal_bytes)
+        self._lock_file = open(os.path.join(directory, "shared.lock"), "a+b")
+        self._header = _SharedHeader(os.path.join(directory, "generation"))
+        # What this process has applied: header generation, snapshot number, WAL bytes
+        self.generation = -1
+        self.snapshot_number = 0
+        self.offset = 0
+        with self._flock(exclusive=True):
+            self._recover()
+
+    @contextmanager
+    def _flock(self, exclusive):
+        import fcntl
+
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _recover(self):
+        """
+        Commit records a crashed writer appended but never published, and cut
+        off its torn tail. Called with the exclusive flock held.
+        """
+        generation, snapshot, committed = self._header.read()
+        if generation == 0:
+            # New header: start from whatever the directory already holds
+            snapshot, committed = _snapshot_number(_current_snapshot(self.directory)), 0
+        if self.wal.size != committed:
+            intact = self.wal.intact_size(committed) if self.wal.size > committed else self.wal.size
+            if intact < self.wal.size:
+                log.warning("Dropping incomplete WAL records", bytes=self.wal.size - intact, path=self.wal.path)
+                self.wal.truncate(intact)
+            committed = intact
+        if (generation, snapshot, committed) != self._header.read():
+            self._header.write(generation + 1, snapshot, committed)
+
+    @property
+    def changed(self) -> bool:
+        return self._header.generation != self.generation
+
+    def sync(self, store) -> int:
+        if not self.changed:
+            return 0
+        with self._flock(exclusive=False):
+            return self._catch_up(store)
+
+    def _catch_up(self, store):
+        """Map a newer snapshot and/or apply newly committed records; returns how many"""
+        generation, snapshot, committed = self._header.read()
+        if snapshot != self.snapshot_number:
+            fresh = load_snapshot(self.directory)
+            if fresh is not None:
+                store._adopt(fresh)
+            self.snapshot_number, self.offset = snapshot, 0
+        applied = 0
+        if committed > self.offset:
+            records = self.wal.read(self.offset, committed)
+            # Records that fail are skipped (and logged) by _apply; move past them either way so
+            # one bad record is not retried on every sync
+            try:
+                applied = store._apply(records)
+            except Exception:
+                log.exception("Failed to apply shared WAL records", records=len(records), offset=self.offset)
+            self.offset = committed
+        self.generation = generation
+        return applied
+
+    def log(self, store, items):
+        with self._flock(exclusive=True):
+            self._recover()
+            # Other processes' records come first, so every process applies the same order
+            self._catch_up(store)
+            # Check again now the store holds their records too (e.g. the first vectors set the dimension)
+            items = store._valid_items(items)
+            if not items:
+                return items
+            self.wal.append(items)
+            self.offset = self.wal.size
+            self.generation += 1
+            self._header.write(self.generation, self.snapshot_number, self.offset)
+            return items
+
+    def maybe_snapshot(self, store):
+        """
+        Also snapshot before a mapped matrix outgrows its snapshot padding:
+        past it every worker would copy that matrix into private memory.
+        """
+        if store.headroom_low():
+            with self._snapshot_lock:
+                if store.headroom_low():
+                    self._snapshot(store)
+            return
+        super().maybe_snapshot(store)
+
+    def _snapshot(self, store):
+        """
+        Snapshot this process's state if it is still the latest (else skip and
+        return None; a later upsert retries). Every process, this one
+        included, maps the new snapshot on its next sync, so rows that were
+        only in private memory move into the shared mapping.
+        """
+        with self._flock(exclusive=True):
+            generation, _, committed = self._header.read()
+            if generation != self.generation or committed != self.offset:
+                return None
+            path = save_snapshot(store, self.directory)
+            self.wal.truncate()
+            self._header.write(generation + 1, _snapshot_number(os.path.basename(path)), 0)
+            return path
+
+    def close(self):
+        super().close()
+        self._header.close()
+        self._lock_file.close()
+
+
+def open_shared_store(directory: str, fsync: bool = True, snapshot_wal_bytes: int = 256 * 1024 * 1024,
+                      **store_options):
+    """
+    Open a store that several processes share through `directory` (one per
+    worker, opened after the fork). store_options only apply when the
+    directory holds no snapshot yet.
+    """
+    from backend.utils.simple_store import SimpleVectorStore
+
+    store = SimpleVectorStore(**store_options)
+    persistence = SharedStorePersistence(directory, fsync=fsync, snapshot_wal_bytes=snapshot_wal_bytes)
+    store.persistence = persistence
+    store._maintain()
+    log.info("Shared vector store opened", directory=directory, vectors=len(store.vectors),
+             generation=persistence.generation)
+    return store
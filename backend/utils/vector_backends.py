@@ -0,0 +1,299 @@
+# ===== FILE: ./backend/utils/vector_backends.py =====
+
+"""
+Pluggable vector backends, chosen once at startup.
+
+Every store, fetch and query path goes through one VectorBackend, so writes
+and reads always hit the same place:
+
+    local     the in-process store (get_simple_store: simple, persistent,
+              shared or sharded, per the VECTOR_STORE_* settings)
+    pinecone  a Pinecone index through the official SDK
+    http      any server speaking Pinecone's data-plane REST API, e.g. an
+              index host or the local stand-in in vector_server.py
+
+Remote backends upsert in batches of max_batch_size vectors per request and
+retry retryable failures with exponential backoff. All backends return the
+result types from vector_results.
+"""
+
+import time
+import random
+import threading
+
+import numpy as np
+import requests
+
+from backend.config import Config
+from backend.utils.log import get_logger
+from backend.utils.vector_results import FetchResponse, Match, QueryResponse, Vector
+
+log = get_logger("vectors")
+
+# Largest top_k a Pinecone query accepts
+MAX_TOP_K = 10000
+
+
+class VectorBackendError(Exception):
+    """Raised when a backend request fails"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class VectorBackend:
+    """Base class: subclasses implement upsert_batch, query and fetch"""
+    name = "base"
+
+    def __init__(self, max_batch_size: int = 100, max_retries: int = 3, backoff: float = 0.5):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def upsert(self, items: list) -> int:
+        """Store (id, vector, metadata) items, max_batch_size per request; returns how many"""
+        size = self.max_batch_size
+        for start in range(0, len(items), size):
+            self._with_retries(self.upsert_batch, items[start:start + size])
+        return len(items)
+
+    def upsert_batch(self, items: list):
+        raise NotImplementedError
+
+    def query(self, vector, top_k: int = 10, filter: dict = None, include_metadata: bool = True,
+              reduced: bool = False) -> QueryResponse:
+        """reduced: the vector came from a local store's reduced search space (Vector.reduced)"""
+        raise NotImplementedError
+
+    def query_many(self, vectors, top_k: int = 10, filter: dict = None, include_metadata: bool = True,
+                   reduced: bool = False) -> list:
+        """One QueryResponse per query vector, in order"""
+        return [self.query(vector, top_k, filter, include_metadata, reduced) for vector in vectors]
+
+    def fetch(self, ids: list) -> FetchResponse:
+        raise NotImplementedError
+
+    def _with_retries(self, request, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return request(*args, **kwargs)
+            except VectorBackendError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                log.warning("Retrying vector request", error=e, attempt=attempt + 1)
+            delay = self.backoff * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+
+
+class LocalVectorBackend(VectorBackend):
+    """The in-process store; one upsert call takes any number of items"""
+    name = "local"
+
+    def __init__(self, store=None):
+        super().__init__()
+        self._store = store
+
+    @property
+    def store(self):
+        """The given store, else the process-wide one (looked up per call)"""
+        if self._store is not None:
+            return self._store
+        from backend.utils.simple_store import get_simple_store
+        return get_simple_store()
+
+    def upsert(self, items: list) -> int:
+        self.upsert_batch(items)
+        return len(items)
+
+    def upsert_batch(self, items: list):
+        # The store logs its own errors and reports them as False; retrying would not help
+        if not self.store.upsert(items):
+            raise VectorBackendError(f"Local store upsert of {len(items)} items failed")
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True, reduced=False):
+        return self.store.query(vector, top_k=top_k, filter=filter, include_metadata=include_metadata,
+                                reduced=reduced)
+
+    def query_many(self, vectors, top_k=10, filter=None, include_metadata=True, reduced=False):
+        # Exact search scores the whole batch in one pass over the stored rows
+        return self.store.query_many(vectors, top_k=top_k, filter=filter, include_metadata=include_metadata,
+                                     reduced=reduced)
+
+    def fetch(self, ids):
+        return self.store.fetch(ids)
+
+
+def _values(vector) -> list:
+    return vector.tolist() if isinstance(vector, np.ndarray) else list(vector)
+
+
+def _full_vectors_only(reduced):
+    if reduced:
+        raise ValueError("Remote indexes store full vectors; a reduced query vector cannot be searched")
+
+
+class PineconeVectorBackend(VectorBackend):
+    """A Pinecone index through the official SDK"""
+    name = "pinecone"
+
+    def __init__(self, index, namespace: str = "", **options):
+        super().__init__(**options)
+        self.index = index
+        self.namespace = namespace
+
+    def upsert_batch(self, items):
+        self._request(
+            "upsert", self.index.upsert,
+            vectors=[(vector_id, _values(vector), metadata) for vector_id, vector, metadata in items],
+            namespace=self.namespace,
+        )
+
+    @staticmethod
+    def _request(operation, call, **kwargs):
+        """Call the SDK, turning its errors into VectorBackendError (retryable unless a client error)"""
+        try:
+            return call(**kwargs)
+        except Exception as e:
+            status = getattr(e, "status", None)
+            raise VectorBackendError(f"Pinecone {operation} failed: {e}",
+                                     retryable=status is None or status == 429 or status >= 500) from e
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True, reduced=False):
+        _full_vectors_only(reduced)
+        response = self._with_retries(self._request, "query", self.index.query, vector=_values(vector),
+                                      top_k=top_k, filter=filter, include_metadata=include_metadata,
+                                      namespace=self.namespace)
+        return QueryResponse(
+            [Match(match.id, match.score, getattr(match, "metadata", None)) for match in response.matches],
+            self.namespace,
+        )
+
+    def fetch(self, ids):
+        response = self._with_retries(self._request, "fetch", self.index.fetch, ids=list(ids),
+                                      namespace=self.namespace)
+        return FetchResponse({
+            vector_id: Vector(vector_id, vector.values, getattr(vector, "metadata", None))
+            for vector_id, vector in response.vectors.items()
+        }, self.namespace)
+
+
+class PineconeHTTPBackend(VectorBackend):
+    """Client for Pinecone's data-plane REST API (an index host, or the local stand-in)"""
+    name = "http"
+
+    def __init__(self, host: str, api_key: str = None, namespace: str = "", timeout: float = 30.0, **options):
+        super().__init__(**options)
+        self.host = host.rstrip("/")
+        self.namespace = namespace
+        self.timeout = timeout
+        # One session keeps connections alive between requests
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self._session.headers["Api-Key"] = api_key
+
+    def _request(self, method, path, **kwargs) -> dict:
+        try:
+            response = self._session.request(method, f"{self.host}{path}", timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise VectorBackendError(f"Vector request failed: {e}", retryable=True) from e
+        if response.status_code != 200:
+            raise VectorBackendError(
+                f"Vector API returned {response.status_code}: {response.text[:200]}",
+                retryable=response.status_code == 429 or response.status_code >= 500,
+            )
+        return response.json()
+
+    def upsert_batch(self, items):
+        self._request("POST", "/vectors/upsert", json={
+            "vectors": [
+                {"id": vector_id, "values": _values(vector), "metadata": metadata}
+                for vector_id, vector, metadata in items
+            ],
+            "namespace": self.namespace,
+        })
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True, reduced=False):
+        _full_vectors_only(reduced)
+        body = {"vector": _values(vector), "topK": top_k, "includeMetadata": include_metadata,
+                "namespace": self.namespace}
+        if filter:
+            body["filter"] = filter
+        data = self._with_retries(self._request, "POST", "/query", json=body)
+        return QueryResponse(
+            [Match(match["id"], match["score"], match.get("metadata")) for match in data.get("matches", [])],
+            data.get("namespace", self.namespace),
+        )
+
+    def fetch(self, ids):
+        data = self._with_retries(self._request, "GET", "/vectors/fetch",
+                                  params={"ids": list(ids), "namespace": self.namespace})
+        return FetchResponse({
+            vector_id: Vector(vector_id, vector["values"], vector.get("metadata"))
+            for vector_id, vector in data.get("vectors", {}).items()
+        }, data.get("namespace", self.namespace))
+
+
+def _connect_pinecone():
+    """The configured Pinecone index, or None if the SDK, key or index is missing"""
+    if not Config.PINECONE_API_KEY:
+        log.info("Pinecone not used", reason="PINECONE_API_KEY is not set")
+        return None
+    try:
+        from pinecone import Pinecone
+    except ImportError as e:
+        log.info("Pinecone not used", reason=e)
+        return None
+    client = Pinecone(api_key=Config.PINECONE_API_KEY)
+    if Config.PINECONE_INDEX not in client.list_indexes().names():
+        log.warning("Pinecone index not found; create it with pc.create_index(name=..., dimension=1536, "
+                    "metric='cosine')", index=Config.PINECONE_INDEX)
+        return None
+    return client.Index(Config.PINECONE_INDEX)
+
+
+def create_vector_backend(name: str = None) -> VectorBackend:
+    """
+    Build the backend named in config. "auto" uses Pinecone when a key and
+    index are available and falls back to the local store otherwise.
+    """
+    name = (name or Config.VECTOR_BACKEND).lower()
+    options = dict(max_batch_size=Config.VECTOR_UPSERT_BATCH_SIZE)
+    if name == "local":
+        return LocalVectorBackend()
+    if name == "http":
+        if not Config.PINECONE_HOST:
+            raise ValueError("VECTOR_BACKEND=http needs PINECONE_HOST")
+        return PineconeHTTPBackend(Config.PINECONE_HOST, Config.PINECONE_API_KEY, Config.PINECONE_NAMESPACE,
+                                   **options)
+    if name in ("pinecone", "auto"):
+        try:
+            index = _connect_pinecone()
+        except Exception as e:
+            if name == "pinecone":
+                raise
+            log.warning("Pinecone setup failed", error=e)
+            index = None
+        if index is not None:
+            return PineconeVectorBackend(index, Config.PINECONE_NAMESPACE, **options)
+        if name == "pinecone":
+            raise ValueError("VECTOR_BACKEND=pinecone but Pinecone is not available")
+        return LocalVectorBackend()
+    raise ValueError(f"Unknown vector backend: {name}")
+
+
+_backend_instance = None
+_backend_lock = threading.Lock()
+
+def get_vector_backend() -> VectorBackend:
+    """Get or create the configured vector backend"""
+    global _backend_instance
+    if _backend_instance is None:
+        with _backend_lock:
+            if _backend_instance is None:
+                _backend_instance = create_vector_backend()
+                log.info("Vector backend selected", backend=_backend_instance.name)
+    return _backend_instance
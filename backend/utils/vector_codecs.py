@@ -0,0 +1,453 @@
+# ===== FILE: ./backend/utils/vector_codecs.py =====
+
+"""
+Contiguous, optionally compressed vector matrices for the local store.
+
+Vectors are L2-normalized on the way in, so cosine similarity is a plain
+dot product. Each storage mode keeps its rows in one growable array and
+scores queries directly against the encoded data:
+
+    float32  4 bytes/dim
+    float16  2 bytes/dim
+    int8     1 byte/dim + one float32 scale per vector
+    pq       1 byte per sub-vector (product quantization, e.g. 96 bytes for 1536-d)
+"""
+
+import numpy as np
+
+# Rows scored per block, so upcasting compact rows never needs a full float32 copy
+SCORE_BLOCK_ROWS = 8192
+# Dimensions per PQ sub-vector when the number of subspaces is not given
+PQ_SUBVECTOR_DIMENSIONS = 16
+# Centroids per PQ subspace, so every code fits in one byte
+PQ_CENTROIDS = 256
+
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalize a vector or a matrix of row vectors (zero vectors stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, without sorting everything:
+    argpartition is O(n), then only the k winners are sorted (ties by index).
+    """
+    scores = np.asarray(scores)
+    k = min(int(k), len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        winners = np.argpartition(-scores, k - 1)[:k]
+    else:
+        winners = np.arange(len(scores))
+    return winners[np.lexsort((winners, -scores[winners]))]
+
+
+class PaddedRows:
+    """
+    Pickles as `array` followed by zero rows up to `rows` in total. Snapshot
+    writers can stream the padding to disk instead of building it in memory.
+    """
+
+    def __init__(self, array, rows: int):
+        self.array = array
+        self.rows = max(rows, len(array))
+
+    def __reduce__(self):
+        return _pad_rows, (np.asarray(self.array), self.rows)
+
+
+def _pad_rows(array, rows):
+    padded = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+    padded[:len(array)] = array
+    return padded
+
+
+class VectorMatrix:
+    """Growable float32 row matrix; subclasses change the encoding"""
+    storage = "float32"
+    dtype = np.float32
+    # Row-aligned arrays; pickled trimmed to the stored rows plus some headroom
+    row_arrays = ("_data",)
+
+    def __init__(self, dimensions: int, capacity: int = 64):
+        self.dimensions = dimensions
+        self.count = 0
+        self._data = np.zeros((max(1, capacity), dimensions), dtype=self.dtype)
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        # Keep some spare rows so appends after a restore (e.g. a WAL replay)
+        # fit without copying a memory-mapped matrix into a bigger array
+        state = self.__dict__.copy()
+        rows = self.count + self._padding_rows()
+        for name in self.row_arrays:
+            if state.get(name) is not None:
+                state[name] = PaddedRows(state[name][:self.count], rows)
+        return state
+
+    @property
+    def headroom_low(self) -> bool:
+        """
+        The rows are mapped from a snapshot and most of its spare rows are
+        used; growing past them copies the matrix into private memory.
+        """
+        mapped = any(isinstance(getattr(self, name), np.memmap) for name in self.row_arrays)
+        return mapped and (len(self._data) - self.count) * 4 < self._padding_rows()
+
+    def _padding_rows(self):
+        return self.count // 8 + 64
+
+    def append(self, vectors) -> np.ndarray:
+        """Append normalized row vectors; returns their row numbers"""
+        vectors = np.atleast_2d(vectors)
+        start = self.count
+        self._reserve(start + len(vectors))
+        self._encode_into(slice(start, start + len(vectors)), vectors)
+        self.count += len(vectors)
+        return np.arange(start, self.count)
+
+    def assign(self, row: int, vector):
+        """Overwrite one existing row"""
+        self._encode_into(slice(row, row + 1), np.atleast_2d(vector))
+
+    def remove(self, row: int) -> int:
+        """Delete a row by moving the last row into its place; returns the moved row's old number"""
+        last = self.count - 1
+        if row != last:
+            self._move(last, row)
+        self.count -= 1
+        return last
+
+    def train(self):
+        """Fit any codebooks the encoding needs (nothing to do for scalar codecs)"""
+        return self
+
+    def scores(self, query, rows=None) -> np.ndarray:
+        """Dot products of a normalized query with all rows, or with the given row numbers"""
+        query = self._prepare_query(np.asarray(query, dtype=np.float32))
+        if rows is not None:
+            return self._score_block(np.asarray(rows), query)
+        out = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, self.count)
+            out[start:stop] = self._score_block(slice(start, stop), query)
+        return out
+
+    def top_k_many(self, queries, k: int, rows=None):
+        """
+        Top k rows for each normalized query row, best first, from one
+        matrix-matrix product per block of rows; memory stays bounded by
+        queries x (k + SCORE_BLOCK_ROWS). Optionally only the given rows are
+        considered. Returns (rows, scores), both (len(queries), k).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        total = self.count if rows is None else len(rows)
+        k = min(int(k), total)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        if k <= 0:
+            return best_rows, best_scores
+        for start in range(0, total, SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, total)
+            block = np.arange(start, stop) if rows is None else np.asarray(rows[start:stop])
+            scores = self._score_many_block(slice(start, stop) if rows is None else block, queries)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(block, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        # Best first, ties by row number (as top_k_indices)
+        order = np.lexsort((best_rows, -best_scores), axis=-1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def decode(self, rows=None) -> np.ndarray:
+        """float32 view/copy of the given rows (all rows by default)"""
+        if rows is None:
+            rows = slice(0, self.count)
+        return self._decode(rows)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dimensions * np.dtype(self.dtype).itemsize
+
+    @property
+    def nbytes(self) -> int:
+        return self.count * self.bytes_per_vector
+
+    def _reserve(self, rows):
+        capacity = len(self._data)
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        self._data = self._grow(self._data, capacity)
+
+    @staticmethod
+    def _grow(array, capacity):
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _encode_into(self, rows, vectors):
+        self._data[rows] = vectors
+
+    def _prepare_query(self, query):
+        return query
+
+    def _move(self, source, target):
+        self._data[target] = self._data[source]
+
+    def _score_block(self, rows, query):
+        return self._data[rows] @ query
+
+    def _score_many_block(self, rows, queries):
+        """(queries, rows) scores for a block of rows"""
+        return queries @ self._decode(rows).T
+
+    def _decode(self, rows):
+        return self._data[rows]
+
+
+class Float16Matrix(VectorMatrix):
+    storage = "float16"
+    dtype = np.float16
+
+    def _score_block(self, rows, query):
+        return self._data[rows].astype(np.float32) @ query
+
+    def _decode(self, rows):
+        return self._data[rows].astype(np.float32)
+
+
+class Int8Matrix(VectorMatrix):
+    """Symmetric scalar quantization: row = codes * scale, codes in [-127, 127]"""
+    storage = "int8"
+    dtype = np.int8
+    row_arrays = ("_data", "_scales")
+
+    def __init__(self, dimensions: int, capacity: int = 64):
+        super().__init__(dimensions, capacity)
+        self._scales = np.zeros(len(self._data), dtype=np.float32)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dimensions + np.dtype(np.float32).itemsize
+
+    def _reserve(self, rows):
+        super()._reserve(rows)
+        if len(self._scales) < len(self._data):
+            self._scales = self._grow(self._scales, len(self._data))
+
+    def _encode_into(self, rows, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        self._data[rows] = np.rint(vectors / scales[:, None]).astype(np.int8)
+        self._scales[rows] = scales
+
+    def _move(self, source, target):
+        super()._move(source, target)
+        self._scales[target] = self._scales[source]
+
+    def _score_block(self, rows, query):
+        return (self._data[rows].astype(np.float32) @ query) * self._scales[rows]
+
+    def _score_many_block(self, rows, queries):
+        return (queries @ self._data[rows].astype(np.float32).T) * self._scales[rows]
+
+    def _decode(self, rows):
+        return self._data[rows].astype(np.float32) * self._scales[rows][:, None]
+
+
+def default_subspaces(dimensions: int) -> int:
+    """Largest subspace count that divides the dimensions with about 16 dims per sub-vector"""
+    subspaces = max(1, dimensions // PQ_SUBVECTOR_DIMENSIONS)
+    while dimensions % subspaces:
+        subspaces -= 1
+    return subspaces
+
+
+def _kmeans(vectors, k, iterations, rng):
+    """Plain (Euclidean) k-means; returns (k, d) centroids"""
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest_codes(vectors, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+def _nearest_codes(vectors, centroids):
+    # argmin |x - c|^2 == argmax 2 x.c - |c|^2
+    out = np.empty(len(vectors), dtype=np.int64)
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        stop = min(start + SCORE_BLOCK_ROWS, len(vectors))
+        out[start:stop] = np.argmax(vectors[start:stop] @ centroids.T - half_norms, axis=1)
+    return out
+
+
+class PQMatrix(VectorMatrix):
+    """
+    Product quantization: each row is split into `subspaces` sub-vectors and
+    each sub-vector is stored as the byte index of its nearest centroid in
+    that subspace's codebook. Queries are scored asymmetrically (ADC): one
+    lookup table of query . centroid per subspace, then a sum of table
+    entries per row.
+
+    Codebooks need data, so rows are staged as float32 (and scored exactly)
+    until train_rows rows are stored, then trained and encoded.
+    """
+    storage = "pq"
+    dtype = np.uint8
+    row_arrays = ("_data", "_staging")
+
+    def __init__(self, dimensions: int, capacity: int = 64, subspaces: int = 0,
+                 train_rows: int = 4096, iterations: int = 10, seed: int = 0):
+        self.subspaces = subspaces or default_subspaces(dimensions)
+        if dimensions % self.subspaces:
+            raise ValueError(f"{dimensions} dimensions do not split into {self.subspaces} subspaces")
+        self.dimensions = dimensions
+        self.train_rows = max(1, train_rows)
+        self.iterations = iterations
+        self.seed = seed
+        self.count = 0
+        self.codebooks = None  # (subspaces, centroids, dimensions // subspaces)
+        self._data = np.zeros((max(1, capacity), self.subspaces), dtype=self.dtype)
+        self._staging = np.zeros((max(1, capacity), dimensions), dtype=np.float32)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.subspaces if self.trained else self.dimensions * np.dtype(np.float32).itemsize
+
+    def append(self, vectors) -> np.ndarray:
+        rows = super().append(vectors)
+        if not self.trained and self.count >= self.train_rows:
+            self.train()
+        return rows
+
+    def train(self):
+        """Fit the codebooks on the staged rows and encode them"""
+        if self.trained or self.count == 0:
+            return self
+        staged = self._staging[:self.count]
+        rng = np.random.default_rng(self.seed)
+        sample = staged
+        if len(sample) > PQ_CENTROIDS * 256:
+            sample = sample[rng.choice(len(sample), PQ_CENTROIDS * 256, replace=False)]
+        k = min(PQ_CENTROIDS, len(sample))
+        self.codebooks = np.stack([
+            _kmeans(np.ascontiguousarray(part), k, self.iterations, rng)
+            for part in np.split(sample, self.subspaces, axis=1)
+        ])
+        self._staging = None
+        self._encode_into(slice(0, self.count), staged)
+        return self
+
+    def _reserve(self, rows):
+        super()._reserve(rows)
+        if self._staging is not None and len(self._staging) < len(self._data):
+            self._staging = self._grow(self._staging, len(self._data))
+
+    def _encode_into(self, rows, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.trained:
+            self._staging[rows] = vectors
+            return
+        parts = np.split(vectors, self.subspaces, axis=1)
+        self._data[rows] = np.stack(
+            [_nearest_codes(part, codebook) for part, codebook in zip(parts, self.codebooks)], axis=1
+        )
+
+    def _move(self, source, target):
+        if self.trained:
+            super()._move(source, target)
+        else:
+            self._staging[target] = self._staging[source]
+
+    def _prepare_query(self, query):
+        if not self.trained:
+            return query
+        # Flattened ADC lookup table: entry (j, c) = query sub-vector j . centroid c
+        table = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(self.subspaces, -1))
+        return table.ravel()
+
+    def _score_block(self, rows, query):
+        if not self.trained:
+            return self._staging[rows] @ query
+        offsets = np.arange(self.subspaces) * self.codebooks.shape[1]
+        return query[self._data[rows].astype(np.intp) + offsets].sum(axis=1)
+
+    def _score_many_block(self, rows, queries):
+        if not self.trained:
+            return queries @ self._staging[rows].T
+        return np.stack([self._score_block(rows, self._prepare_query(query)) for query in queries])
+
+    def _decode(self, rows):
+        if not self.trained:
+            return self._staging[rows]
+        codes = self._data[rows].astype(np.intp)
+        return self.codebooks[np.arange(self.subspaces), codes].reshape(len(codes), self.dimensions)
+
+
+MATRIX_TYPES = {
+    "float32": VectorMatrix,
+    "float16": Float16Matrix,
+    "int8": Int8Matrix,
+    "pq": PQMatrix,
+}
+
+
+def make_matrix(storage: str, dimensions: int, capacity: int = 64, **options) -> VectorMatrix:
+    """Create an empty matrix for a storage mode ("float32", "float16", "int8" or "pq")"""
+    try:
+        matrix_type = MATRIX_TYPES[storage]
+    except KeyError:
+        raise ValueError(f"Unknown vector storage mode: {storage}") from None
+    return matrix_type(dimensions, capacity, **options)
+
+
+def compare_storage_modes(vectors, queries, top_k: int = 10, modes=("float32", "float16", "int8"),
+                          **options) -> dict:
+    """
+    Memory per vector and recall@k of each storage mode against exact float32 search
+    (options go to the matrices, e.g. subspaces for "pq")
+    """
+    vectors = normalize(vectors)
+    queries = normalize(np.atleast_2d(queries))
+    k = min(top_k, len(vectors))
+    exact = [top_k_indices(scores, k) for scores in queries @ vectors.T]
+
+    report = {}
+    for storage in modes:
+        matrix_options = options if storage == "pq" else {}
+        matrix = make_matrix(storage, vectors.shape[1], len(vectors), **matrix_options)
+        matrix.append(vectors)
+        matrix.train()
+        hits = 0
+        for query, truth in zip(queries, exact):
+            found = top_k_indices(matrix.scores(query), k)
+            hits += len(np.intersect1d(found, truth))
+        report[storage] = {
+            "bytes_per_vector": matrix.bytes_per_vector,
+            "recall_at_k": hits / (k * len(queries)) if k else 1.0,
+        }
+    return report
@@ -0,0 +1,284 @@
+# ===== FILE: ./backend/utils/vector_filters.py =====
+
+"""
+Pinecone-style metadata filters for the local vector store.
+
+Each store partition keeps a MetadataIndex: an inverted index (value -> rows)
+for every field, with list fields indexed per element, and a sorted numeric
+index for range operators. A filter compiles to a boolean row mask before
+any vector is scored, so selective filters shrink the scoring work.
+
+Supported: {"field": value}, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte,
+$and, $or. Several fields in one dict are ANDed. For list fields (e.g.
+skills), $eq/$in match when any element matches, as in Pinecone. Range
+operators also accept strings that start with a number ("5+ years" -> 5).
+Text previews (metadata_columns.TEXT_FIELDS) are not indexed.
+"""
+
+import re
+import sys
+from numbers import Number
+
+import numpy as np
+
+from backend.utils.metadata_columns import TEXT_FIELDS
+
+_LEADING_NUMBER = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
+_RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+# Past this fraction of changed rows a numeric column is re-sorted rather than patched
+RESORT_FRACTION = 0.1
+
+
+class FilterError(ValueError):
+    """Raised for filters the engine does not understand"""
+
+
+def validate_filter(filter):
+    """
+    Raise FilterError for a filter the engine does not understand. Checked
+    on the filter alone, so a bad filter fails even when no row would be
+    evaluated against it (empty store, earlier clause matching nothing).
+    """
+    if not isinstance(filter, dict):
+        raise FilterError(f"Filter must be a dict, got {type(filter).__name__}")
+    for key, condition in filter.items():
+        if key in ("$and", "$or"):
+            if not isinstance(condition, (list, tuple)):
+                raise FilterError(f"{key} needs a list of filters, got {type(condition).__name__}")
+            for clause in condition:
+                validate_filter(clause)
+        elif not isinstance(key, str) or key.startswith("$"):
+            raise FilterError(f"Unsupported filter operator: {key}")
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator in _RANGE_OPERATORS:
+                    if _as_number(operand) is None:
+                        raise FilterError(f"{operator} needs a number, got {operand!r}")
+                elif operator in ("$in", "$nin"):
+                    if not isinstance(operand, (list, tuple, set)):
+                        raise FilterError(f"{operator} needs a list, got {operand!r}")
+                elif operator not in ("$eq", "$ne"):
+                    raise FilterError(f"Unsupported filter operator: {operator}")
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, Number):
+        return float(value)
+    if isinstance(value, str):
+        match = _LEADING_NUMBER.match(value)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def _hashable_values(value):
+    """Index keys for a metadata value: list elements individually, scalars as-is (strings interned)"""
+    if isinstance(value, (list, tuple, set)):
+        return [_intern(item) for item in value if _is_hashable(item)]
+    return [_intern(value)] if _is_hashable(value) else []
+
+
+def _index_keys(metadata):
+    """(field, index keys) for the indexed fields of a metadata dict"""
+    for field, value in metadata.items():
+        if field not in TEXT_FIELDS:
+            yield field, _hashable_values(value)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _NumericColumn:
+    """
+    Row-aligned numbers (NaN when missing) with a sort order that is patched
+    with the rows changed since the last range query, or rebuilt once too
+    many of them have changed
+    """
+
+    def __init__(self):
+        self.values = np.full(64, np.nan)
+        self._order = np.empty(0, dtype=np.int64)   # rows holding a number, by value
+        self._sorted = np.empty(0)                   # their values, in that order
+        self._changed = set()
+
+    def set(self, row, number):
+        if row >= len(self.values):
+            grown = np.full(max(row + 1, 2 * len(self.values)), np.nan)
+            grown[:len(self.values)] = self.values
+            self.values = grown
+        self.values[row] = np.nan if number is None else number
+        self._changed.add(row)
+
+    def _update_order(self):
+        changed = np.fromiter(self._changed, dtype=np.int64, count=len(self._changed))
+        self._changed = set()
+        if len(changed) > RESORT_FRACTION * len(self._order):
+            present = np.flatnonzero(~np.isnan(self.values))
+            self._order = present[np.argsort(self.values[present], kind="stable")]
+            self._sorted = self.values[self._order]
+            return
+        kept = ~np.isin(self._order, changed)
+        order, ordered = self._order[kept], self._sorted[kept]
+        added = changed[~np.isnan(self.values[changed])]
+        added = added[np.argsort(self.values[added], kind="stable")]
+        positions = np.searchsorted(ordered, self.values[added], side="right")
+        self._order = np.insert(order, positions, added)
+        self._sorted = np.insert(ordered, positions, self.values[added])
+
+    def rows_in_range(self, size, low, low_inclusive, high, high_inclusive):
+        # Rows from size on are always missing, so the order never holds them
+        if self._changed:
+            self._update_order()
+        start, stop = 0, len(self._sorted)
+        if low is not None:
+            start = np.searchsorted(self._sorted, low, side="left" if low_inclusive else "right")
+        if high is not None:
+            stop = np.searchsorted(self._sorted, high, side="right" if high_inclusive else "left")
+        return self._order[start:max(start, stop)]
+
+
+class MetadataIndex:
+    """
+    Inverted + numeric indexes over the metadata of one partition's rows. The
+    caller keeps the rows' metadata and passes it back to replace or remove a
+    row, so the index holds no per-row copy of its keys.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._postings = {}   # field -> {value: set(rows)}
+        self._numeric = {}    # field -> _NumericColumn
+
+    def add(self, row, metadata, previous=None):
+        """
+        Index metadata for a new row (row == size), or replace an existing
+        row's entry (previous: the metadata it was indexed with)
+        """
+        if row < self.size:
+            self._unindex(row, previous or {})
+        else:
+            self.size += 1
+        for field, keys in _index_keys(metadata):
+            postings = self._postings.setdefault(field, {})
+            for key in keys:
+                postings.setdefault(key, set()).add(row)
+            number = _as_number(metadata[field])
+            if number is not None:
+                self._numeric.setdefault(field, _NumericColumn()).set(row, number)
+
+    def remove(self, row, metadata, last_metadata):
+        """
+        Remove a row indexed with `metadata`, moving the last row (indexed with
+        last_metadata) into its place (mirrors VectorMatrix.remove)
+        """
+        last = self.size - 1
+        self._unindex(row, metadata)
+        if row != last:
+            for field, keys in _index_keys(last_metadata):
+                for key in keys:
+                    rows = self._postings[field][key]
+                    rows.discard(last)
+                    rows.add(row)
+            for column in self._numeric.values():
+                # Columns only grow as far as the last row that set them
+                number = column.values[last] if last < len(column.values) else np.nan
+                column.set(row, None if np.isnan(number) else number)
+                if last < len(column.values):
+                    column.set(last, None)
+        self.size -= 1
+
+    def _unindex(self, row, metadata):
+        for field, keys in _index_keys(metadata):
+            postings = self._postings.get(field, {})
+            for key in keys:
+                rows = postings.get(key)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del postings[key]
+        for column in self._numeric.values():
+            if row < len(column.values) and not np.isnan(column.values[row]):
+                column.set(row, None)
+
+    def mask(self, filter) -> np.ndarray:
+        """Boolean row mask for a filter"""
+        if not filter:
+            return np.ones(self.size, dtype=bool)
+        return self._evaluate(filter)
+
+    def _evaluate(self, filter):
+        if not isinstance(filter, dict):
+            raise FilterError(f"Filter must be a dict, got {type(filter).__name__}")
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._evaluate(clause)
+            elif key == "$or":
+                either = np.zeros(self.size, dtype=bool)
+                for clause in condition:
+                    either |= self._evaluate(clause)
+                mask &= either
+            elif key.startswith("$"):
+                raise FilterError(f"Unsupported filter operator: {key}")
+            else:
+                mask &= self._field_mask(key, condition)
+            if not mask.any():
+                break
+        return mask
+
+    def _field_mask(self, field, condition):
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(self.size, dtype=bool)
+        low = high = None
+        low_inclusive = high_inclusive = True
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                mask &= self._rows_mask(field, [operand])
+            elif operator == "$in":
+                mask &= self._rows_mask(field, operand)
+            elif operator == "$ne":
+                mask &= ~self._rows_mask(field, [operand])
+            elif operator == "$nin":
+                mask &= ~self._rows_mask(field, operand)
+            elif operator in _RANGE_OPERATORS:
+                number = _as_number(operand)
+                if number is None:
+                    raise FilterError(f"{operator} needs a number, got {operand!r}")
+                if operator in ("$gt", "$gte"):
+                    low, low_inclusive = number, operator == "$gte"
+                else:
+                    high, high_inclusive = number, operator == "$lte"
+            else:
+                raise FilterError(f"Unsupported filter operator: {operator}")
+        if low is not None or high is not None:
+            column = self._numeric.get(field)
+            in_range = np.zeros(self.size, dtype=bool)
+            if column is not None:
+                in_range[column.rows_in_range(self.size, low, low_inclusive, high, high_inclusive)] = True
+            mask &= in_range
+        return mask
+
+    def _rows_mask(self, field, values):
+        mask = np.zeros(self.size, dtype=bool)
+        postings = self._postings.get(field, {})
+        for value in values:
+            if not _is_hashable(value):
+                continue
+            rows = postings.get(value)
+            if rows:
+                mask[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+        return mask
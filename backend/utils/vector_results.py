@@ -0,0 +1,131 @@
+# ===== FILE: ./backend/utils/vector_results.py =====
+
+"""
+Result types returned by the local vector stores.
+
+They mirror the attribute access of Pinecone's responses (response.matches,
+match.id / .score / .metadata, fetch_response.vectors[id].values), so
+callers handle both backends the same way. For older call sites, matches
+and vectors also support dict-style access (match["id"], match.get("metadata")).
+
+A match can hold a metadata source (an id -> metadata mapping) in place
+of the metadata itself. The lookup then happens only when .metadata is
+read, so building a large result set costs two fields per match.
+"""
+
+_FIELDS = ("id", "score", "values", "metadata")
+
+
+class _DictAccess:
+    """match["id"] / match.get("metadata", {}) on top of the slotted attributes"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self._keys:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def keys(self):
+        return list(self._keys)
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self._keys if getattr(self, key) is not None}
+
+
+class Match(_DictAccess):
+    __slots__ = ("id", "score", "values", "_metadata", "_source")
+    _keys = _FIELDS
+
+    def __init__(self, id, score: float, metadata: dict = None, source=None, values=None):
+        """source: mapping to look the metadata up in on first access (instead of metadata)"""
+        self.id = id
+        self.score = score
+        self.values = values
+        self._metadata = metadata
+        self._source = source
+
+    @property
+    def metadata(self):
+        if self._source is not None:
+            self._metadata = self._source.get(self.id)
+            self._source = None
+        return self._metadata
+
+    def __reduce__(self):
+        # Only this match's metadata is serialized, never its source
+        return Match, (self.id, self.score, self.metadata, None, self.values)
+
+    def __repr__(self):
+        return f"Match(id={self.id!r}, score={self.score:.4f})"
+
+
+class Vector(_DictAccess):
+    __slots__ = ("id", "values", "metadata", "reduced")
+    _keys = ("id", "values", "metadata")
+
+    def __init__(self, id, values, metadata: dict = None, reduced: bool = False):
+        self.id = id
+        self.values = values
+        self.metadata = metadata
+        # values are a local store's projected search-space vector; query it back with reduced=True
+        self.reduced = reduced
+
+    def __reduce__(self):
+        return Vector, (self.id, self.values, self.metadata, self.reduced)
+
+    def __repr__(self):
+        return f"Vector(id={self.id!r}, dimensions={len(self.values)})"
+
+
+class QueryResponse:
+    __slots__ = ("matches", "namespace")
+
+    def __init__(self, matches=None, namespace: str = ""):
+        self.matches = matches if matches is not None else []
+        self.namespace = namespace
+
+    def __reduce__(self):
+        return QueryResponse, (self.matches, self.namespace)
+
+    def __getitem__(self, key):
+        if key not in ("matches", "namespace"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {"matches": [match.to_dict() for match in self.matches], "namespace": self.namespace}
+
+    def __repr__(self):
+        return f"QueryResponse({len(self.matches)} matches)"
+
+
+class FetchResponse:
+    __slots__ = ("vectors", "namespace")
+
+    def __init__(self, vectors: dict = None, namespace: str = ""):
+        self.vectors = vectors if vectors is not None else {}
+        self.namespace = namespace
+
+    def __reduce__(self):
+        return FetchResponse, (self.vectors, self.namespace)
+
+    def __getitem__(self, key):
+        if key not in ("vectors", "namespace"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {"vectors": {key: vector.to_dict() for key, vector in self.vectors.items()}, "namespace": self.namespace}
+
+    def __repr__(self):
+        return f"FetchResponse({len(self.vectors)} vectors)"
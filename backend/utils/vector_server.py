@@ -0,0 +1,194 @@
+# ===== FILE: ./backend/utils/vector_server.py =====
+
+"""
+Local stand-in for a Pinecone index host.
+
+Serves the data-plane REST calls the http vector backend makes
+(POST /vectors/upsert, POST /query, GET /vectors/fetch) from one
+SimpleVectorStore per namespace, so the remote code path can be exercised
+without network access. Upsert batch sizes are recorded and failures can be
+injected to test retry handling.
+
+Run standalone with: python -m backend.utils.vector_server --port 8766
+and point the app at it with VECTOR_BACKEND=http PINECONE_HOST=http://127.0.0.1:8766
+"""
+
+import json
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.utils.simple_store import SimpleVectorStore
+from backend.utils.vector_filters import FilterError
+
+
+class _VectorHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, as the index host does; without
+    # Nagle's algorithm the split header/body writes don't stall on delayed ACKs
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self._injected_failure():
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self._send(400, {"message": "Invalid JSON body"})
+
+        if path == "/vectors/upsert":
+            return self._upsert(payload)
+        if path == "/query":
+            return self._query(payload)
+        self._send(404, {"message": f"Unknown path {self.path}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self._injected_failure():
+            return
+        if url.path.rstrip("/") != "/vectors/fetch":
+            return self._send(404, {"message": f"Unknown path {self.path}"})
+        params = parse_qs(url.query)
+        namespace = params.get("namespace", [""])[0]
+        fetched = self.server.store(namespace).fetch(params.get("ids", []))
+        self._send(200, {
+            "vectors": {
+                vector_id: {"id": vector_id, "values": [float(v) for v in vector.values], "metadata": vector.metadata}
+                for vector_id, vector in fetched.vectors.items()
+            },
+            "namespace": namespace,
+        })
+
+    def _upsert(self, payload):
+        server = self.server
+        vectors = payload.get("vectors", [])
+        if not vectors or len(vectors) > server.max_batch_size:
+            return self._send(400, {"message": f"vectors must hold 1-{server.max_batch_size} items"})
+        with server.lock:
+            server.batch_sizes.append(len(vectors))
+        if not server.store(payload.get("namespace", "")).upsert([
+            (vector["id"], vector["values"], vector.get("metadata") or {}) for vector in vectors
+        ]):
+            return self._send(500, {"message": "upsert failed"})
+        self._send(200, {"upsertedCount": len(vectors)})
+
+    def _query(self, payload):
+        if "vector" not in payload:
+            return self._send(400, {"message": "query needs a vector"})
+        namespace = payload.get("namespace", "")
+        include_metadata = payload.get("includeMetadata", False)
+        try:
+            response = self.server.store(namespace).query(
+                payload["vector"], top_k=payload.get("topK", 10), filter=payload.get("filter"),
+                include_metadata=include_metadata,
+            )
+        except FilterError as e:
+            return self._send(400, {"message": str(e)})
+        matches = []
+        for match in response.matches:
+            entry = {"id": match.id, "score": float(match.score)}
+            if include_metadata:
+                entry["metadata"] = match.metadata
+            matches.append(entry)
+        self._send(200, {"matches": matches, "namespace": namespace})
+
+    def _injected_failure(self) -> bool:
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            if server.failures_pending <= 0:
+                return False
+            server.failures_pending -= 1
+        self._send(server.failure_status, {"message": "Injected failure"})
+        return True
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep test output quiet
+        pass
+
+
+class LocalVectorServer:
+    """Pinecone-compatible index host on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, max_batch_size: int = 1000, **store_options):
+        self._server = ThreadingHTTPServer((host, port), _VectorHandler)
+        self._server.daemon_threads = True
+        self._server.lock = threading.Lock()
+        self._server.max_batch_size = max_batch_size
+        self._server.request_count = 0
+        self._server.batch_sizes = []
+        self._server.failures_pending = 0
+        self._server.failure_status = 503
+        self._server.namespaces = {}
+        self._server.store = self.store
+        self._store_options = store_options
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        return self._server.request_count
+
+    @property
+    def batch_sizes(self) -> list:
+        return list(self._server.batch_sizes)
+
+    def store(self, namespace: str = "") -> SimpleVectorStore:
+        """The store behind a namespace (created on first use)"""
+        with self._server.lock:
+            if namespace not in self._server.namespaces:
+                self._server.namespaces[namespace] = SimpleVectorStore(**self._store_options)
+            return self._server.namespaces[namespace]
+
+    def fail_next(self, count: int, status: int = 503):
+        """Make the next `count` requests fail with the given HTTP status"""
+        with self._server.lock:
+            self._server.failures_pending = count
+            self._server.failure_status = status
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Pinecone-compatible index host")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = LocalVectorServer(args.host, args.port)
+    print(f"🚀 Local vector server listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
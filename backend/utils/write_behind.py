@@ -0,0 +1,239 @@
+# ===== FILE: ./backend/utils/write_behind.py =====
+
+"""
+Write-behind upsert queue for a vector backend.
+
+put() returns at once; one background thread coalesces queued items into a
+batch and writes it when max_items are waiting or max_delay seconds after
+the first one arrived, whichever comes first. Re-queueing an id before it
+is written replaces the queued item, so only the latest version is sent.
+
+put() returns a ticket: wait(ticket) blocks until that batch is written and
+says whether it succeeded; flush() does the same for everything queued so
+far without waiting out the window. Once max_pending items are unwritten,
+put() blocks until the writer catches up. Queued and in-flight items are
+visible through pending(), and merge_pending() folds them into query
+results so a process reads its own writes before they reach the backend.
+"""
+
+import time
+import heapq
+import threading
+from operator import attrgetter
+from collections.abc import Mapping
+
+import numpy as np
+
+from backend.utils.log import get_logger
+from backend.utils.vector_codecs import normalize
+from backend.utils.vector_filters import MetadataIndex
+from backend.utils.vector_results import Match
+
+log = get_logger("vectors")
+
+# Failed batch numbers kept for wait(); older failures are forgotten
+_FAILURES_KEPT = 64
+
+
+class PendingItems(Mapping):
+    """
+    Read-only id -> (vector, metadata) snapshot of unwritten items. The
+    metadata index and normalized matrix merge_pending() needs are built on
+    first use and shared by every query until the queue changes.
+    """
+
+    def __init__(self, items: dict):
+        self._items = items
+        self._ids = None
+        self._index = None
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def __getitem__(self, vector_id):
+        return self._items[vector_id]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, vector_id):
+        return vector_id in self._items
+
+    def matching(self, filter: dict):
+        """(ids, normalized matrix) of the items matching a filter"""
+        with self._lock:
+            if self._index is None:
+                self._ids = list(self._items)
+                index = MetadataIndex()
+                for row, vector_id in enumerate(self._ids):
+                    index.add(row, self._items[vector_id][1] or {})
+                self._matrix = normalize(np.stack([
+                    np.asarray(self._items[vector_id][0], dtype=np.float32) for vector_id in self._ids
+                ]))
+                self._index = index
+        rows = np.flatnonzero(self._index.mask(filter))
+        return [self._ids[row] for row in rows.tolist()], self._matrix[rows]
+
+
+_NOTHING_PENDING = PendingItems({})
+
+
+class WriteBehindQueue:
+    def __init__(self, backend, max_items: int = 200, max_delay: float = 0.05, max_pending: int = 10000):
+        """
+        backend: anything with upsert(items), or a callable returning one (looked up per batch).
+        max_pending: unwritten items past which put() blocks (a single larger put still goes through).
+        """
+        self._backend = backend
+        self.max_items = max(1, int(max_items))
+        self.max_delay = max_delay
+        self.max_pending = max(self.max_items, int(max_pending))
+        self._condition = threading.Condition()
+        self._queued = {}       # id -> (vector, metadata), the open batch
+        self._in_flight = {}    # the batch being written
+        self._batch = 1         # number of the open batch (tickets)
+        self._written = 0       # every batch up to this one is done
+        self._failed = {}       # batch -> error
+        self._first_queued_at = None
+        self._flush_requested = False
+        self._closed = False
+        self._pending = _NOTHING_PENDING  # snapshot for pending(), rebuilt after a change
+        self._pending_stale = False
+        self.stats = {"items": 0, "batches": 0, "failed_batches": 0, "blocked_puts": 0}
+        self._thread = threading.Thread(target=self._run, name="vector-write-behind", daemon=True)
+        self._thread.start()
+
+    def put(self, items) -> int:
+        """Queue (id, vector, metadata) items; returns the ticket to wait() on"""
+        with self._condition:
+            if self._unwritten() and self._unwritten() + len(items) > self.max_pending and not self._closed:
+                # Backpressure: write what is queued now and wait for room
+                self.stats["blocked_puts"] += 1
+                self._flush_requested = True
+                self._condition.notify_all()
+                self._condition.wait_for(
+                    lambda: self._closed or not self._unwritten()
+                    or self._unwritten() + len(items) <= self.max_pending
+                )
+            if self._closed:
+                raise RuntimeError("Write-behind queue is closed")
+            if not self._queued:
+                self._first_queued_at = time.monotonic()
+            for vector_id, vector, metadata in items:
+                self._queued[vector_id] = (vector, metadata)
+            self._pending_stale = True
+            self.stats["items"] += len(items)
+            self._condition.notify_all()
+            return self._batch
+
+    def _unwritten(self) -> int:
+        return len(self._queued) + len(self._in_flight)
+
+    def wait(self, ticket: int, timeout: float = None) -> bool:
+        """Block until the batch holding a ticket is written; False if it failed or timed out"""
+        with self._condition:
+            if ticket == self._batch:
+                if self._queued:
+                    self._flush_requested = True
+                    self._condition.notify_all()
+                else:
+                    ticket -= 1  # the open batch is empty: wait for the one before it
+            if not self._condition.wait_for(lambda: self._written >= ticket, timeout):
+                return False
+            return ticket not in self._failed
+
+    def flush(self, timeout: float = None) -> bool:
+        """Write everything queued so far now and wait for it; False if any of it failed"""
+        with self._condition:
+            first, ticket = self._written + 1, self._batch
+        if not self.wait(ticket, timeout):
+            return False
+        with self._condition:
+            return not any(first <= batch <= ticket for batch in self._failed)
+
+    def pending(self) -> PendingItems:
+        """id -> (vector, metadata) for every item not yet known to be written (shared until the queue changes)"""
+        with self._condition:
+            if self._pending_stale:
+                unwritten = {**self._in_flight, **self._queued}
+                self._pending = PendingItems(unwritten) if unwritten else _NOTHING_PENDING
+                self._pending_stale = False
+            return self._pending
+
+    def close(self, timeout: float = None):
+        """Write what is queued and stop the writer thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        """Wait for a batch to be due and take it (None once closed and drained)"""
+        with self._condition:
+            while True:
+                if not self._queued:
+                    if self._closed:
+                        return None, None
+                    self._condition.wait()
+                    continue
+                due = self._first_queued_at + self.max_delay
+                now = time.monotonic()
+                if len(self._queued) >= self.max_items or self._flush_requested or self._closed or now >= due:
+                    break
+                self._condition.wait(due - now)
+            batch, number = self._queued, self._batch
+            self._in_flight, self._queued = batch, {}
+            self._batch += 1
+            self._flush_requested = False
+            return batch, number
+
+    def _run(self):
+        while True:
+            batch, number = self._next_batch()
+            if batch is None:
+                return
+            backend = self._backend() if callable(self._backend) else self._backend
+            error = None
+            try:
+                backend.upsert([(vector_id, vector, metadata) for vector_id, (vector, metadata) in batch.items()])
+            except Exception as e:
+                error = e
+                log.exception("Write-behind batch failed", batch=number, items=len(batch))
+            with self._condition:
+                self._in_flight = {}
+                self._pending_stale = True
+                self._written = number
+                self.stats["batches"] += 1
+                if error is not None:
+                    self.stats["failed_batches"] += 1
+                    self._failed[number] = error
+                    if len(self._failed) > _FAILURES_KEPT:
+                        del self._failed[min(self._failed)]
+                self._condition.notify_all()
+
+
+def merge_pending(responses: list, queries, top_k: int, filter: dict, pending) -> list:
+    """
+    Fold pending items (a PendingItems or dict) into query responses (one per
+    query row, taken before the query ran): a pending id replaces whatever
+    the backend returned for it, and pending items matching the filter
+    compete on cosine score. Responses are updated in place and returned.
+    """
+    if not pending:
+        return responses
+    if not isinstance(pending, PendingItems):
+        pending = PendingItems(pending)
+    ids, matrix = pending.matching(filter)
+    if ids:
+        scores = normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32))) @ matrix.T
+    for position, response in enumerate(responses):
+        matches = [match for match in response.matches if match.id not in pending]
+        if ids:
+            matches += [
+                Match(vector_id, float(score), pending[vector_id][1])
+                for vector_id, score in zip(ids, scores[position].tolist())
+            ]
+        response.matches = heapq.nlargest(top_k, matches, key=attrgetter("score"))
+    return responses